@@ -9,6 +9,7 @@ greenbat.app.app.add_middleware(
     allow_origins=greenbat.config.cfg["api.alloworigins"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Link", "ETag", "Last-Modified", "Location", "X-Cache"],
 )
 
 uvicorn.run(greenbat.app.app, host="127.0.0.1", port=greenbat.config.cfg["api.port"])
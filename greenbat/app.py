@@ -1,3 +1,4 @@
+import os
 import pathlib
 import fastapi.middleware.cors
 import pkg_resources
@@ -5,8 +6,18 @@ import greenbat.routes.users
 import greenbat.routes.games_all
 import greenbat.routes.games_custom
 import greenbat.routes.games_steam
+import greenbat.routes.games_search
 import greenbat.routes.elements
 import greenbat.routes.match
+import greenbat.routes.sync
+import greenbat.routes.jobs
+import greenbat.routes.cache
+import greenbat.utils.cache
+import greenbat.utils.ownership
+import greenbat.utils.jobs
+import greenbat.utils.conditional
+from greenbat.config import cfg
+from greenbat.database.engine import Session
 
 
 this_path = pathlib.Path(__file__)
@@ -45,7 +56,19 @@ app = fastapi.FastAPI(
         {
             "name": "Match",
             "description": "Comparisions between users' libraries"
-        }
+        },
+        {
+            "name": "Sync",
+            "description": "Imports of users' libraries from external services",
+        },
+        {
+            "name": "Jobs",
+            "description": "Progress of long-running operations",
+        },
+        {
+            "name": "Cache",
+            "description": "Statistics of the response and claims caches",
+        },
     ],
 )
 
@@ -53,5 +76,37 @@ app.include_router(greenbat.routes.users.router, prefix="/users", tags=["Users"]
 app.include_router(greenbat.routes.games_all.router, prefix="/games/all", tags=["Games (all)"])
 app.include_router(greenbat.routes.games_custom.router, prefix="/games/custom", tags=["Games (custom)"])
 app.include_router(greenbat.routes.games_steam.router, prefix="/games/steam", tags=["Games (Steam)"])
+app.include_router(greenbat.routes.games_search.router, prefix="/games/search", tags=["Games (all)"])
 app.include_router(greenbat.routes.elements.router, prefix="/elements", tags=["Elements"])
 app.include_router(greenbat.routes.match.router, prefix="/match", tags=["Match"])
+app.include_router(greenbat.routes.sync.router, prefix="/sync", tags=["Sync"])
+app.include_router(greenbat.routes.jobs.router, prefix="/jobs", tags=["Jobs"])
+app.include_router(greenbat.routes.cache.router, prefix="/cache", tags=["Cache"])
+
+
+@app.exception_handler(greenbat.utils.conditional.NotModified)
+def not_modified(_request, exc: greenbat.utils.conditional.NotModified):
+    return fastapi.Response(status_code=304, headers=exc.headers)
+
+
+@app.on_event("startup")
+def check_cache_backend():
+    # Both uvicorn and gunicorn read the number of worker processes to start from this variable
+    greenbat.utils.cache.require_shared(int(os.environ.get("WEB_CONCURRENCY", 1)))
+
+
+@app.on_event("startup")
+def load_ownership_index():
+    if cfg["match.index"]:
+        with Session(future=True) as session:
+            greenbat.utils.ownership.index.load(session)
+
+
+@app.on_event("startup")
+def start_jobs_pool():
+    greenbat.utils.jobs.pool.start()
+
+
+@app.on_event("shutdown")
+def stop_jobs_pool():
+    greenbat.utils.jobs.pool.stop()
@@ -0,0 +1,6 @@
+"""
+Benchmarks comparing the optimized paths of the API with the ones they replaced.
+
+Every benchmark is a module runnable with ``python -m greenbat.benchmarks.<name>``; benchmarks needing data seed it
+into the configured database in a transaction which is rolled back once they are done.
+"""
@@ -0,0 +1,211 @@
+"""
+Load test of the async engine and session the routes use, against the sync ones they replaced.
+
+Serves the same route twice from a separate :mod:`uvicorn` process: ``/async/{id}`` retrieves an element through
+:mod:`greenbat.utils.aqueries` and the async engine, as all the routes of the API do, while ``/sync/{id}`` is a plain
+``def`` retrieving it through :mod:`greenbat.utils.queries` and the sync engine, as the routes did before, and is
+therefore run in the threadpool of Starlette. Both then serialize the element in the same way.
+
+Every variant is hammered by many concurrent keep-alive clients for a fixed time, measuring the throughput and the
+latency of the requests. The seeded data is deleted once the benchmark is done.
+
+Run with::
+
+    python -m greenbat.benchmarks.aio [--clients 256] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import fastapi as f
+import sqlalchemy.ext.asyncio as sa
+import sqlalchemy.orm as so
+import sqlalchemy.sql as ss
+
+import greenbat.models as models
+import greenbat.dependencies as deps
+import greenbat.database.tables as tables
+import greenbat.utils.aqueries as aqueries
+import greenbat.utils.queries as queries
+import greenbat.utils.serializers as serializers
+from greenbat.database.engine import Session
+
+
+log = logging.getLogger(__name__)
+
+PREFIX = "benchmark|"
+
+app = f.FastAPI()
+
+
+@app.get("/async/{id}")
+async def _(
+        *,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        id: int = f.Path(...),
+):
+    element = await aqueries.retrieve(session, tables.Element, tables.Element.id == id, model=models.retrieve.ElementRetrieve)
+    return serializers.response_one(element, models.retrieve.ElementRetrieve)
+
+
+@app.get("/sync/{id}")
+def _(
+        *,
+        session: so.Session = f.Depends(deps.dep_session),
+        id: int = f.Path(...),
+):
+    element = queries.retrieve(session, tables.Element, tables.Element.id == id, model=models.retrieve.ElementRetrieve)
+    return serializers.response_one(element, models.retrieve.ElementRetrieve)
+
+
+def seed(session: so.Session, users: int, library: int) -> list[int]:
+    """
+    Create `users` users owning `library` new games each, committing the session, and return the ids of their elements.
+    """
+
+    first = (session.execute(ss.select(ss.func.max(tables.Game.id))).scalar() or 0) + 1
+    session.execute(ss.text("INSERT INTO games (id) SELECT generate_series(:first, :last)"), {"first": first, "last": first + library - 1})
+    session.execute(ss.text("""
+        INSERT INTO users (sub, name, picture, last_update)
+        SELECT :prefix || n, 'Benchmark ' || n, 'https://example.org/picture.png', now()
+        FROM generate_series(1, :users) AS n
+    """), {"prefix": PREFIX, "users": users})
+    ids = session.execute(ss.text("""
+        INSERT INTO elements (owner_id, game_id)
+        SELECT :prefix || n, game
+        FROM generate_series(1, :users) AS n, generate_series(:first, :last) AS game
+        RETURNING id
+    """), {"prefix": PREFIX, "users": users, "first": first, "last": first + library - 1}).scalars().all()
+    session.execute(ss.text("""
+        INSERT INTO metadata_custom (game_id, creator_sub, title)
+        SELECT generate_series(:first, :last), :prefix || 1, 'Benchmark'
+    """), {"prefix": PREFIX, "first": first, "last": first + library - 1})
+    session.commit()
+    return ids
+
+
+def clean(session: so.Session) -> None:
+    """
+    Delete the elements, games and users created by :func:`seed`, committing the session.
+    """
+
+    game_ids = session.execute(
+        ss.delete(tables.Element)
+        .where(tables.Element.owner_id.startswith(PREFIX))
+        .returning(tables.Element.game_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    session.execute(ss.delete(tables.MetadataCustom).where(tables.MetadataCustom.creator_sub.startswith(PREFIX)).execution_options(synchronize_session=False))
+    session.execute(ss.delete(tables.Game).where(tables.Game.id.in_(set(game_ids))))
+    session.execute(ss.delete(tables.User).where(tables.User.sub.startswith(PREFIX)).execution_options(synchronize_session=False))
+    session.commit()
+
+
+async def client(port: int, paths: list[str], deadline: float, timeout: float, timings: list[float], errors: list[str]) -> None:
+    """
+    Request random paths on a single keep-alive connection until `deadline`, collecting the latencies in ms.
+
+    A request taking more than `timeout` seconds is counted as an error, and stops the client.
+    """
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+    async def request(path: str) -> str:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        length = next(int(line.split(":", 1)[1]) for line in head if line.lower().startswith("content-length:"))
+        await reader.readexactly(length)
+        return head[0]
+
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(request(random.choice(paths)), timeout)
+            except asyncio.TimeoutError:
+                errors.append("timeout")
+                return
+            timings.append((time.perf_counter() - start) * 1000)
+            if not status.startswith("HTTP/1.1 200"):
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def hammer(port: int, paths: list[str], clients: int, duration: float, timeout: float) -> tuple[list[float], list[str]]:
+    timings, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[client(port, paths, deadline, timeout, timings, errors) for _ in range(clients)])
+    return timings, errors
+
+
+async def wait_for(port: int, timeout: float = 30) -> None:
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+        else:
+            writer.close()
+            return
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the async routes of Greenbat against sync ones.")
+    parser.add_argument("--clients", type=int, nargs="+", default=[16, 256], help="The numbers of clients that should send requests concurrently.")
+    parser.add_argument("--duration", type=float, default=10, help="For how many seconds every variant should be load tested.")
+    parser.add_argument("--timeout", type=float, default=30, help="After how many seconds a request is considered failed.")
+    parser.add_argument("--users", type=int, default=100, help="How many users to seed.")
+    parser.add_argument("--library", type=int, default=100, help="How many elements every seeded user owns.")
+    parser.add_argument("--port", type=int, default=30045, help="The port to serve the benchmarked routes on.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    with Session(future=True) as session:
+        # Remove the leftovers of interrupted runs
+        clean(session)
+        ids = seed(session, args.users, args.library)
+
+    try:
+        log.info("variant\tclients\trequests/s\tmedian\tp99\terrors")
+        for variant in ["sync", "async"]:
+            paths = [f"/{variant}/{id}" for id in ids]
+            for clients in args.clients:
+                # Every run gets a new server, so that a stalled run cannot affect the following ones
+                server = subprocess.Popen([
+                    sys.executable, "-m", "uvicorn", "greenbat.benchmarks.aio:app",
+                    "--port", str(args.port), "--log-level", "critical", "--no-access-log",
+                ])
+                try:
+                    asyncio.run(wait_for(args.port))
+                    timings, errors = asyncio.run(hammer(args.port, paths, clients, args.duration, args.timeout))
+                finally:
+                    server.terminate()
+                    try:
+                        server.wait(timeout=5)
+                    except subprocess.TimeoutExpired:
+                        # A stalled server waits forever for its requests to complete
+                        server.kill()
+                        server.wait()
+
+                timings.sort()
+                median, p99 = (statistics.median(timings), timings[int(len(timings) * 0.99)]) if timings else (0, 0)
+                log.info(f"{variant}\t{clients}\t{len(timings) / args.duration:.0f}\t{median:.1f} ms\t{p99:.1f} ms\t{len(errors)}")
+    finally:
+        with Session(future=True) as session:
+            clean(session)
+
+
+if __name__ == "__main__":
+    main()
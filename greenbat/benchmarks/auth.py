@@ -0,0 +1,106 @@
+"""
+Benchmark of the cost of authenticating a request with :func:`greenbat.dependencies.dep_claims`, before and after
+the claims of verified tokens were cached.
+
+Signs tokens with a freshly generated RSA key, and measures the time taken to extract their claims:
+
+- without the cache, verifying every token with each of the :data:`greenbat.auth.verifiers`, as before;
+- with the cache, for tokens whose claims are already cached.
+
+Run with::
+
+    python -m greenbat.benchmarks.auth [--requests 2000]
+"""
+
+import argparse
+import logging
+import statistics
+import time
+
+import jose.jwk
+import jose.jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import greenbat.auth as auth
+import greenbat.dependencies as deps
+
+
+log = logging.getLogger(__name__)
+
+
+def keys() -> tuple[bytes, dict]:
+    """
+    Generate a RSA key pair, returning the private key in PEM format and the public key as a JWK.
+    """
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    public = key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return private, {**jose.jwk.construct(public, "RS256").to_dict(), "kid": "benchmark"}
+
+
+def token(private: bytes, sub: str) -> str:
+    now = int(time.time())
+    return jose.jwt.encode({
+        "iss": "benchmark",
+        "sub": sub,
+        "aud": auth.audience,
+        "iat": now,
+        "exp": now + 3600,
+        "azp": "benchmark",
+        "scope": "openid profile email",
+        "https://meta.ryg.one/name": sub,
+        "https://meta.ryg.one/picture": "https://example.org/picture.png",
+    }, private, algorithm="RS256", headers={"kid": "benchmark"})
+
+
+def measure(tokens: list[str], jwks: auth.JWKSProvider) -> tuple[float, float]:
+    """
+    Extract the claims of every token, returning the median and the 99th percentile of the time taken, in µs.
+    """
+
+    timings = []
+    for value in tokens:
+        start = time.perf_counter()
+        deps.dep_claims(token=value, jwks=jwks)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the authentication of requests to Greenbat, with and without the claims cache.")
+    parser.add_argument("--requests", type=int, default=2000, help="How many requests to authenticate for every case.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    private, public = keys()
+    jwks = auth.JWKSProvider(fetch=lambda: {"keys": [public]}, ttl=3600, cooldown=60)
+    tokens = [token(private, f"benchmark|{n}") for n in range(args.requests)]
+
+    log.info("case\tmedian\tp99")
+    cache, verify = auth.claims_cache, auth.verify
+    try:
+        for name, verifier in auth.verifiers.items():
+            try:
+                verifier(tokens[0], jwks["benchmark"])
+            except ImportError:
+                log.info(f"uncached ({name})\tnot installed")
+                continue
+            # A cache of size zero drops every entry as soon as it is put in it
+            auth.claims_cache, auth.verify = auth.ClaimsCache(size=0), verifier
+            median, p99 = measure(tokens, jwks)
+            log.info(f"uncached ({name})\t{median:.1f} µs\t{p99:.1f} µs")
+
+        auth.claims_cache, auth.verify = auth.ClaimsCache(size=len(tokens)), verify
+        measure(tokens, jwks)
+        median, p99 = measure(tokens, jwks)
+        log.info(f"cached\t{median:.1f} µs\t{p99:.1f} µs")
+    finally:
+        auth.claims_cache, auth.verify = cache, verify
+
+
+if __name__ == "__main__":
+    main()
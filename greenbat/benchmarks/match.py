@@ -0,0 +1,149 @@
+"""
+Benchmark of :class:`greenbat.utils.ownership.OwnershipIndex` against the SQL queries of ``/match``.
+
+Seeds libraries of random games, skewed towards the most popular ones, for an increasing number of users, and for each
+number of users measures:
+
+- the time and memory taken to load the index;
+- the time taken to compute the shared and combined games of random groups of users, both with the index and with the
+  queries ``/match`` runs when the index is disabled.
+
+Run with::
+
+    python -m greenbat.benchmarks.match [--users 1000 10000 100000] [--library 100] [--games 150000]
+"""
+
+import argparse
+import logging
+import random
+import statistics
+import sys
+import time
+import typing as t
+
+import sqlalchemy as s
+import sqlalchemy.orm as so
+import sqlalchemy.sql as ss
+
+import greenbat.database.tables as tables
+import greenbat.utils.ownership as ownership
+from greenbat.database.engine import Session
+
+
+log = logging.getLogger(__name__)
+
+PREFIX = "benchmark|"
+
+
+def seed(session: so.Session, start: int, stop: int, library: int, game_ids: tuple[int, int]) -> None:
+    """
+    Create the users numbered from `start` to `stop`, each owning about `library` random games.
+    """
+
+    session.execute(ss.text("""
+        INSERT INTO users (sub, name, picture, last_update)
+        SELECT :prefix || n, 'Benchmark ' || n, 'https://example.org/picture.png', now()
+        FROM generate_series(:start, :stop - 1) AS n
+    """), {"prefix": PREFIX, "start": start, "stop": stop})
+
+    # Cubing a uniform value makes the games with the lowest ids the most popular
+    session.execute(ss.text("""
+        INSERT INTO elements (owner_id, game_id)
+        SELECT :prefix || n, :first + floor((:last - :first + 1) * power(random(), 3))::bigint
+        FROM generate_series(:start, :stop - 1) AS n, generate_series(1, :library)
+        ON CONFLICT DO NOTHING
+    """), {"prefix": PREFIX, "start": start, "stop": stop, "library": library, "first": game_ids[0], "last": game_ids[1]})
+
+    session.execute(ss.text("ANALYZE users, elements"))
+
+
+def sql_shared(session: so.Session, subs: list[str]) -> list[int]:
+    return list(session.execute(
+        ss.select(tables.Element.game_id)
+        .where(tables.Element.owner_id.in_(subs))
+        .group_by(tables.Element.game_id)
+        .having(s.func.count(s.distinct(tables.Element.owner_id)) == len(subs))
+    ).scalars())
+
+
+def sql_combined(session: so.Session, subs: list[str]) -> list[int]:
+    return list(session.execute(
+        ss.select(tables.Element.game_id)
+        .where(tables.Element.owner_id.in_(subs))
+        .distinct()
+    ).scalars())
+
+
+def memory(index: ownership.OwnershipIndex) -> int:
+    """
+    Get the number of bytes taken by the libraries of the passed index, including the overhead of the Python objects.
+    """
+
+    total = sys.getsizeof(index.libraries)
+    for sub, bitmap in index.libraries.items():
+        total += sys.getsizeof(sub) + sys.getsizeof(bitmap) + sys.getsizeof(bitmap.chunks)
+        total += sum(sys.getsizeof(container) for container in bitmap.chunks.values())
+    return total
+
+
+def measure(function: t.Callable, groups: list[list[str]]) -> tuple[float, float]:
+    """
+    Call `function` with every group of subs, returning the median and the 99th percentile of the time taken, in ms.
+    """
+
+    timings = []
+    for group in groups:
+        start = time.perf_counter()
+        function(group)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the ownership index of Greenbat against the SQL queries of /match.")
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000], help="The numbers of users to benchmark with, in increasing order.")
+    parser.add_argument("--library", type=int, default=100, help="How many games every user owns, at most.")
+    parser.add_argument("--games", type=int, default=150000, help="How many games the catalog contains.")
+    parser.add_argument("--queries", type=int, default=200, help="How many random groups of users to match for every number of users.")
+    parser.add_argument("--group", type=int, default=3, help="How many users every group contains.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    rng = random.Random(0)
+
+    with Session(future=True) as session:
+        # Seed new games after the existing ones, so that the ids are as large as in a database containing the catalog
+        first = (session.execute(ss.select(s.func.max(tables.Game.id))).scalar() or 0) + 1
+        game_ids = (first, first + args.games - 1)
+        session.execute(ss.text("INSERT INTO games (id) SELECT generate_series(:first, :last)"), {"first": game_ids[0], "last": game_ids[1]})
+
+        log.info("users\tindex load\tindex memory\tshared (SQL)\tshared (index)\tcombined (SQL)\tcombined (index)")
+        seeded = 0
+        for users in args.users:
+            seed(session, seeded, users, args.library, game_ids)
+            seeded = users
+
+            index = ownership.OwnershipIndex()
+            start = time.perf_counter()
+            index.load(session)
+            load_time = time.perf_counter() - start
+
+            groups = [[f"{PREFIX}{n}" for n in rng.sample(range(users), args.group)] for _ in range(args.queries)]
+            timings = [
+                measure(lambda subs: sql_shared(session, subs), groups),
+                measure(index.shared, groups),
+                measure(lambda subs: sql_combined(session, subs), groups),
+                measure(index.combined, groups),
+            ]
+
+            log.info(
+                f"{users}\t{load_time:.1f} s\t{memory(index) / 2 ** 20:.1f} MiB\t"
+                + "\t".join(f"{median:.2f}/{p99:.2f} ms" for median, p99 in timings)
+            )
+
+        session.rollback()
+
+
+if __name__ == "__main__":
+    main()
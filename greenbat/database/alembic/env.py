@@ -15,6 +15,15 @@ logging.config.fileConfig(alembic.context.config.config_file_name)
 target_metadata = Base.metadata
 
 
+def include_object(obj, name, type_, reflected, compare_to):
+    """
+    Exclude from the autogenerated migrations the indexes of the trigram search backend, which are created by
+    ``python -m greenbat.utils.search`` instead.
+    """
+
+    return not (type_ == "index" and reflected and name.endswith("_title_trgm"))
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -31,6 +40,7 @@ def run_migrations_offline():
     alembic.context.configure(
         url=greenbat.config.cfg["database.uri"],
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -48,7 +58,7 @@ def run_migrations_online():
     """
     with greenbat.database.engine.engine.connect() as connection:
         alembic.context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with alembic.context.begin_transaction():
@@ -0,0 +1,58 @@
+"""Add the game_stats table, and index the elements by game and id
+
+Revision ID: 0d9b5e7a3c18
+Revises: f2c6d8a4b391
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import greenbat.database.types
+
+
+# revision identifiers, used by Alembic.
+revision = '0d9b5e7a3c18'
+down_revision = 'f2c6d8a4b391'
+branch_labels = None
+depends_on = None
+
+
+ratings = ['DISLIKED', 'MIXED', 'LIKED', 'LOVED']
+completitions = ['UNPLAYED', 'STARTED', 'BEATEN', 'COMPLETED', 'MASTERED', 'NOT_APPLICABLE']
+
+# The counters, and the conditions on the elements they count
+counters = {
+    'owners': 'TRUE',
+    **{f'rating_{value.lower()}': f"rating = '{value}'" for value in ratings},
+    'no_rating': 'rating IS NULL',
+    **{f'completition_{value.lower()}': f"completition = '{value}'" for value in completitions},
+    'no_completition': 'completition IS NULL',
+}
+
+
+def upgrade():
+    op.create_table(
+        'game_stats',
+        sa.Column('game_id', sa.Integer(), nullable=False),
+        *[sa.Column(counter, sa.BigInteger(), nullable=False) for counter in counters],
+        sa.ForeignKeyConstraint(['game_id'], ['games.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('game_id'),
+    )
+
+    # Count the existing elements, blocking writes to them until the migration is committed
+    op.execute("LOCK TABLE elements IN SHARE MODE")
+    op.execute(f"""
+        INSERT INTO game_stats (game_id, {', '.join(counters)})
+        SELECT game_id, {', '.join(f'count(*) FILTER (WHERE {condition})' for condition in counters.values())}
+        FROM elements
+        GROUP BY game_id
+    """)
+
+    op.create_index('ix_elements_game_id_id', 'elements', ['game_id', 'id'], unique=False)
+    op.drop_index('ix_elements_game_id', table_name='elements')
+
+
+def downgrade():
+    op.create_index('ix_elements_game_id', 'elements', ['game_id'], unique=False)
+    op.drop_index('ix_elements_game_id_id', table_name='elements')
+    op.drop_table('game_stats')
@@ -0,0 +1,72 @@
+"""Index the columns used to filter elements and custom metadata
+
+Revision ID: 3c5e1f0a9b2d
+Revises: 8bd6940c3fcd
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+import logging
+from alembic import op, context
+import sqlalchemy as sa
+import greenbat.database.types
+
+
+# revision identifiers, used by Alembic.
+revision = '3c5e1f0a9b2d'
+down_revision = '8bd6940c3fcd'
+branch_labels = None
+depends_on = None
+
+
+log = logging.getLogger(f"alembic.versions.{revision}")
+
+
+def upgrade():
+    # A library can contain a game only once: move the duplicates away, keeping the oldest element, so that the
+    # ratings and completitions of the removed ones can still be recovered
+    op.execute("""
+        CREATE TABLE elements_duplicates AS
+        SELECT duplicate.*
+        FROM elements AS duplicate
+        WHERE EXISTS (
+            SELECT 1
+            FROM elements AS original
+            WHERE original.owner_id = duplicate.owner_id
+              AND original.game_id = duplicate.game_id
+              AND original.id < duplicate.id
+        );
+    """)
+    op.execute("DELETE FROM elements WHERE id IN (SELECT id FROM elements_duplicates);")
+
+    if not context.is_offline_mode():
+        removed = op.get_bind().execute(sa.text("SELECT count(*) FROM elements_duplicates")).scalar()
+        if removed:
+            log.warning(f"Removed {removed} duplicate elements, which were copied to the elements_duplicates table")
+        else:
+            op.drop_table('elements_duplicates')
+
+    op.create_index('ix_elements_owner_id_game_id', 'elements', ['owner_id', 'game_id'], unique=True)
+    op.create_index('ix_elements_owner_id_id', 'elements', ['owner_id', 'id'], unique=False)
+    op.create_index('ix_elements_game_id', 'elements', ['game_id'], unique=False)
+    op.create_index('ix_metadata_custom_creator_sub', 'metadata_custom', ['creator_sub'], unique=False)
+    op.create_index('ix_accounts_steam_owner_id', 'accounts_steam', ['owner_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_accounts_steam_owner_id', table_name='accounts_steam')
+    op.drop_index('ix_metadata_custom_creator_sub', table_name='metadata_custom')
+    op.drop_index('ix_elements_game_id', table_name='elements')
+    op.drop_index('ix_elements_owner_id_id', table_name='elements')
+    op.drop_index('ix_elements_owner_id_game_id', table_name='elements')
+
+    # Restore the duplicates removed by the upgrade, if any
+    op.execute("""
+        DO $$
+        BEGIN
+            IF to_regclass('elements_duplicates') IS NOT NULL THEN
+                INSERT INTO elements SELECT * FROM elements_duplicates;
+                DROP TABLE elements_duplicates;
+            END IF;
+        END
+        $$;
+    """)
@@ -0,0 +1,47 @@
+"""Add the jobs table
+
+Revision ID: 5a7d2c4e8f10
+Revises: 3c5e1f0a9b2d
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql as sp
+import greenbat.database.types
+
+
+# revision identifiers, used by Alembic.
+revision = '5a7d2c4e8f10'
+down_revision = '3c5e1f0a9b2d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('owner_id', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'DONE', 'FAILED', name='jobstatus'), nullable=False),
+        sa.Column('progress', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=True),
+        sa.Column('result', sp.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created', sa.DateTime(), nullable=False),
+        sa.Column('updated', sa.DateTime(), nullable=False),
+        sa.Column('started', sa.DateTime(), nullable=True),
+        sa.Column('finished', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.sub'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_jobs_owner_id_kind_active', 'jobs', ['owner_id', 'kind'], unique=True, postgresql_where=sa.text("status IN ('QUEUED', 'RUNNING')"))
+    op.create_index('ix_jobs_status_id', 'jobs', ['status', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_jobs_status_id', table_name='jobs')
+    op.drop_index('ix_jobs_owner_id_kind_active', table_name='jobs')
+    op.drop_table('jobs')
+    sp.ENUM(name='jobstatus').drop(op.get_bind())
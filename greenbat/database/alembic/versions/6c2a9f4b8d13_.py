@@ -0,0 +1,24 @@
+"""Count the claims of the jobs
+
+Revision ID: 6c2a9f4b8d13
+Revises: 0d9b5e7a3c18
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c2a9f4b8d13'
+down_revision = '0d9b5e7a3c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('jobs', sa.Column('attempt', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('jobs', 'attempt')
@@ -0,0 +1,32 @@
+"""Index the titles of the games for searches
+
+Revision ID: 9e1b7c3d5a42
+Revises: 5a7d2c4e8f10
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import greenbat.database.types
+
+
+# revision identifiers, used by Alembic.
+revision = '9e1b7c3d5a42'
+down_revision = '5a7d2c4e8f10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ['metadata_steam', 'metadata_custom']:
+        op.create_index(f'ix_{table}_title_prefix', table, [sa.text('lower(title) COLLATE "C"')], unique=False)
+
+    # The pg_trgm extension may not be available, so the indexes of the trigram search backend are never created by
+    # the migrations, but by `python -m greenbat.utils.search`
+
+
+def downgrade():
+    for table in ['metadata_custom', 'metadata_steam']:
+        # Created outside of the migrations, if the trigram search backend was ever enabled
+        op.execute(f'DROP INDEX IF EXISTS ix_{table}_title_trgm')
+        op.drop_index(f'ix_{table}_title_prefix', table_name=table)
@@ -0,0 +1,31 @@
+"""Add the versions table
+
+Revision ID: b4f0c8e2d716
+Revises: 9e1b7c3d5a42
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import greenbat.database.types
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4f0c8e2d716'
+down_revision = '9e1b7c3d5a42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'versions',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('updated', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+
+
+def downgrade():
+    op.drop_table('versions')
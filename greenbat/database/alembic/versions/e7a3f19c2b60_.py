@@ -0,0 +1,46 @@
+"""Add the element_changes table
+
+Revision ID: e7a3f19c2b60
+Revises: b4f0c8e2d716
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql as sp
+import greenbat.database.types
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3f19c2b60'
+down_revision = 'b4f0c8e2d716'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'element_changes',
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.Column('owner_id', sa.String(), nullable=False),
+        sa.Column('element_id', sa.BigInteger(), nullable=False),
+        sa.Column('game_id', sa.BigInteger(), nullable=False),
+        sa.Column('kind', sa.Enum('CREATED', 'UPDATED', 'DELETED', name='changekind'), nullable=False),
+        sa.Column('rating', sp.ENUM(name='rating', create_type=False), nullable=True),
+        sa.Column('completition', sp.ENUM(name='completition', create_type=False), nullable=True),
+        sa.Column('created', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.sub'], ),
+        sa.PrimaryKeyConstraint('seq'),
+    )
+    op.create_index('ix_element_changes_owner_id_seq', 'element_changes', ['owner_id', 'seq'], unique=False)
+    # Log the creation of the existing elements, so that clients can replay the whole library from the start
+    op.execute(
+        "INSERT INTO element_changes (owner_id, element_id, game_id, kind, rating, completition, created) "
+        "SELECT owner_id, id, game_id, 'CREATED', rating, completition, now() FROM elements ORDER BY id"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_element_changes_owner_id_seq', table_name='element_changes')
+    op.drop_table('element_changes')
+    sp.ENUM(name='changekind').drop(op.get_bind())
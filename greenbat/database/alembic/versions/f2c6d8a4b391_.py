@@ -0,0 +1,43 @@
+"""Add the library_stats table
+
+Revision ID: f2c6d8a4b391
+Revises: e7a3f19c2b60
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import greenbat.database.types
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6d8a4b391'
+down_revision = 'e7a3f19c2b60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'library_stats',
+        sa.Column('owner_id', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.sub'], ),
+        sa.PrimaryKeyConstraint('owner_id', 'key'),
+    )
+
+    # Count the existing elements, blocking writes to them until the migration is committed
+    op.execute("LOCK TABLE elements IN SHARE MODE")
+    op.execute("""
+        INSERT INTO library_stats (owner_id, key, count)
+        SELECT owner_id, 'total', count(*) FROM elements GROUP BY owner_id
+        UNION ALL
+        SELECT owner_id, 'rating:' || coalesce(rating::text, ''), count(*) FROM elements GROUP BY owner_id, rating
+        UNION ALL
+        SELECT owner_id, 'completition:' || coalesce(completition::text, ''), count(*) FROM elements GROUP BY owner_id, completition
+    """)
+
+
+def downgrade():
+    op.drop_table('library_stats')
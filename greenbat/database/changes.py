@@ -0,0 +1,179 @@
+"""
+Tracking of the changes made to :class:`.tables.Element`\\ s, so that data derived from them can be kept up to date.
+
+Changes made through the ORM are collected automatically when the session is flushed; changes made with bulk
+statements bypassing the ORM should be reported with :func:`record`.
+
+All the changes made by a transaction are also appended to the ``element_changes`` log right before it is committed,
+allowing clients to fetch only the changes made to a library after the last one they have seen.
+"""
+
+import datetime
+import typing as t
+import sqlalchemy as s
+import sqlalchemy.orm as so
+import sqlalchemy.sql as ss
+
+import greenbat.database.tables as tables
+import greenbat.database.enums as enums
+
+
+PENDING_KEY = "greenbat.changes.pending"
+
+
+class ElementState(t.NamedTuple):
+    """
+    The values of the columns of an element at a given moment.
+    """
+
+    owner_id: str
+    game_id: int
+    rating: t.Optional[enums.Rating]
+    completition: t.Optional[enums.Completition]
+
+
+class ElementChange(t.NamedTuple):
+    """
+    A change to a single element: ``before`` is :data:`None` for creations, ``after`` is :data:`None` for deletions.
+    """
+
+    id: int
+    before: t.Optional[ElementState]
+    after: t.Optional[ElementState]
+
+
+Handler = t.Callable[[list[ElementChange]], None]
+
+commit_handlers: list[Handler] = []
+
+
+def on_commit(handler: Handler) -> Handler:
+    """
+    Register a function to be called with the list of the changes made by every successfully committed transaction.
+    """
+
+    commit_handlers.append(handler)
+    return handler
+
+
+def record(session: so.Session, changes: t.Iterable[ElementChange]) -> None:
+    """
+    Record changes made to elements in the current transaction of the passed `session`.
+
+    :param session: The :class:`sqlalchemy.orm.Session` the changes were made in.
+    :param changes: The changes to record.
+    """
+
+    session.info.setdefault(PENDING_KEY, []).extend(changes)
+
+
+def record_rows(session: so.Session, table, rows: t.Iterable[tuple[t.Optional[t.Mapping], t.Optional[t.Mapping]]]) -> None:
+    """
+    Record changes made to rows of `table` with statements bypassing the ORM, such as ``UPDATE ... RETURNING``.
+
+    Changes to tables other than ``elements`` are ignored.
+
+    :param session: The :class:`sqlalchemy.orm.Session` the changes were made in.
+    :param table: The table the rows belong to.
+    :param rows: Pairs of column mappings of each row, before and after the change; use :data:`None` for the missing
+                 side of creations and deletions.
+    """
+
+    if table is not tables.Element:
+        return
+
+    def state(row: t.Optional[t.Mapping]) -> t.Optional[ElementState]:
+        if row is None:
+            return None
+        return ElementState(**{key: row[key] for key in ElementState._fields})
+
+    record(session, [
+        ElementChange(id=(before or after)["id"], before=state(before), after=state(after))
+        for before, after in rows
+    ])
+
+
+def state_of(obj: tables.Element) -> ElementState:
+    return ElementState(owner_id=obj.owner_id, game_id=obj.game_id, rating=obj.rating, completition=obj.completition)
+
+
+def state_before(obj: tables.Element) -> ElementState:
+    def before(key: str):
+        history = so.attributes.get_history(obj, key)
+        return history.deleted[0] if history.deleted else getattr(obj, key)
+
+    return ElementState(*map(before, ElementState._fields))
+
+
+@s.event.listens_for(so.Session, "after_flush")
+def _collect(session: so.Session, _flush_context) -> None:
+    changes = []
+
+    for obj in session.new:
+        if isinstance(obj, tables.Element):
+            changes.append(ElementChange(id=obj.id, before=None, after=state_of(obj)))
+
+    for obj in session.dirty:
+        if isinstance(obj, tables.Element) and session.is_modified(obj):
+            before, after = state_before(obj), state_of(obj)
+            if before != after:
+                changes.append(ElementChange(id=obj.id, before=before, after=after))
+
+    for obj in session.deleted:
+        if isinstance(obj, tables.Element):
+            changes.append(ElementChange(id=obj.id, before=state_before(obj), after=None))
+
+    if changes:
+        record(session, changes)
+
+
+def log_entries(change: ElementChange) -> list[dict[str, t.Any]]:
+    """
+    Get the values of the ``element_changes`` rows logging the passed change.
+
+    Moving an element to another owner is logged as a deletion from the library of the old owner and a creation in
+    the library of the new one.
+    """
+
+    def entry(state: ElementState, kind: enums.ChangeKind) -> dict[str, t.Any]:
+        return {"element_id": change.id, "kind": kind, **state._asdict()}
+
+    if change.before is None:
+        return [entry(change.after, enums.ChangeKind.CREATED)]
+    elif change.after is None:
+        return [entry(change.before, enums.ChangeKind.DELETED)]
+    elif change.before.owner_id != change.after.owner_id:
+        return [entry(change.before, enums.ChangeKind.DELETED), entry(change.after, enums.ChangeKind.CREATED)]
+    return [entry(change.after, enums.ChangeKind.UPDATED)]
+
+
+@s.event.listens_for(so.Session, "before_commit")
+def _log(session: so.Session) -> None:
+    session.flush()
+    pending = session.info.get(PENDING_KEY)
+    if not pending:
+        return
+
+    created = datetime.datetime.now()
+    entries = [{**entry, "created": created} for change in pending for entry in log_entries(change)]
+
+    # Serialize the transactions logging changes of the same user, so that their entries are committed in the same
+    # order as their seqs, and a client can never see an entry before another one with a lower seq is committed
+    for owner_id in sorted({entry["owner_id"] for entry in entries}):
+        session.execute(ss.select(ss.func.pg_advisory_xact_lock(ss.func.hashtext(f"element_changes:{owner_id}"))))
+
+    session.execute(ss.insert(tables.ElementChangeLog), entries)
+
+
+@s.event.listens_for(so.Session, "after_commit")
+def _dispatch(session: so.Session) -> None:
+    changes = session.info.pop(PENDING_KEY, None)
+    if not changes:
+        return
+    for handler in commit_handlers:
+        handler(changes)
+
+
+@s.event.listens_for(so.Session, "after_rollback")
+def _discard(session: so.Session) -> None:
+    session.info.pop(PENDING_KEY, None)
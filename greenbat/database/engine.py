@@ -1,6 +1,20 @@
 import sqlalchemy.orm
+import sqlalchemy.ext.asyncio
 import greenbat.config
 
 
 engine = sqlalchemy.create_engine(greenbat.config.cfg["database.uri"])
 Session = sqlalchemy.orm.sessionmaker(bind=engine)
+
+
+async_engine = sqlalchemy.ext.asyncio.create_async_engine(
+    greenbat.config.cfg["database.asyncuri"],
+    pool_size=greenbat.config.cfg["database.pool.size"],
+    max_overflow=greenbat.config.cfg["database.pool.overflow"],
+)
+AsyncSession = sqlalchemy.orm.sessionmaker(
+    bind=async_engine,
+    class_=sqlalchemy.ext.asyncio.AsyncSession,
+    expire_on_commit=False,
+    future=True,
+)
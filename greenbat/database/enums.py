@@ -15,3 +15,22 @@ class Completition(str, enum.Enum):
     COMPLETED = "COMPLETED"
     MASTERED = "MASTERED"
     NOT_APPLICABLE = "NOT_APPLICABLE"
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+class ChangeKind(str, enum.Enum):
+    CREATED = "CREATED"
+    UPDATED = "UPDATED"
+    DELETED = "DELETED"
+
+
+class OperationKind(str, enum.Enum):
+    CREATE = "CREATE"
+    UPDATE = "UPDATE"
+    DELETE = "DELETE"
@@ -0,0 +1,249 @@
+"""
+Counters of the elements in the library of every user and of the elements referring to every game, so that their
+statistics can be read without scanning the elements.
+
+Every user has the following counters in ``library_stats``, missing ones counting zero:
+
+- ``total``, counting all their elements;
+- ``rating:{value}``, counting their elements with the given :class:`.enums.Rating`, or without one if empty;
+- ``completition:{value}``, counting their elements with the given :class:`.enums.Completition`, or without one if
+  empty.
+
+Every game has the same counters in a single row of ``game_stats``, one per column, as named by :func:`game_column`.
+
+The counters are updated from the changes collected by :mod:`greenbat.database.changes` with one statement per table
+right before each transaction is committed, so they are always consistent with the committed elements.
+
+The counters can be rebuilt from scratch with::
+
+    python -m greenbat.database.stats [SUB ...]
+
+which rebuilds the counters of the libraries of the users with the passed subs, or all the counters if none is passed.
+"""
+
+import argparse
+import collections
+import logging
+import typing as t
+import sqlalchemy as s
+import sqlalchemy.orm as so
+import sqlalchemy.sql as ss
+import sqlalchemy.dialects.postgresql as sp
+
+import greenbat.database.tables as tables
+import greenbat.database.enums as enums
+import greenbat.database.changes as changes
+import greenbat.utils.cache as cache
+from greenbat.database.engine import Session
+
+
+log = logging.getLogger(__name__)
+
+TOTAL = "total"
+
+
+def rating(value: t.Optional[str]) -> str:
+    return f"rating:{enums.Rating(value).value if value else ''}"
+
+
+def completition(value: t.Optional[str]) -> str:
+    return f"completition:{enums.Completition(value).value if value else ''}"
+
+
+def keys_of(state: changes.ElementState) -> list[str]:
+    """
+    Get the keys of the counters counting an element with the passed state.
+    """
+
+    return [TOTAL, rating(state.rating), completition(state.completition)]
+
+
+def game_column(key: str) -> str:
+    """
+    Get the name of the column of ``game_stats`` containing the counter with the passed `key`.
+    """
+
+    if key == TOTAL:
+        return tables.GameStats.owners.key
+    prefix, _, value = key.partition(":")
+    return f"{prefix}_{value.lower()}" if value else f"no_{prefix}"
+
+
+counter_columns = [column.key for column in tables.GameStats.__table__.columns if column.key != tables.GameStats.game_id.key]
+
+ROWS_PER_STATEMENT = 1000
+"""
+How many counters or games are upserted by each statement, as a statement cannot have more than 32767 parameters.
+"""
+
+
+class LibraryStats(t.NamedTuple):
+    total: int
+    rating: dict[enums.Rating, int]
+    completition: dict[enums.Completition, int]
+    no_rating: int
+    no_completition: int
+
+
+def read(session: so.Session, owner_id: str) -> LibraryStats:
+    """
+    Read the statistics of the library of the user with the passed `owner_id` from its counters.
+    """
+
+    counts = dict(session.execute(
+        ss.select(tables.LibraryStat.key, tables.LibraryStat.count).where(tables.LibraryStat.owner_id == owner_id)
+    ).all())
+
+    return LibraryStats(
+        total=counts.get(TOTAL, 0),
+        rating={value: counts.get(rating(value), 0) for value in enums.Rating},
+        completition={value: counts.get(completition(value), 0) for value in enums.Completition},
+        no_rating=counts.get(rating(None), 0),
+        no_completition=counts.get(completition(None), 0),
+    )
+
+
+def rebuild_libraries(session: so.Session, owner_ids: t.Optional[list[str]] = None) -> int:
+    """
+    Recount the counters of the libraries of the users with the passed `owner_ids`, or of all the users if
+    :data:`None`, **without committing the session**.
+
+    Writes to elements are blocked until the session is committed.
+
+    :return: The number of counters written.
+    """
+
+    session.execute(ss.text(f"LOCK TABLE {tables.Element.__tablename__} IN SHARE MODE"))
+    cache.touch(session, [tables.LibraryStat.__tablename__])
+
+    delete = ss.delete(tables.LibraryStat)
+    elements = ss.select(tables.Element.owner_id, tables.Element.rating, tables.Element.completition)
+    if owner_ids is not None:
+        delete = delete.where(tables.LibraryStat.owner_id.in_(owner_ids))
+        elements = elements.where(tables.Element.owner_id.in_(owner_ids))
+    session.execute(delete)
+
+    elements = elements.subquery()
+    empty = ss.literal("")
+    counted = ss.union_all(*[
+        ss.select(elements.c.owner_id, ss.literal(prefix) + ss.func.coalesce(ss.cast(column, s.String), empty), ss.func.count())
+        .group_by(elements.c.owner_id, column)
+        for prefix, column in [
+            ("rating:", elements.c.rating),
+            ("completition:", elements.c.completition),
+        ]
+    ], (
+        ss.select(elements.c.owner_id, ss.literal(TOTAL), ss.func.count())
+        .group_by(elements.c.owner_id)
+    ))
+
+    return session.execute(
+        ss.insert(tables.LibraryStat)
+        .from_select([tables.LibraryStat.owner_id, tables.LibraryStat.key, tables.LibraryStat.count], counted)
+    ).rowcount
+
+
+def rebuild_games(session: so.Session) -> int:
+    """
+    Recount the counters of all the games, **without committing the session**.
+
+    Writes to elements are blocked until the session is committed.
+
+    :return: The number of games with at least an element.
+    """
+
+    session.execute(ss.text(f"LOCK TABLE {tables.Element.__tablename__} IN SHARE MODE"))
+    cache.touch(session, [tables.GameStats.__tablename__])
+    session.execute(ss.delete(tables.GameStats))
+
+    def count(key: str, condition=None):
+        counter = ss.func.count() if condition is None else ss.func.count().filter(condition)
+        return counter.label(game_column(key))
+
+    counters = [
+        count(TOTAL),
+        *[count(rating(value), tables.Element.rating == value) for value in enums.Rating],
+        count(rating(None), tables.Element.rating.is_(None)),
+        *[count(completition(value), tables.Element.completition == value) for value in enums.Completition],
+        count(completition(None), tables.Element.completition.is_(None)),
+    ]
+
+    return session.execute(
+        ss.insert(tables.GameStats)
+        .from_select(
+            [tables.GameStats.game_id.key, *[counter.name for counter in counters]],
+            ss.select(tables.Element.game_id, *counters).group_by(tables.Element.game_id),
+        )
+    ).rowcount
+
+
+@s.event.listens_for(so.Session, "before_commit")
+def _count(session: so.Session) -> None:
+    session.flush()
+
+    libraries, games = collections.Counter(), collections.Counter()
+    for change in session.info.get(changes.PENDING_KEY, []):
+        for state, sign in [(change.before, -1), (change.after, 1)]:
+            if state:
+                for key in keys_of(state):
+                    libraries[state.owner_id, key] += sign
+                    games[state.game_id, game_column(key)] += sign
+
+    # Sort the counters, so that concurrent transactions lock the same rows in the same order
+    libraries = sorted((identity, delta) for identity, delta in libraries.items() if delta)
+    for start in range(0, len(libraries), ROWS_PER_STATEMENT):
+        insert = sp.insert(tables.LibraryStat).values([
+            {"owner_id": owner_id, "key": key, "count": delta}
+            for (owner_id, key), delta in libraries[start:start + ROWS_PER_STATEMENT]
+        ])
+        session.execute(
+            insert.on_conflict_do_update(
+                index_elements=[tables.LibraryStat.owner_id, tables.LibraryStat.key],
+                set_={"count": tables.LibraryStat.count + insert.excluded["count"]},
+            )
+        )
+
+    rows = {}
+    for (game_id, column), delta in games.items():
+        if delta:
+            rows.setdefault(game_id, dict.fromkeys(counter_columns, 0))[column] = delta
+
+    game_ids = sorted(rows)
+    for start in range(0, len(game_ids), ROWS_PER_STATEMENT):
+        deltas = ss.values(
+            *[ss.column(column.key, column.type) for column in tables.GameStats.__table__.columns],
+            name="deltas",
+        ).data([(game_id, *rows[game_id].values()) for game_id in game_ids[start:start + ROWS_PER_STATEMENT]])
+        # Skip the games deleted in this transaction, whose elements have been deleted too
+        insert = sp.insert(tables.GameStats).from_select(
+            [column.key for column in tables.GameStats.__table__.columns],
+            ss.select(deltas).where(ss.exists().where(tables.Game.id == deltas.c.game_id)),
+        )
+        session.execute(
+            insert.on_conflict_do_update(
+                index_elements=[tables.GameStats.game_id],
+                set_={column: tables.GameStats.__table__.c[column] + insert.excluded[column] for column in counter_columns},
+            )
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the library and game statistics of Greenbat.")
+    parser.add_argument("subs", nargs="*", help="The subs of the users to rebuild the library statistics of; all the statistics if omitted.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    with Session(future=True) as session:
+        written = rebuild_libraries(session, args.subs or None)
+        log.info(f"Wrote {written} library counters")
+        if not args.subs:
+            written = rebuild_games(session)
+            log.info(f"Wrote the counters of {written} games")
+        session.commit()
+
+    cache.warn_unshared()
+
+
+if __name__ == "__main__":
+    main()
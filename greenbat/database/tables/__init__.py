@@ -5,3 +5,8 @@ from .accounts_steam import AccountSteam
 from .users import User
 from .metadata_steam import MetadataSteam
 from .metadata_custom import MetadataCustom
+from .jobs import Job
+from .versions import Version
+from .element_changes import ElementChangeLog
+from .library_stats import LibraryStat
+from .game_stats import GameStats
@@ -11,7 +11,7 @@ class AccountSteam(Base):
 
     steamid = s.Column(gt.SteamID, primary_key=True)
 
-    owner_id = s.Column(s.String, s.ForeignKey("users.sub"), nullable=False)
+    owner_id = s.Column(s.String, s.ForeignKey("users.sub"), nullable=False, index=True)
     last_update = s.Column(s.DateTime, nullable=False)
 
     owner = so.relationship("User", back_populates="accounts_steam")
@@ -0,0 +1,29 @@
+import sqlalchemy as s
+from greenbat.database.tables._base import Base
+from greenbat.database.enums import ChangeKind, Rating, Completition
+
+
+class ElementChangeLog(Base):
+    """
+    An entry of the log of the changes made to the elements of a user, ordered by `seq`.
+
+    Entries are never modified, and outlive the elements and the games they refer to, so that deletions can be
+    replayed too.
+    """
+
+    __tablename__ = "element_changes"
+    __table_args__ = (
+        s.Index("ix_element_changes_owner_id_seq", "owner_id", "seq"),
+    )
+
+    seq = s.Column(s.BigInteger, primary_key=True)
+
+    owner_id = s.Column(s.String, s.ForeignKey("users.sub"), nullable=False)
+    element_id = s.Column(s.BigInteger, nullable=False)
+    game_id = s.Column(s.BigInteger, nullable=False)
+    kind = s.Column(s.Enum(ChangeKind), nullable=False)
+
+    rating = s.Column(s.Enum(Rating))
+    completition = s.Column(s.Enum(Completition))
+
+    created = s.Column(s.DateTime, nullable=False)
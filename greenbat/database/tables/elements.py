@@ -9,6 +9,11 @@ from greenbat.database.enums import Rating, Completition
 
 class Element(Base):
     __tablename__ = "elements"
+    __table_args__ = (
+        s.Index("ix_elements_owner_id_game_id", "owner_id", "game_id", unique=True),
+        s.Index("ix_elements_owner_id_id", "owner_id", "id"),
+        s.Index("ix_elements_game_id_id", "game_id", "id"),
+    )
 
     id = s.Column(s.BigInteger, primary_key=True)
 
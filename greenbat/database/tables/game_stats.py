@@ -0,0 +1,39 @@
+import sqlalchemy as s
+from greenbat.database.tables._base import Base
+from greenbat.database.enums import Rating, Completition
+
+
+class GameStats(Base):
+    """
+    The number of elements referring to a game, counted by rating and by completition.
+
+    Kept up to date by :mod:`greenbat.database.stats`; games without elements may have no row at all.
+    """
+
+    __tablename__ = "game_stats"
+
+    game_id = s.Column(s.Integer, s.ForeignKey("games.id", ondelete="CASCADE"), primary_key=True)
+
+    owners = s.Column(s.BigInteger, nullable=False, default=0)
+
+    rating_disliked = s.Column(s.BigInteger, nullable=False, default=0)
+    rating_mixed = s.Column(s.BigInteger, nullable=False, default=0)
+    rating_liked = s.Column(s.BigInteger, nullable=False, default=0)
+    rating_loved = s.Column(s.BigInteger, nullable=False, default=0)
+    no_rating = s.Column(s.BigInteger, nullable=False, default=0)
+
+    completition_unplayed = s.Column(s.BigInteger, nullable=False, default=0)
+    completition_started = s.Column(s.BigInteger, nullable=False, default=0)
+    completition_beaten = s.Column(s.BigInteger, nullable=False, default=0)
+    completition_completed = s.Column(s.BigInteger, nullable=False, default=0)
+    completition_mastered = s.Column(s.BigInteger, nullable=False, default=0)
+    completition_not_applicable = s.Column(s.BigInteger, nullable=False, default=0)
+    no_completition = s.Column(s.BigInteger, nullable=False, default=0)
+
+    @property
+    def rating(self) -> dict[Rating, int]:
+        return {value: getattr(self, f"rating_{value.value.lower()}") for value in Rating}
+
+    @property
+    def completition(self) -> dict[Completition, int]:
+        return {value: getattr(self, f"completition_{value.value.lower()}") for value in Completition}
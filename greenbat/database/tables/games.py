@@ -12,3 +12,5 @@ class Game(Base):
     elements = so.relationship("Element", back_populates="game", cascade="all, delete-orphan")
     metadata_steam = so.relationship("MetadataSteam", back_populates="game", uselist=False, cascade="all, delete-orphan")
     metadata_custom = so.relationship("MetadataCustom", back_populates="game", uselist=False, cascade="all, delete-orphan")
+    # Written with bulk statements only, and deleted by the database together with the game
+    stats = so.relationship("GameStats", uselist=False, viewonly=True)
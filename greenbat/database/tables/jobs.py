@@ -0,0 +1,39 @@
+import sqlalchemy as s
+import sqlalchemy.orm as so
+import sqlalchemy.dialects.postgresql as sp
+from greenbat.database.tables._base import Base
+from greenbat.database.enums import JobStatus
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # A user can have at most one active job of each kind
+        s.Index(
+            "ix_jobs_owner_id_kind_active", "owner_id", "kind",
+            unique=True,
+            postgresql_where=s.text("status IN ('QUEUED', 'RUNNING')"),
+        ),
+        s.Index("ix_jobs_status_id", "status", "id"),
+    )
+
+    id = s.Column(s.BigInteger, primary_key=True)
+
+    owner_id = s.Column(s.String, s.ForeignKey("users.sub"), nullable=False)
+    kind = s.Column(s.String, nullable=False)
+    status = s.Column(s.Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+
+    # Incremented every time the job is claimed, so that a worker can tell whether its claim is still valid
+    attempt = s.Column(s.Integer, nullable=False, default=0, server_default="0")
+
+    progress = s.Column(s.Integer, nullable=False, default=0)
+    total = s.Column(s.Integer)
+    result = s.Column(sp.JSONB)
+    error = s.Column(s.String)
+
+    created = s.Column(s.DateTime, nullable=False)
+    updated = s.Column(s.DateTime, nullable=False)
+    started = s.Column(s.DateTime)
+    finished = s.Column(s.DateTime)
+
+    owner = so.relationship("User", back_populates="jobs")
@@ -0,0 +1,15 @@
+import sqlalchemy as s
+from greenbat.database.tables._base import Base
+
+
+class LibraryStat(Base):
+    """
+    The number of elements in the library of a user counted by the counter with the given `key`.
+    """
+
+    __tablename__ = "library_stats"
+
+    owner_id = s.Column(s.String, s.ForeignKey("users.sub"), primary_key=True)
+    key = s.Column(s.String, primary_key=True)
+
+    count = s.Column(s.BigInteger, nullable=False)
@@ -8,10 +8,13 @@ from greenbat.database.tables._base import Base
 
 class MetadataCustom(Base):
     __tablename__ = "metadata_custom"
+    __table_args__ = (
+        s.Index("ix_metadata_custom_title_prefix", s.text('lower(title) COLLATE "C"')),
+    )
 
     game_id = s.Column(s.Integer, s.ForeignKey("games.id"), primary_key=True)
 
-    creator_sub = s.Column(s.String, s.ForeignKey("users.sub"), nullable=False)
+    creator_sub = s.Column(s.String, s.ForeignKey("users.sub"), nullable=False, index=True)
     title = s.Column(s.String, nullable=False)
     url = s.Column(s.String)
 
@@ -8,6 +8,9 @@ from greenbat.database.tables._base import Base
 
 class MetadataSteam(Base):
     __tablename__ = "metadata_steam"
+    __table_args__ = (
+        s.Index("ix_metadata_steam_title_prefix", s.text('lower(title) COLLATE "C"')),
+    )
 
     game_id = s.Column(s.Integer, s.ForeignKey("games.id"), primary_key=True)
 
@@ -18,6 +18,7 @@ class User(Base):
     elements = so.relationship("Element", back_populates="owner")
     accounts_steam = so.relationship("AccountSteam", back_populates="owner")
     metadata_custom_owned = so.relationship("MetadataCustom", back_populates="creator")
+    jobs = so.relationship("Job", back_populates="owner")
 
     def __str__(self):
         return self.name
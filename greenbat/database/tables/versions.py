@@ -0,0 +1,11 @@
+import sqlalchemy as s
+from greenbat.database.tables._base import Base
+
+
+class Version(Base):
+    __tablename__ = "versions"
+
+    key = s.Column(s.String, primary_key=True)
+
+    version = s.Column(s.BigInteger, nullable=False)
+    updated = s.Column(s.DateTime, nullable=False)
@@ -0,0 +1,108 @@
+"""
+Version counters of the resources served by the API, used to compute their ``ETag``\\ s without querying them.
+
+Every counter is identified by a key, and is incremented by the transactions writing to the resource it tracks:
+
+- ``catalog`` by writes to games and their metadata;
+- ``library:{sub}`` by writes to the elements of the user with the given `sub`;
+- ``user:{sub}`` by writes to the user with the given `sub` and to their Steam accounts.
+
+Writes made through the ORM are detected automatically when the session is flushed, as are the element changes
+reported to :mod:`greenbat.database.changes`; other writes made with statements bypassing the ORM should be reported
+with :func:`bump`.
+
+All the counters touched by a transaction are incremented with a single statement right before it is committed.
+"""
+
+import datetime
+import typing as t
+import sqlalchemy as s
+import sqlalchemy.orm as so
+import sqlalchemy.dialects.postgresql as sp
+
+import greenbat.database.tables as tables
+import greenbat.database.changes as changes
+
+
+PENDING_KEY = "greenbat.versions.pending"
+
+CATALOG = "catalog"
+
+
+def library(sub: str) -> str:
+    return f"library:{sub}"
+
+
+def user(sub: str) -> str:
+    return f"user:{sub}"
+
+
+def of_user(sub: str) -> list[str]:
+    """
+    Get the keys of all the counters tracking the resources included in a :class:`greenbat.models.retrieve.UserRetrieve`.
+    """
+
+    return [user(sub), library(sub), CATALOG]
+
+
+def bump(session: so.Session, keys: t.Iterable[str]) -> None:
+    """
+    Increment the counters with the passed `keys` when the current transaction of the passed `session` is committed.
+    """
+
+    session.info.setdefault(PENDING_KEY, set()).update(keys)
+
+
+def keys_of(obj) -> list[str]:
+    """
+    Get the keys of the counters tracking the passed ORM object.
+    """
+
+    if isinstance(obj, (tables.Game, tables.MetadataSteam, tables.MetadataCustom)):
+        return [CATALOG]
+    elif isinstance(obj, tables.User):
+        return [user(obj.sub)]
+    elif isinstance(obj, tables.AccountSteam):
+        return [user(obj.owner_id)]
+    return []
+
+
+@s.event.listens_for(so.Session, "after_flush")
+def _collect(session: so.Session, _flush_context) -> None:
+    keys = set()
+    for obj in [*session.new, *session.deleted]:
+        keys.update(keys_of(obj))
+    for obj in session.dirty:
+        # Appending to a relationship collection marks its parent as dirty, even if none of its columns changed
+        if session.is_modified(obj, include_collections=False):
+            keys.update(keys_of(obj))
+    if keys:
+        bump(session, keys)
+
+
+@s.event.listens_for(so.Session, "before_commit")
+def _increment(session: so.Session) -> None:
+    # Flush now, so that the changes of the last flush are collected too
+    session.flush()
+
+    keys = session.info.pop(PENDING_KEY, set())
+    for change in session.info.get(changes.PENDING_KEY, []):
+        keys.update(library(state.owner_id) for state in (change.before, change.after) if state)
+
+    if not keys:
+        return
+
+    now = datetime.datetime.now()
+    # Sort the keys, so that concurrent transactions lock the same rows in the same order
+    insert = sp.insert(tables.Version).values([{"key": key, "version": 1, "updated": now} for key in sorted(keys)])
+    session.execute(
+        insert.on_conflict_do_update(
+            index_elements=[tables.Version.key],
+            set_={"version": tables.Version.version + 1, "updated": insert.excluded.updated},
+        )
+    )
+
+
+@s.event.listens_for(so.Session, "after_rollback")
+def _discard(session: so.Session) -> None:
+    session.info.pop(PENDING_KEY, None)
@@ -2,12 +2,21 @@ import fastapi as f
 import fastapi.security as fs
 import starlette.status as s
 import sqlalchemy.orm
+import sqlalchemy.ext.asyncio
+import sqlalchemy.dialects.postgresql as sp
+import royalnet.royaltyping as t
 import greenbat.database.engine
 import greenbat.database.tables as tables
+import greenbat.database.versions as versions
 import greenbat.config
 import greenbat.auth as auth
+import greenbat.utils.pagination as pagination
+import greenbat.utils.cache
+import collections
 import datetime
+import threading
 import jose.jwt
+import requests
 
 
 def dep_session():
@@ -15,25 +24,61 @@ def dep_session():
         yield session
 
 
+async def dep_async_session():
+    async with greenbat.database.engine.AsyncSession() as session:
+        yield session
+
+
+async def dep_page(
+        request: f.Request,
+        response: f.Response,
+        limit: int = f.Query(greenbat.config.cfg["api.list.maxlimit"], ge=1, le=greenbat.config.cfg["api.list.maxlimit"]),
+        offset: int = f.Query(0, ge=0, deprecated=True, description="Use `after` instead."),
+        after: t.Optional[str] = f.Query(None, description="The opaque cursor contained in the `Link` header of the previous page."),
+) -> pagination.Page:
+    return pagination.Page(request=request, response=response, limit=limit, offset=offset, after=after)
+
+
+async def dep_fields(
+        fields: t.Optional[str] = f.Query(
+            None,
+            description="A comma-separated list of the fields to return, separating the fields of nested objects from their parent with a dot, such as `id,metadata_steam.title`; all fields are returned if omitted. Only the data required by the selected fields is loaded from the database.",
+        ),
+) -> t.Optional[str]:
+    return fields
+
+
+async def dep_jwks() -> auth.JWKSProvider:
+    return auth.jwks
+
+
 def dep_claims(
-        token: str = f.Depends(auth.scheme)
+        token: str = f.Depends(auth.scheme),
+        jwks: auth.JWKSProvider = f.Depends(dep_jwks),
 ) -> auth.RYGLoginClaims:
+    if claims := auth.claims_cache.get(token):
+        return claims
+
     try:
         unverified = jose.jwt.get_unverified_headers(token)
     except jose.jwt.JWTError as e:
         raise f.HTTPException(f.status.HTTP_401_UNAUTHORIZED, f"JWT: {e.args[0]}")
 
     try:
-        payload = jose.jwt.decode(token, auth.jwks[unverified["kid"]], audience=auth.audience, algorithms=["RS256"])
+        payload = auth.verify(token, jwks[unverified["kid"]])
     except KeyError:
         raise f.HTTPException(f.status.HTTP_401_UNAUTHORIZED, "JWT: Unknown kid")
-    except jose.jwt.JWTError as e:
+    except requests.RequestException:
+        raise f.HTTPException(f.status.HTTP_503_SERVICE_UNAVAILABLE, "JWT: Could not fetch the JWKS")
+    except auth.VerificationError as e:
         raise f.HTTPException(f.status.HTTP_401_UNAUTHORIZED, f"JWT: {e.args[0]}")
 
-    return auth.RYGLoginClaims(**payload)
+    claims = auth.RYGLoginClaims(**payload)
+    auth.claims_cache.put(token, claims)
+    return claims
 
 
-def dep_scoped_claims(
+async def dep_scoped_claims(
         required_scopes: fs.SecurityScopes,
         claims: auth.RYGLoginClaims = f.Depends(dep_claims),
 ) -> auth.RYGLoginClaims:
@@ -42,16 +87,92 @@ def dep_scoped_claims(
     return claims
 
 
-def dep_user(
-        session: sqlalchemy.orm.Session = f.Depends(dep_session),
+class KnownUser(t.NamedTuple):
+    name: str
+    picture: str
+    last_update: datetime.datetime
+
+
+class KnownUsers:
+    """
+    A bounded LRU cache of the users this process has last written to the database, with the values it wrote.
+
+    Entries are dropped once they are older than the staleness of the users, as they have to be written again anyways.
+    """
+
+    def __init__(self, size: int, staleness: datetime.timedelta):
+        """
+        :param size: The maximum number of users to keep in the cache.
+        :param staleness: How long a written user should be kept in the cache.
+        """
+
+        self.size: int = size
+        self.staleness: datetime.timedelta = staleness
+        self.entries: collections.OrderedDict[str, KnownUser] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sub: str) -> t.Optional[KnownUser]:
+        """
+        Get the values last written for the user with the passed `sub`, or :data:`None` if they aren't cached or are
+        stale.
+        """
+
+        with self._lock:
+            known = self.entries.get(sub)
+            if known is None or datetime.datetime.now() - known.last_update > self.staleness:
+                self.entries.pop(sub, None)
+                return None
+            self.entries.move_to_end(sub)
+            return known
+
+    def put(self, sub: str, known: KnownUser) -> None:
+        """
+        Remember the values written for the user with the passed `sub`, evicting the least recently used entry if the
+        cache is full.
+        """
+
+        with self._lock:
+            self.entries[sub] = known
+            self.entries.move_to_end(sub)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+known_users = KnownUsers(
+    size=greenbat.config.cfg["users.cache.size"],
+    staleness=datetime.timedelta(seconds=greenbat.config.cfg["users.staleness"]),
+)
+
+
+async def dep_user(
+        session: sqlalchemy.ext.asyncio.AsyncSession = f.Depends(dep_async_session),
         claims: auth.RYGLoginClaims = f.Security(dep_scoped_claims, scopes=["profile", "email"]),
 ):
-    db_user = tables.User(
-        sub=claims.sub,
-        last_update=datetime.datetime.now(),
-        name=claims.name,
-        picture=claims.picture,
-    )
-    db_user = session.merge(db_user)
-    session.commit()
-    return db_user
+    known = known_users.get(claims.sub)
+
+    if (
+        known is None
+        or known.name != claims.name
+        or known.picture != str(claims.picture)
+    ):
+        known = KnownUser(name=claims.name, picture=str(claims.picture), last_update=datetime.datetime.now())
+        await session.execute(
+            sp.insert(tables.User)
+            .values(sub=claims.sub, **known._asdict())
+            .on_conflict_do_update(index_elements=[tables.User.sub], set_=known._asdict())
+        )
+        versions.bump(session.sync_session, [versions.user(claims.sub)])
+        greenbat.utils.cache.touch(session.sync_session, [tables.User.__tablename__])
+        await session.commit()
+        known_users.put(claims.sub, known)
+
+    db_user = tables.User(sub=claims.sub, **known._asdict())
+    sqlalchemy.orm.make_transient_to_detached(db_user)
+    return await session.merge(db_user, load=False)
@@ -3,3 +3,5 @@ from . import _types as types
 from . import get as basic
 from . import retrieve as retrieve
 from . import edit as edit
+from . import batch as batch
+from . import bulk as bulk
@@ -0,0 +1,12 @@
+import greenbat.models._base as base
+import greenbat.models.retrieve as retrieve
+
+
+class GameBatch(base.ORMModel):
+    results: list[retrieve.GameRetrieve]
+    missing: list[int]
+
+
+class UserBatch(base.ORMModel):
+    results: list[retrieve.UserRetrieve]
+    missing: list[str]
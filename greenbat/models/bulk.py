@@ -0,0 +1,27 @@
+import typing as t
+import pydantic
+import greenbat.database.enums as enums
+import greenbat.models._base as base
+import greenbat.models.edit as edit
+import greenbat.models.get as get
+
+
+class ElementOperation(base.Model):
+    kind: enums.OperationKind
+    id: t.Optional[int]
+    data: t.Optional[edit.ElementEdit]
+
+    @pydantic.root_validator(skip_on_failure=True)
+    def _required(cls, values):
+        kind = values["kind"]
+        if kind != enums.OperationKind.CREATE and values.get("id") is None:
+            raise ValueError(f"{kind.value} operations require the `id` of the element")
+        if kind != enums.OperationKind.DELETE and values.get("data") is None:
+            raise ValueError(f"{kind.value} operations require the `data` of the element")
+        return values
+
+
+class ElementOperationResult(base.Model):
+    status: int
+    element: t.Optional[get.ElementGet]
+    detail: t.Optional[str]
@@ -30,3 +30,7 @@ class AccountSteamEdit(base.ORMModel):
 
 class UserEdit(base.ORMModel):
     pass
+
+
+class JobEdit(base.ORMModel):
+    pass
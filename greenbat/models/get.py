@@ -4,6 +4,7 @@ import datetime
 import greenbat.models._types as types
 import greenbat.models._base as base
 import greenbat.models.edit as edit
+import greenbat.database.enums as enums
 
 
 class ElementGet(edit.ElementEdit):
@@ -35,3 +36,73 @@ class UserGet(edit.UserEdit):
     last_update: datetime.datetime
     name: str
     picture: pydantic.HttpUrl
+
+
+class JobGet(edit.JobEdit):
+    id: int
+    owner_id: str
+    kind: str
+    status: enums.JobStatus
+    progress: int
+    total: t.Optional[int]
+    result: t.Optional[dict]
+    error: t.Optional[str]
+    created: datetime.datetime
+    updated: datetime.datetime
+    started: t.Optional[datetime.datetime]
+    finished: t.Optional[datetime.datetime]
+
+
+class ElementChangeGet(base.ORMModel):
+    seq: int
+    element_id: int
+    game_id: int
+    kind: enums.ChangeKind
+    rating: t.Optional[enums.Rating]
+    completition: t.Optional[enums.Completition]
+    created: datetime.datetime
+
+
+class StatsGet(base.ORMModel):
+    rating: dict[enums.Rating, int]
+    completition: dict[enums.Completition, int]
+    no_rating: int
+    no_completition: int
+    completion: float = 0.0
+
+    @pydantic.validator("completion", always=True)
+    def _completion(cls, _value, values) -> float:
+        """
+        The percentage of the elements with a completition other than ``NOT_APPLICABLE`` that have been at least
+        ``BEATEN``.
+        """
+
+        counts = values.get("completition", {})
+        applicable = sum(count for value, count in counts.items() if value != enums.Completition.NOT_APPLICABLE)
+        if not applicable:
+            return 0.0
+        beaten = [enums.Completition.BEATEN, enums.Completition.COMPLETED, enums.Completition.MASTERED]
+        return 100 * sum(counts.get(value, 0) for value in beaten) / applicable
+
+
+class LibraryStatsGet(StatsGet):
+    total: int
+
+
+class GameStatsGet(StatsGet):
+    owners: int
+
+
+class CacheStatsGet(base.Model):
+    size: int
+    hits: int
+    misses: int
+    hit_rate: float
+    invalidations: int
+
+
+class ClaimsCacheStatsGet(base.Model):
+    size: int
+    hits: int
+    misses: int
+    hit_rate: float
@@ -1,4 +1,6 @@
+import pydantic
 import greenbat.models._types as types
+import greenbat.database.enums as enums
 import greenbat.models._base as base
 import greenbat.models.get as get
 
@@ -17,7 +19,20 @@ class MetadataCustomRetrieve(get.MetadataCustomGet):
 
 
 class GameRetrieve(get.GameGet):
-    elements: list[get.ElementGet]
+    stats: get.GameStatsGet
+
+    @pydantic.validator("stats", pre=True, always=True)
+    def _no_elements(cls, value):
+        # Games no element ever referred to have no stats row
+        if value is None:
+            return get.GameStatsGet(
+                owners=0,
+                rating=dict.fromkeys(enums.Rating, 0),
+                completition=dict.fromkeys(enums.Completition, 0),
+                no_rating=0,
+                no_completition=0,
+            )
+        return value
 
 
 class AccountSteamRetrieve(get.AccountSteamGet):
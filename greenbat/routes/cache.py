@@ -0,0 +1,39 @@
+import fastapi as f
+
+import greenbat.models as models
+import greenbat.auth as auth
+import greenbat.utils.cache as cache
+from greenbat.utils.indoc import indoc
+
+
+router = f.APIRouter()
+
+
+@router.get(
+    "/stats",
+    summary="Retrieve the statistics of the response cache",
+    description=indoc("""
+        Get the number of responses served from the cache of this process and the number of responses that had to be 
+        built, counted since the process was started.
+        
+        `size` is the number of responses currently cached, or `-1` if the cache is shared with other processes. 
+    """),
+    response_model=models.get.CacheStatsGet,
+)
+async def _():
+    return cache.responses.stats()
+
+
+@router.get(
+    "/claims",
+    summary="Retrieve the statistics of the claims cache",
+    description=indoc("""
+        Get the number of requests whose token claims were found in the cache of this process, and the number of 
+        requests whose token had to be verified, counted since the process was started.
+        
+        `size` is the number of claims currently cached.
+    """),
+    response_model=models.get.ClaimsCacheStatsGet,
+)
+async def _():
+    return auth.claims_cache.stats()
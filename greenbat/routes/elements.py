@@ -2,7 +2,9 @@ import uuid
 import typing as t
 
 import fastapi as f
+import fastapi.responses
 import sqlalchemy.orm as so
+import sqlalchemy.ext.asyncio as sa
 import sqlalchemy.sql as ss
 import starlette.status as status
 
@@ -10,7 +12,13 @@ import greenbat.models as models
 import greenbat.dependencies as deps
 import greenbat.database.tables as tables
 import greenbat.database.enums as enums
-import greenbat.utils.queries as queries
+import greenbat.utils.aqueries as aqueries
+import greenbat.utils.pagination as pagination
+import greenbat.utils.conditional as conditional
+import greenbat.utils.export as export
+import greenbat.utils.serializers as serializers
+import greenbat.utils.bulk as bulk
+import greenbat.database.versions as versions
 import greenbat.auth as auth
 from greenbat.utils.indoc import indoc
 from greenbat.config import cfg
@@ -27,13 +35,14 @@ router = f.APIRouter()
     """),
     response_model=list[models.get.ElementGet],
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
-        limit: int = f.Query(cfg["api.list.maxlimit"], le=cfg["api.list.maxlimit"]),
-        offset: int = f.Query(0, ge=0),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        page: pagination.Page = f.Depends(deps.dep_page),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
 ):
-    return queries.list_(session=session, table=tables.Element, limit=limit, offset=offset)
+    results = await aqueries.list_(session, table=tables.Element, limit=page.limit, offset=page.offset, after=page.after, model=models.get.ElementGet, fields=fields)
+    return page.render(results, models.get.ElementGet, fields)
 
 
 @router.get(
@@ -49,12 +58,14 @@ def _(
         },
     },
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         id: int = f.Path(..., example=1),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
 ):
-    return queries.retrieve(session, tables.Element, tables.Element.id == id)
+    element = await aqueries.retrieve(session, tables.Element, tables.Element.id == id, model=models.retrieve.ElementRetrieve, fields=fields)
+    return serializers.response_one(element, models.retrieve.ElementRetrieve, fields=fields)
 
 
 @router.delete(
@@ -71,12 +82,12 @@ def _(
         },
     },
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         id: int = f.Path(..., example=1),
 ):
-    return queries.destroy(session, tables.Element, tables.Element.id == id)
+    return await aqueries.destroy(session, tables.Element, tables.Element.id == id)
 
 
 @router.get(
@@ -87,14 +98,56 @@ def _(
     """),
     response_model=list[models.get.ElementGet],
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         user: tables.User = f.Security(deps.dep_user),
+        page: pagination.Page = f.Depends(deps.dep_page),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
+):
+    await conditional.check(session, page.request, page.response, [versions.library(user.sub)])
+    results = await aqueries.list_(session, table=tables.Element, condition=tables.Element.owner == user, limit=page.limit, offset=page.offset, after=page.after, model=models.get.ElementGet, fields=fields)
+    return page.render(results, models.get.ElementGet, fields)
+
+
+@router.get(
+    "/mine/changes",
+    summary="List the changes made to the library of the currently logged in user",
+    description=indoc("""
+        Get an array of the creations, updates and deletions of the elements having the currently logged in user as 
+        owner, made after the change with the specified `since` sequence number, in the order they were made.
+        
+        Every change contains the values of the element right after it, or right before it for deletions; clients 
+        can keep a copy of the library up to date by applying the changes in order, and then passing the `seq` of the 
+        last one as `since` in the next request.
+        
+        Passing `0` as `since` returns all the changes ever made, starting from the creation of every element.
+        
+        If more changes are available than the requested `limit`, the `Link` header of the response points to the 
+        next ones.
+    """),
+    response_model=list[models.get.ElementChangeGet],
+)
+async def _(
+        *,
+        request: f.Request,
+        response: f.Response,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        user: tables.User = f.Security(deps.dep_user),
+        since: int = f.Query(0, ge=0, description="The `seq` of the last change already applied by the client."),
         limit: int = f.Query(cfg["api.list.maxlimit"], le=cfg["api.list.maxlimit"]),
-        offset: int = f.Query(0, ge=0),
 ):
-    return queries.list_(session=session, table=tables.Element, condition=tables.Element.owner == user, limit=limit, offset=offset)
+    results = await aqueries.list_(
+        session,
+        table=tables.ElementChangeLog,
+        condition=ss.and_(tables.ElementChangeLog.owner_id == user.sub, tables.ElementChangeLog.seq > since),
+        limit=limit,
+        offset=0,
+        model=models.get.ElementChangeGet,
+    )
+    if results and len(results) >= limit:
+        response.headers["Link"] = f'<{request.url.include_query_params(since=results[-1].seq)}>; rel="next"'
+    return serializers.response(results, models.get.ElementChangeGet, headers=response.headers)
 
 
 @router.get(
@@ -105,14 +158,48 @@ def _(
     """),
     response_model=list[models.get.ElementGet],
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         sub: str = f.Path(..., example="auth0|5ed2debf7308300c1ea230c3"),
-        limit: int = f.Query(cfg["api.list.maxlimit"], le=cfg["api.list.maxlimit"]),
-        offset: int = f.Query(0, ge=0),
+        page: pagination.Page = f.Depends(deps.dep_page),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
 ):
-    return queries.list_(session=session, table=tables.Element, condition=tables.Element.owner_id == sub, limit=limit, offset=offset)
+    await conditional.check(session, page.request, page.response, [versions.library(sub)])
+    results = await aqueries.list_(session, table=tables.Element, condition=tables.Element.owner_id == sub, limit=page.limit, offset=page.offset, after=page.after, model=models.get.ElementGet, fields=fields)
+    return page.render(results, models.get.ElementGet, fields)
+
+
+@router.get(
+    "/of/{sub}/export",
+    summary="Export all elements in the library of the specified user",
+    description=indoc("""
+        Stream all the elements having the specified `sub` as owner, as newline-delimited JSON objects with the same 
+        fields returned by the paginated list.
+        
+        Elements are sent while they are read from the database, so this is the fastest way to download whole 
+        libraries.
+    """),
+    response_class=fastapi.responses.StreamingResponse,
+    responses={
+        200: {
+            "content": {export.MEDIA_TYPE: {}},
+            "description": "One element per line",
+        },
+        404: {
+            "description": "User not found",
+        },
+    },
+)
+async def _(
+        *,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        sub: str = f.Path(..., example="auth0|5ed2debf7308300c1ea230c3"),
+):
+    if not (await session.execute(ss.select(tables.User.sub).where(tables.User.sub == sub))).first():
+        raise f.HTTPException(404, "Not found")
+
+    return export.response(tables.Element, models.get.ElementGet, tables.Element.owner_id == sub)
 
 
 @router.post(
@@ -126,13 +213,51 @@ def _(
     status_code=status.HTTP_201_CREATED,
     response_model=models.retrieve.ElementRetrieve,
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         user: tables.User = f.Security(deps.dep_user, scopes=["create:element"]),
         data: models.edit.ElementEdit = f.Body(...),
 ):
-    return queries.create(session=session, table=tables.Element, model_data=data, owner=user)
+    return await aqueries.create(session, table=tables.Element, model_data=data, model=models.retrieve.ElementRetrieve, owner=user)
+
+
+@router.post(
+    "/mine/bulk",
+    summary="Edit many elements of the library of the currently logged in user at once",
+    description=indoc("""
+        Apply all the passed `operations` to the library of the currently logged in user in a single transaction, 
+        returning the result of each of them in the same order.
+        
+        Each operation has a `kind`:
+        
+        - `CREATE` adds a new element with the passed `data`, requiring the `create:element` scope;
+        - `UPDATE` edits the element with the passed `id` with `data`, requiring the `rate:element`, 
+          `complete:element` and `move:element` scopes;
+        - `DELETE` permanently deletes the element with the passed `id`, requiring the `destroy:element` scope.
+        
+        Every result contains the `status` code the route applying the single operation would have returned, the 
+        created or edited `element`, and the `detail` of the error, if any; operations that failed do not prevent 
+        the others from being applied.
+        
+        Deletions are applied first, then updates, then creations, so that an element can be replaced in the same 
+        request; no element can be the target of more than one operation.
+    """),
+    status_code=status.HTTP_200_OK,
+    response_model=list[models.bulk.ElementOperationResult],
+)
+async def _(
+        *,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        claims: auth.RYGLoginClaims = f.Security(deps.dep_claims),
+        user: tables.User = f.Security(deps.dep_user),
+        operations: list[models.bulk.ElementOperation] = f.Body(...),
+):
+    if missing := claims.missing_permissions(bulk.scopes_for(operations)):
+        raise f.HTTPException(status.HTTP_401_UNAUTHORIZED, f"The following OAuth2 scopes are missing: {missing!r}")
+
+    results = await session.run_sync(bulk.elements, user.sub, operations)
+    return serializers.response(results, models.bulk.ElementOperationResult)
 
 
 @router.put(
@@ -149,14 +274,14 @@ def _(
         },
     },
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         user: tables.User = f.Security(deps.dep_user, scopes=["rate:element", "complete:element", "move:element"]),
         id: int = f.Path(..., example=1),
         data: models.edit.ElementEdit = f.Body(...),
 ):
-    return queries.edit(session, tables.Element, ss.and_(tables.Element.id == id, tables.Element.owner == user), data)
+    return await aqueries.edit(session, tables.Element, ss.and_(tables.Element.id == id, tables.Element.owner == user), data, model=models.retrieve.ElementRetrieve)
 
 
 @router.delete(
@@ -173,13 +298,13 @@ def _(
         },
     },
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         user: tables.User = f.Security(deps.dep_user, scopes=["destroy:element"]),
         id: int = f.Path(..., example=1),
 ):
-    queries.destroy(session, tables.Element, ss.and_(tables.Element.id == id, tables.Element.owner == user))
+    await aqueries.destroy(session, tables.Element, ss.and_(tables.Element.id == id, tables.Element.owner == user))
 
 
 @router.patch(
@@ -196,17 +321,20 @@ def _(
         },
     },
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         user: tables.User = f.Security(deps.dep_user, scopes=["rate:element"]),
         id: int = f.Path(..., example=1),
         rating: enums.Rating = f.Body(..., example=enums.Rating.LIKED)
 ):
-    element = queries.retrieve(session, tables.Element, ss.and_(tables.Element.id == id, tables.Element.owner == user))
-    element.rating = rating
-    session.commit()
-    return element
+    return await aqueries.patch(
+        session,
+        tables.Element,
+        ss.and_(tables.Element.id == id, tables.Element.owner_id == user.sub),
+        {"rating": rating},
+        model=models.retrieve.ElementRetrieve,
+    )
 
 
 @router.patch(
@@ -223,14 +351,17 @@ def _(
         },
     },
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         user: tables.User = f.Security(deps.dep_user, scopes=["complete:element"]),
         id: int = f.Path(..., example=1),
         completition: enums.Completition = f.Body(..., example=enums.Completition.COMPLETED)
 ):
-    element = queries.retrieve(session, tables.Element, ss.and_(tables.Element.id == id, tables.Element.owner == user))
-    element.completition = completition
-    session.commit()
-    return element
+    return await aqueries.patch(
+        session,
+        tables.Element,
+        ss.and_(tables.Element.id == id, tables.Element.owner_id == user.sub),
+        {"completition": completition},
+        model=models.retrieve.ElementRetrieve,
+    )
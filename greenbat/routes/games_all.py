@@ -2,14 +2,22 @@ import uuid
 import typing as t
 
 import fastapi as f
+import fastapi.responses
 import sqlalchemy.orm as so
+import sqlalchemy.ext.asyncio as sa
 import sqlalchemy.sql as ss
 import starlette.status as status
 
 import greenbat.models as models
 import greenbat.dependencies as deps
 import greenbat.database.tables as tables
-import greenbat.utils.queries as queries
+import greenbat.utils.aqueries as aqueries
+import greenbat.utils.pagination as pagination
+import greenbat.utils.conditional as conditional
+import greenbat.utils.export as export
+import greenbat.utils.cache as cache
+import greenbat.utils.serializers as serializers
+import greenbat.database.versions as versions
 import greenbat.auth as auth
 from greenbat.config import cfg
 from greenbat.utils.indoc import indoc
@@ -26,13 +34,56 @@ router = f.APIRouter()
     """),
     response_model=list[models.get.GameGet],
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
-        limit: int = f.Query(cfg["api.list.maxlimit"], le=cfg["api.list.maxlimit"]),
-        offset: int = f.Query(0, ge=0),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        page: pagination.Page = f.Depends(deps.dep_page),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
 ):
-    return queries.list_(session=session, table=tables.Game, limit=limit, offset=offset)
+    await conditional.check(session, page.request, page.response, [versions.CATALOG])
+    results = await aqueries.list_(session, table=tables.Game, limit=page.limit, offset=page.offset, after=page.after, model=models.get.GameGet, fields=fields)
+    return page.render(results, models.get.GameGet, fields)
+
+
+@router.get(
+    "/export",
+    summary="Export all games",
+    description=indoc("""
+        Stream all games registered on Greenbat, as newline-delimited JSON objects with the same fields returned by 
+        the paginated list.
+        
+        Games are sent while they are read from the database, so this is the fastest way to download the whole 
+        catalog.
+    """),
+    response_class=fastapi.responses.StreamingResponse,
+    responses={
+        200: {
+            "content": {export.MEDIA_TYPE: {}},
+            "description": "One game per line",
+        },
+    },
+)
+async def _():
+    return export.response(tables.Game, models.get.GameGet)
+
+
+@router.get(
+    "/batch",
+    summary="Retrieve many games by Greenbat id",
+    description=indoc("""
+        Get detailed information about all the games with the specified `ids` at once, in the same order as the 
+        `ids`; the `ids` of the games that do not exist are listed in `missing`.
+    """),
+    response_model=models.batch.GameBatch,
+)
+async def _(
+        *,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        ids: list[int] = f.Query(..., example=[1, 2]),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
+):
+    games, missing = await aqueries.retrieve_many(session, table=tables.Game, key=tables.Game.id, values=ids, model=models.retrieve.GameRetrieve, fields=fields)
+    return serializers.response_batch(games, missing, models.retrieve.GameRetrieve, fields=fields)
 
 
 @router.get(
@@ -48,12 +99,40 @@ def _(
         },
     },
 )
-def _(
+async def _(
+        *,
+        request: f.Request,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        id: int = f.Path(..., example=1),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
+):
+    return await cache.responses.response(
+        request, cache.tags_for(tables.Game, models.retrieve.GameRetrieve), models.retrieve.GameRetrieve,
+        lambda: aqueries.retrieve(session, table=tables.Game, condition=tables.Game.id == id, model=models.retrieve.GameRetrieve, fields=fields),
+        fields=fields,
+    )
+
+
+@router.get(
+    "/{id}/elements/",
+    summary="List the elements referring to a game",
+    description=indoc("""
+        Get a paginated array listing the elements referring to the game with the specified `id`, across the 
+        libraries of all users.
+        
+        Their number by `rating` and by `completition` is also available in the `stats` of the game.
+    """),
+    response_model=list[models.get.ElementGet],
+)
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         id: int = f.Path(..., example=1),
+        page: pagination.Page = f.Depends(deps.dep_page),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
 ):
-    return queries.retrieve(session=session, table=tables.Game, condition=tables.Game.uuid == id)
+    results = await aqueries.list_(session, table=tables.Element, condition=tables.Element.game_id == id, limit=page.limit, offset=page.offset, after=page.after, model=models.get.ElementGet, fields=fields)
+    return page.render(results, models.get.ElementGet, fields)
 
 
 @router.delete(
@@ -70,10 +149,10 @@ def _(
         },
     },
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         _user: tables.User = f.Security(deps.dep_user, scopes=["destroy:any_game"]),
         id: int = f.Path(..., example=1),
 ):
-    queries.destroy(session=session, table=tables.Game, condition=tables.Game.uuid == id)
+    await aqueries.destroy(session, table=tables.Game, condition=tables.Game.id == id)
@@ -2,14 +2,19 @@ import uuid
 import typing as t
 
 import fastapi as f
+import fastapi.encoders as fe
 import sqlalchemy.orm as so
+import sqlalchemy.ext.asyncio as sa
 import sqlalchemy.sql as ss
 import starlette.status as status
 
 import greenbat.models as models
 import greenbat.dependencies as deps
 import greenbat.database.tables as tables
-import greenbat.utils.queries as queries
+import greenbat.utils.aqueries as aqueries
+import greenbat.utils.pagination as pagination
+import greenbat.utils.conditional as conditional
+import greenbat.database.versions as versions
 import greenbat.auth as auth
 from greenbat.config import cfg
 from greenbat.utils.indoc import indoc
@@ -28,13 +33,15 @@ router = f.APIRouter()
     """),
     response_model=list[models.get.GameGet],
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
-        limit: int = f.Query(cfg["api.list.maxlimit"], le=cfg["api.list.maxlimit"]),
-        offset: int = f.Query(0, ge=0),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        page: pagination.Page = f.Depends(deps.dep_page),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
 ):
-    return queries.list_joined(session=session, tables=[tables.Game, tables.MetadataCustom], limit=limit, offset=offset)
+    await conditional.check(session, page.request, page.response, [versions.CATALOG])
+    results = await aqueries.list_joined(session, tables=[tables.Game, tables.MetadataCustom], limit=page.limit, offset=page.offset, after=page.after, model=models.get.GameGet, fields=fields)
+    return page.render(results, models.get.GameGet, fields)
 
 
 @router.get(
@@ -45,16 +52,25 @@ def _(
     """),
     response_model=list[models.get.GameGet],
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         user: tables.User = f.Security(deps.dep_user),
-        limit: int = f.Query(cfg["api.list.maxlimit"], le=cfg["api.list.maxlimit"]),
-        offset: int = f.Query(0, ge=0),
+        page: pagination.Page = f.Depends(deps.dep_page),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
 ):
-    return session.execute(
-        ss.select(tables.Game).join(tables.MetadataCustom).where(tables.MetadataCustom.creator == user).limit(limit).offset(offset)
-    ).all()
+    await conditional.check(session, page.request, page.response, [versions.CATALOG])
+    results = await aqueries.list_joined(
+        session,
+        tables=[tables.Game, tables.MetadataCustom],
+        condition=tables.MetadataCustom.creator == user,
+        limit=page.limit,
+        offset=page.offset,
+        after=page.after,
+        model=models.get.GameGet,
+        fields=fields,
+    )
+    return page.render(results, models.get.GameGet, fields)
 
 
 @router.post(
@@ -66,9 +82,9 @@ def _(
     response_model=models.retrieve.GameRetrieve,
     status_code=status.HTTP_201_CREATED,
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         user: tables.User = f.Security(deps.dep_user, scopes=["create:game_custom"]),
         metadata_custom: models.edit.MetadataCustomEdit = f.Body(...),
 ):
@@ -76,8 +92,8 @@ def _(
     session.add(game)
     meta = tables.MetadataCustom(**metadata_custom.dict(), creator=user, game=game)
     session.add(meta)
-    session.commit()
-    return game
+    await session.commit()
+    return await aqueries.refresh(session, game, model=models.retrieve.GameRetrieve)
 
 
 @router.delete(
@@ -103,22 +119,23 @@ def _(
         }
     },
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         user: tables.User = f.Security(deps.dep_user, scopes=["destroy:game_custom"]),
         id: int = f.Path(..., example=1),
 ):
-    game = queries.retrieve(session, tables.Game, tables.Game.id == id)
+    # Elements are deleted together with the game, so they have to be loaded too
+    game = await aqueries.retrieve(session, tables.Game, tables.Game.id == id, options=(so.selectinload(tables.Game.elements),), model=models.retrieve.GameRetrieve)
 
     if not game.metadata_custom:
-        raise f.HTTPException(405, game)
+        raise f.HTTPException(405, fe.jsonable_encoder(models.retrieve.GameRetrieve.from_orm(game)))
 
-    if not game.metadata_custom.creator == user:
-        raise f.HTTPException(403, game)
+    if not game.metadata_custom.creator_sub == user.sub:
+        raise f.HTTPException(403, fe.jsonable_encoder(models.retrieve.GameRetrieve.from_orm(game)))
 
-    session.delete(game)
-    session.commit()
+    await session.delete(game)
+    await session.commit()
 
 
 @router.get(
@@ -129,13 +146,22 @@ def _(
     """),
     response_model=list[models.get.GameGet],
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         sub: str = f.Path(..., example="auth0|5ed2debf7308300c1ea230c3"),
-        limit: int = f.Query(cfg["api.list.maxlimit"], le=cfg["api.list.maxlimit"]),
-        offset: int = f.Query(0, ge=0),
+        page: pagination.Page = f.Depends(deps.dep_page),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
 ):
-    return session.execute(
-        ss.select(tables.Game).join(tables.MetadataCustom).where(tables.MetadataCustom.creator_sub == sub).limit(limit).offset(offset)
-    ).fetchall()
+    await conditional.check(session, page.request, page.response, [versions.CATALOG])
+    results = await aqueries.list_joined(
+        session,
+        tables=[tables.Game, tables.MetadataCustom],
+        condition=tables.MetadataCustom.creator_sub == sub,
+        limit=page.limit,
+        offset=page.offset,
+        after=page.after,
+        model=models.get.GameGet,
+        fields=fields,
+    )
+    return page.render(results, models.get.GameGet, fields)
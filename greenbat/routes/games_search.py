@@ -0,0 +1,33 @@
+import fastapi as f
+import sqlalchemy.ext.asyncio as sa
+
+import greenbat.models as models
+import greenbat.dependencies as deps
+import greenbat.utils.search as search
+import greenbat.utils.serializers as serializers
+from greenbat.config import cfg
+from greenbat.utils.indoc import indoc
+
+
+router = f.APIRouter()
+
+
+@router.get(
+    "/",
+    summary="Search games by title",
+    description=indoc("""
+        Get an array of the games whose Steam or custom title best matches the query `q`, in order of relevance.
+        
+        Titles starting with `q` come first, so that this can be used to autocomplete titles while they are being 
+        typed; depending on the server configuration, titles containing words similar to `q` may follow, even if 
+        `q` contains typos.
+    """),
+    response_model=list[models.get.GameGet],
+)
+async def _(
+        *,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        q: str = f.Query(..., min_length=1, example="Baba"),
+        limit: int = f.Query(10, ge=1, le=cfg["search.maxlimit"]),
+):
+    return serializers.response(await session.run_sync(search.search, q, limit), models.get.GameGet)
@@ -2,15 +2,24 @@ import uuid
 import typing as t
 
 import fastapi as f
+import fastapi.encoders
 import sqlalchemy.exc
 import sqlalchemy.orm as so
+import sqlalchemy.ext.asyncio as sa
 import sqlalchemy.sql as ss
 import starlette.status as status
 
 import greenbat.models as models
 import greenbat.dependencies as deps
 import greenbat.database.tables as tables
-import greenbat.utils.queries as queries
+import greenbat.utils.aqueries as aqueries
+import greenbat.utils.loaders as loaders
+import greenbat.utils.fieldsets as fieldsets
+import greenbat.utils.pagination as pagination
+import greenbat.utils.conditional as conditional
+import greenbat.utils.cache as cache
+import greenbat.utils.serializers as serializers
+import greenbat.database.versions as versions
 import greenbat.auth as auth
 from greenbat.config import cfg
 from greenbat.utils.indoc import indoc
@@ -29,13 +38,34 @@ router = f.APIRouter()
     """),
     response_model=list[models.get.GameGet],
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
-        limit: int = f.Query(cfg["api.list.maxlimit"], le=cfg["api.list.maxlimit"]),
-        offset: int = f.Query(0, ge=0),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        page: pagination.Page = f.Depends(deps.dep_page),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
 ):
-    return queries.list_joined(session=session, tables=[tables.Game, tables.MetadataSteam], limit=limit, offset=offset)
+    await conditional.check(session, page.request, page.response, [versions.CATALOG])
+    results = await aqueries.list_joined(session, tables=[tables.Game, tables.MetadataSteam], limit=page.limit, offset=page.offset, after=page.after, model=models.get.GameGet, fields=fields)
+    return page.render(results, models.get.GameGet, fields)
+
+
+@router.get(
+    "/batch",
+    summary="Retrieve many Steam games by Steam appid",
+    description=indoc("""
+        Get detailed information about all the games with the specified Steam `appids` at once, in the same order 
+        as the `appids`; the `appids` of the games that do not exist are listed in `missing`.
+    """),
+    response_model=models.batch.GameBatch,
+)
+async def _(
+        *,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        appids: list[int] = f.Query(..., example=[570, 730]),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
+):
+    games, missing = await aqueries.retrieve_many(session, table=tables.Game, key=tables.MetadataSteam.appid, values=appids, joins=[tables.MetadataSteam], model=models.retrieve.GameRetrieve, fields=fields)
+    return serializers.response_batch(games, missing, models.retrieve.GameRetrieve, fields=fields)
 
 
 @router.get(
@@ -51,9 +81,10 @@ def _(
         },
     },
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        request: f.Request,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         appid: int = f.Path(..., examples={
             "Dota 2": {
                 "name": "Dota 2",
@@ -68,13 +99,17 @@ def _(
                 "value": 736260,
             }
         }),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
 ):
-    try:
-        return session.execute(
-            ss.select(tables.Game).join(tables.MetadataSteam).where(tables.MetadataSteam.appid == appid)
-        ).scalar()
-    except sqlalchemy.exc.NoResultFound:
-        raise f.HTTPException(404, "No game with the specified Steam `appid` exists in the database")
+    async def build():
+        try:
+            return (await session.execute(
+                ss.select(tables.Game).join(tables.MetadataSteam).where(tables.MetadataSteam.appid == appid).options(*loaders.for_selection(tables.Game, models.retrieve.GameRetrieve, fieldsets.parse(models.retrieve.GameRetrieve, fields)))
+            )).unique().scalar_one()
+        except sqlalchemy.exc.NoResultFound:
+            raise f.HTTPException(404, "No game with the specified Steam `appid` exists in the database")
+
+    return await cache.responses.response(request, cache.tags_for(tables.Game, models.retrieve.GameRetrieve), models.retrieve.GameRetrieve, build, fields=fields)
 
 
 @router.post(
@@ -92,18 +127,20 @@ def _(
         },
     },
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         _user: tables.User = f.Security(deps.dep_user, scopes=["create:game_steam"]),
         metadata_steam: models.edit.MetadataSteamEdit = f.Body(...),
 ):
-    if meta := session.execute(ss.select(tables.MetadataSteam).where(tables.MetadataSteam.appid) == metadata_steam.appid).one_or_none():
-        raise f.HTTPException(status.HTTP_409_CONFLICT, meta.game)
+    if existing := (await session.execute(
+        ss.select(tables.Game).join(tables.MetadataSteam).where(tables.MetadataSteam.appid == metadata_steam.appid).options(*loaders.for_model(tables.Game, models.retrieve.GameRetrieve))
+    )).unique().scalar_one_or_none():
+        raise f.HTTPException(status.HTTP_409_CONFLICT, fastapi.encoders.jsonable_encoder(models.retrieve.GameRetrieve.from_orm(existing)))
 
     game = tables.Game()
     session.add(game)
     meta = tables.MetadataSteam(**metadata_steam.dict(), game=game)
     session.add(meta)
-    session.commit()
-    return game
+    await session.commit()
+    return await aqueries.refresh(session, game, model=models.retrieve.GameRetrieve)
@@ -0,0 +1,38 @@
+import fastapi as f
+import sqlalchemy.ext.asyncio as sa
+import sqlalchemy.sql as ss
+
+import greenbat.models as models
+import greenbat.dependencies as deps
+import greenbat.database.tables as tables
+import greenbat.utils.aqueries as aqueries
+from greenbat.utils.indoc import indoc
+
+
+router = f.APIRouter()
+
+
+@router.get(
+    "/{id}",
+    name="retrieve_job",
+    summary="Retrieve the progress of a job",
+    description=indoc("""
+        Get the status and the progress of the job with the specified `id`, started by the currently logged in user.
+        
+        `progress` and `total` count the items processed so far and the items to process, respectively; `total` is 
+        `null` until the job knows how many items it has to process.
+    """),
+    response_model=models.get.JobGet,
+    responses={
+        404: {
+            "description": "No job with the specified `id` was started by the currently logged in user",
+        },
+    },
+)
+async def _(
+        *,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        user: tables.User = f.Security(deps.dep_user),
+        id: int = f.Path(..., example=1),
+):
+    return await aqueries.retrieve(session, tables.Job, ss.and_(tables.Job.id == id, tables.Job.owner_id == user.sub), model=models.get.JobGet)
@@ -1,9 +1,10 @@
-from functools import reduce
 import uuid
 import typing as t
 
 import fastapi as f
+import sqlalchemy as s
 import sqlalchemy.orm as so
+import sqlalchemy.ext.asyncio as sa
 import sqlalchemy.sql as ss
 import starlette.status as status
 
@@ -11,7 +12,10 @@ import greenbat.models as models
 import greenbat.dependencies as deps
 import greenbat.database.tables as tables
 import greenbat.database.enums as enums
-import greenbat.utils.queries as queries
+import greenbat.utils.aqueries as aqueries
+import greenbat.utils.loaders as loaders
+import greenbat.utils.ownership as ownership
+import greenbat.utils.serializers as serializers
 import greenbat.auth as auth
 from greenbat.config import cfg
 from greenbat.utils.indoc import indoc
@@ -20,6 +24,35 @@ from greenbat.utils.indoc import indoc
 router = f.APIRouter()
 
 
+async def check_users(session: sa.AsyncSession, subs: list[str]) -> None:
+    """
+    Ensure that all the users with the passed `subs` exist, raising a 404 :class:`fastapi.HTTPException` otherwise.
+    """
+
+    if not subs:
+        return
+
+    found = set((await session.execute(
+        ss.select(tables.User.sub).where(tables.User.sub.in_(subs))
+    )).scalars())
+
+    if missing := [sub for sub in subs if sub not in found]:
+        raise f.HTTPException(404, f"User not found: {missing!r}")
+
+
+def select_games(game_ids) -> ss.Select:
+    """
+    Select the games having their `id` in `game_ids`, eagerly loading their metadata in the same statement.
+    """
+
+    return (
+        ss.select(tables.Game)
+        .where(tables.Game.id.in_(game_ids))
+        .options(*loaders.for_model(tables.Game, models.get.GameGet))
+        .order_by(tables.Game.id)
+    )
+
+
 @router.get(
     "/shared",
     summary="Get the list of games owned by all the specified users",
@@ -35,15 +68,25 @@ router = f.APIRouter()
         },
     }
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         subs: list[str] = f.Query(..., min_length=2, example=["auth0|5ed2debf7308300c1ea230c3", "auth0|5f3814421704af006de0c2e3"]),
 ):
-    users: t.Iterable[list[tables.User]] = map(lambda sub: session.execute(ss.select(tables.User).where(tables.User.sub == sub)), subs)
-    elements: t.Iterable[list[tables.Element]] = map(lambda sub: sub.elements, users)
-    games: t.Iterable[set[tables.Game]] = map(lambda elist: set(map(lambda e: e.game, elist)), elements)
-    return reduce(lambda p, n: p.intersection(n), games)
+    subs = list(dict.fromkeys(subs))
+
+    if ownership.index.loaded:
+        await check_users(session, [sub for sub in subs if not ownership.index.knows(sub)])
+        return serializers.response((await session.execute(select_games(ownership.index.shared(subs)))).scalars().all(), models.get.GameGet)
+
+    await check_users(session, subs)
+    shared = (
+        ss.select(tables.Element.game_id)
+        .where(tables.Element.owner_id.in_(subs))
+        .group_by(tables.Element.game_id)
+        .having(s.func.count(s.distinct(tables.Element.owner_id)) == len(subs))
+    )
+    return serializers.response((await session.execute(select_games(shared))).scalars().all(), models.get.GameGet)
 
 
 @router.get(
@@ -61,12 +104,21 @@ def _(
         },
     }
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         subs: list[str] = f.Query(..., min_length=2, example=["auth0|5ed2debf7308300c1ea230c3", "auth0|5f3814421704af006de0c2e3"]),
 ):
-    users: t.Iterable[list[tables.User]] = map(lambda sub: session.execute(ss.select(tables.User).where(tables.User.sub == sub)), subs)
-    elements: t.Iterable[list[tables.Element]] = map(lambda sub: sub.elements, users)
-    games: t.Iterable[set[tables.Game]] = map(lambda elist: set(map(lambda e: e.game, elist)), elements)
-    return reduce(lambda p, n: p.union(n), games)
+    subs = list(dict.fromkeys(subs))
+
+    if ownership.index.loaded:
+        await check_users(session, [sub for sub in subs if not ownership.index.knows(sub)])
+        return serializers.response((await session.execute(select_games(ownership.index.combined(subs)))).scalars().all(), models.get.GameGet)
+
+    await check_users(session, subs)
+    combined = (
+        ss.select(tables.Element.game_id)
+        .where(tables.Element.owner_id.in_(subs))
+        .distinct()
+    )
+    return serializers.response((await session.execute(select_games(combined))).scalars().all(), models.get.GameGet)
@@ -0,0 +1,57 @@
+import fastapi as f
+import sqlalchemy.ext.asyncio as sa
+import sqlalchemy.sql as ss
+import starlette.status as status
+
+import greenbat.models as models
+import greenbat.dependencies as deps
+import greenbat.database.tables as tables
+import greenbat.utils.jobs as jobs
+import greenbat.utils.sync  # Registers the handler of the sync:library_steam jobs
+from greenbat.utils.indoc import indoc
+
+
+router = f.APIRouter()
+
+
+@router.post(
+    "/steam/",
+    summary="Synchronize the Steam library of the currently logged in user",
+    description=indoc("""
+        Queue a job importing the games owned by all the Steam accounts linked to the currently logged in user, 
+        creating an element for every game not already in their library.
+        
+        Existing elements are never modified nor deleted.
+        
+        The progress of the job can be followed at the URL in the `Location` header of the response; if a 
+        synchronization of the user's library is already in progress, no new job is queued, and the existing one is 
+        returned instead.
+    """),
+    response_model=models.get.JobGet,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        404: {
+            "description": "No Steam account is linked to the currently logged in user",
+        },
+    },
+)
+async def _(
+        *,
+        request: f.Request,
+        response: f.Response,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        user: tables.User = f.Security(deps.dep_user, scopes=["sync:library_steam"]),
+):
+    linked = (await session.execute(
+        ss.select(tables.AccountSteam.steamid).where(tables.AccountSteam.owner_id == user.sub).limit(1)
+    )).first()
+
+    if not linked:
+        raise f.HTTPException(404, "No Steam account is linked to the currently logged in user")
+
+    job, queued = await session.run_sync(jobs.enqueue, user.sub, "sync:library_steam")
+    if queued:
+        jobs.pool.notify()
+
+    response.headers["Location"] = request.url_for("retrieve_job", id=job.id)
+    return job
@@ -1,11 +1,21 @@
+import typing as t
+
 import fastapi as f
-import sqlalchemy.orm as so
+import sqlalchemy.ext.asyncio as sa
+import sqlalchemy.sql as ss
 
 import greenbat.models as models
 import greenbat.dependencies as deps
 import greenbat.database.tables as tables
-import greenbat.utils.queries as queries
+import greenbat.utils.aqueries as aqueries
+import greenbat.utils.pagination as pagination
+import greenbat.utils.conditional as conditional
+import greenbat.utils.cache as cache
+import greenbat.utils.serializers as serializers
+import greenbat.database.versions as versions
+import greenbat.database.stats as stats
 from greenbat.config import cfg
+from greenbat.utils.indoc import indoc
 
 
 router = f.APIRouter()
@@ -16,13 +26,14 @@ router = f.APIRouter()
     summary="List all the registered users",
     response_model=list[models.get.UserGet],
 )
-def _(
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
-        limit: int = f.Query(cfg["api.list.maxlimit"], le=cfg["api.list.maxlimit"]),
-        offset: int = f.Query(0, ge=0),
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        page: pagination.Page = f.Depends(deps.dep_page),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
 ):
-    return queries.list_(session=session, table=tables.User, limit=limit, offset=offset)
+    results = await aqueries.list_(session, table=tables.User, limit=page.limit, offset=page.offset, after=page.after, model=models.get.UserGet, fields=fields)
+    return page.render(results, models.get.UserGet, fields)
 
 
 @router.get(
@@ -30,11 +41,39 @@ def _(
     summary="Retrieve details about the currently logged in user",
     response_model=models.retrieve.UserRetrieve,
 )
-def _(
+async def _(
         *,
+        request: f.Request,
+        response: f.Response,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         user: tables.User = f.Security(deps.dep_user),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
+):
+    await conditional.check(session, request, response, versions.of_user(user.sub))
+    user = await aqueries.refresh(session, user, model=models.retrieve.UserRetrieve, fields=fields)
+    return serializers.response_one(user, models.retrieve.UserRetrieve, headers=response.headers, fields=fields)
+
+
+@router.get(
+    "/batch",
+    summary="Retrieve details about many registered users",
+    description=indoc("""
+        Get details about all the users with the specified `subs` at once, in the same order as the `subs`; the 
+        `subs` of the users that do not exist are listed in `missing`.
+    """),
+    response_model=models.batch.UserBatch,
+)
+async def _(
+        *,
+        request: f.Request,
+        response: f.Response,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        subs: list[str] = f.Query(..., example=["auth0|5ed2debf7308300c1ea230c3", "auth0|5f3814421704af006de0c2e3"]),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
 ):
-    return user
+    await conditional.check(session, request, response, {key for sub in subs for key in versions.of_user(sub)})
+    users, missing = await aqueries.retrieve_many(session, table=tables.User, key=tables.User.sub, values=subs, model=models.retrieve.UserRetrieve, fields=fields)
+    return serializers.response_batch(users, missing, models.retrieve.UserRetrieve, headers=response.headers, fields=fields)
 
 
 @router.get(
@@ -47,9 +86,49 @@ def _(
         },
     }
 )
-def _(
+async def _(
+        *,
+        request: f.Request,
+        response: f.Response,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
+        sub: str = f.Path(..., example="auth0|5ed2debf7308300c1ea230c3"),
+        fields: t.Optional[str] = f.Depends(deps.dep_fields),
+):
+    await conditional.check(session, request, response, versions.of_user(sub))
+    return await cache.responses.response(
+        request, cache.tags_for(tables.User, models.retrieve.UserRetrieve), models.retrieve.UserRetrieve,
+        lambda: aqueries.retrieve(session, table=tables.User, condition=tables.User.sub == sub, model=models.retrieve.UserRetrieve, fields=fields),
+        headers=response.headers,
+        fields=fields,
+    )
+
+
+@router.get(
+    "/{sub}/stats",
+    summary="Retrieve the statistics of the library of a single registered user",
+    description=indoc("""
+        Get the number of elements in the library of the user with the specified `sub`, counted by `rating` and by 
+        `completition`.
+        
+        `completion` is the percentage of the elements with a `completition` other than `NOT_APPLICABLE` that have been 
+        at least `BEATEN`.
+    """),
+    response_model=models.get.LibraryStatsGet,
+    responses={
+        404: {
+            "description": "User not found",
+        },
+    }
+)
+async def _(
         *,
-        session: so.Session = f.Depends(deps.dep_session),
+        request: f.Request,
+        response: f.Response,
+        session: sa.AsyncSession = f.Depends(deps.dep_async_session),
         sub: str = f.Path(..., example="auth0|5ed2debf7308300c1ea230c3"),
 ):
-    return queries.retrieve(session=session, table=tables.User, condition=tables.User.sub == sub)
+    if not (await session.execute(ss.select(tables.User.sub).where(tables.User.sub == sub))).first():
+        raise f.HTTPException(404, "Not found")
+
+    await conditional.check(session, request, response, [versions.library(sub)])
+    return await session.run_sync(stats.read, sub)
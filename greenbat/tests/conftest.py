@@ -7,11 +7,28 @@ Fixtures defined here will be available everywhere in the package.
 import typing as t
 import pytest
 import fastapi
+import fastapi.security
 import fastapi.testclient
+import sqlalchemy
 import sqlalchemy.orm
 
+import greenbat.auth as auth
+import greenbat.dependencies as deps
+import greenbat.database.tables as tables
+import greenbat.utils.cache as cache
 from greenbat.app import app
-from greenbat.database.engine import Session as DatabaseSession
+from greenbat.database.engine import Session as DatabaseSession, engine, async_engine
+
+
+PERMISSIONS = {
+    "profile", "email",
+    "create:element", "rate:element", "complete:element", "move:element", "destroy:element",
+    "create:game_custom", "destroy:game_custom", "create:game_steam", "destroy:any_game",
+    "sync:library_steam",
+}
+"""
+All the OAuth2 scopes required by the routes.
+"""
 
 
 @pytest.fixture(scope="package", autouse=True, name="ftc")
@@ -23,3 +40,80 @@ def fastapi_test_client() -> fastapi.testclient.TestClient:
 def database_session() -> sqlalchemy.orm.Session:
     with DatabaseSession() as session:
         yield session
+
+
+@pytest.fixture(scope="package", name="reset")
+def database_reset() -> t.Callable[[], None]:
+    """
+    A function emptying all the tables of the database, and forgetting everything this process knows about them.
+    """
+
+    def reset():
+        names = [table.name for table in tables.Base.metadata.sorted_tables]
+        with engine.begin() as connection:
+            connection.exec_driver_sql(f"TRUNCATE {', '.join(names)} RESTART IDENTITY CASCADE")
+        deps.known_users.clear()
+        cache.responses.invalidate(names)
+
+    return reset
+
+
+@pytest.fixture(scope="function", name="database")
+def empty_database(reset) -> None:
+    """
+    Start the test with an empty database, and empty it again once it is done.
+    """
+
+    reset()
+    yield
+    reset()
+
+
+@pytest.fixture(scope="function", name="login")
+def login_override() -> t.Callable[..., dict[str, str]]:
+    """
+    A function returning the headers authenticating a request as the user with the passed `sub`.
+
+    Tokens are not verified while the fixture is active: a token is either the `sub` of a user having all the
+    :data:`PERMISSIONS`, or the `sub` followed by a semicolon and the space-separated permissions of the user.
+    """
+
+    def claims(token: str = fastapi.Depends(auth.scheme)) -> auth.RYGLoginClaims:
+        sub, _, permissions = token.partition(";")
+        return auth.RYGLoginClaims.parse_obj({
+            "iss": "test",
+            "sub": sub,
+            "aud": auth.audience,
+            "iat": 0,
+            "exp": 2 ** 31,
+            "azp": "test",
+            "scope": "openid profile email",
+            "permissions": set(permissions.split()) if permissions else PERMISSIONS,
+            "https://meta.ryg.one/name": f"Test {sub}",
+            "https://meta.ryg.one/picture": "https://example.org/picture.png",
+        })
+
+    def login(sub: str, permissions: t.Optional[t.Iterable[str]] = None) -> dict[str, str]:
+        token = sub if permissions is None else f"{sub};{' '.join(permissions)}"
+        return {"Authorization": f"Bearer {token}"}
+
+    app.dependency_overrides[deps.dep_claims] = claims
+    yield login
+    del app.dependency_overrides[deps.dep_claims]
+
+
+@pytest.fixture(scope="function", name="statements")
+def captured_statements() -> list[tuple[str, t.Any]]:
+    """
+    The statements, with their parameters, sent to the database through the engine used by the routes while the
+    fixture is active.
+    """
+
+    captured = []
+
+    def capture(_connection, _cursor, statement, parameters, _context, _executemany):
+        captured.append((statement, parameters))
+
+    sqlalchemy.event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+    yield captured
+    sqlalchemy.event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
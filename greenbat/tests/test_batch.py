@@ -0,0 +1,83 @@
+import pytest
+import sqlalchemy.sql as ss
+
+from greenbat.database.engine import engine
+
+
+@pytest.fixture(name="catalog")
+def seeded_catalog(database) -> None:
+    with engine.begin() as connection:
+        connection.execute(ss.text("""
+            INSERT INTO users (sub, name, picture, last_update)
+            VALUES ('test|1', 'Test 1', 'https://example.org/picture.png', now()),
+                   ('test|2', 'Test 2', 'https://example.org/picture.png', now())
+        """))
+        connection.execute(ss.text("INSERT INTO games (id) SELECT generate_series(1, 3)"))
+        connection.execute(ss.text("INSERT INTO metadata_steam (game_id, appid, title) VALUES (1, 10, 'Counter-Strike'), (2, 20, 'Team Fortress Classic')"))
+        connection.execute(ss.text("INSERT INTO elements (owner_id, game_id) VALUES ('test|1', 1), ('test|2', 2)"))
+
+
+def test_batch_order(ftc, catalog):
+    response = ftc.get("/games/all/batch", params={"ids": [3, 1, 2]})
+    assert response.status_code == 200
+    assert [game["id"] for game in response.json()["results"]] == [3, 1, 2]
+    assert response.json()["missing"] == []
+
+    response = ftc.get("/games/steam/batch", params={"appids": [20, 10]})
+    assert [game["metadata_steam"]["appid"] for game in response.json()["results"]] == [20, 10]
+
+
+def test_batch_duplicates(ftc, catalog, statements):
+    response = ftc.get("/games/all/batch", params={"ids": [2, 1, 2, 2, 1]})
+    assert response.status_code == 200
+    # Each object is returned once, in the position of its first occurrence
+    assert [game["id"] for game in response.json()["results"]] == [2, 1]
+
+    # And is requested from the database once, in a single query
+    [parameters] = [parameters for statement, parameters in statements if statement.startswith("SELECT")]
+    assert parameters == (2, 1)
+
+
+def test_batch_missing(ftc, catalog):
+    response = ftc.get("/games/all/batch", params={"ids": [1, 4, 2, 5, 4]})
+    assert [game["id"] for game in response.json()["results"]] == [1, 2]
+    assert response.json()["missing"] == [4, 5]
+
+    response = ftc.get("/users/batch", params={"subs": ["test|3", "test|2"]})
+    assert [user["sub"] for user in response.json()["results"]] == ["test|2"]
+    assert response.json()["missing"] == ["test|3"]
+
+
+def test_batch_maxsize(ftc, catalog, monkeypatch):
+    monkeypatch.setenv("GREENBAT_API_BATCH_MAXSIZE", "2")
+    assert ftc.get("/games/all/batch", params={"ids": [1, 2]}).status_code == 200
+    assert ftc.get("/games/all/batch", params={"ids": [1, 2, 3]}).status_code == 400
+    assert ftc.get("/games/steam/batch", params={"appids": [10, 20, 30]}).status_code == 400
+    assert ftc.get("/users/batch", params={"subs": ["test|1", "test|2", "test|3"]}).status_code == 400
+
+
+def test_batch_users_etag(ftc, login, catalog):
+    params = {"subs": ["test|1", "test|2"]}
+    response = ftc.get("/users/batch", params=params)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = ftc.get("/users/batch", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    # A change to the library of any of the users is a new representation of the batch
+    [element] = [element["id"] for element in ftc.get("/users/test|2").json()["elements"]]
+    assert ftc.patch(f"/elements/mine/{element}/rating", json="LIKED", headers=login("test|2")).status_code == 200
+
+    response = ftc.get("/users/batch", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.parametrize("path, key", [("/games/all/batch", "ids"), ("/games/steam/batch", "appids"), ("/users/batch", "subs")])
+def test_batch_routed(ftc, catalog, path, key):
+    # The batch routes are not captured by the routes retrieving a single object by its identifier
+    response = ftc.get(path, params={key: [1]})
+    assert response.status_code == 200
+    assert set(response.json()) == {"results", "missing"}
@@ -0,0 +1,189 @@
+import pytest
+import sqlalchemy.sql as ss
+
+import greenbat.database.enums as enums
+import greenbat.database.stats as stats
+import greenbat.database.tables as tables
+from greenbat.database.engine import engine
+
+
+@pytest.fixture(name="library")
+def seeded_library(database, session) -> dict[int, int]:
+    """
+    The library of ``test|1``, as the ids of its elements by the id of the game they refer to.
+    """
+
+    with engine.begin() as connection:
+        connection.execute(ss.text("""
+            INSERT INTO users (sub, name, picture, last_update)
+            VALUES ('test|1', 'Test 1', 'https://example.org/picture.png', now()),
+                   ('test|2', 'Test 2', 'https://example.org/picture.png', now())
+        """))
+        connection.execute(ss.text("INSERT INTO games (id) SELECT generate_series(1, 5)"))
+        connection.execute(ss.text("INSERT INTO elements (owner_id, game_id, rating) VALUES ('test|2', 1, 'LOVED')"))
+        rows = connection.execute(ss.text("""
+            INSERT INTO elements (owner_id, game_id, rating, completition)
+            VALUES ('test|1', 1, 'LIKED', 'BEATEN'), ('test|1', 2, NULL, 'STARTED'), ('test|1', 3, 'MIXED', NULL)
+            RETURNING game_id, id
+        """)).all()
+    stats.rebuild_libraries(session)
+    stats.rebuild_games(session)
+    session.commit()
+    return dict(rows)
+
+
+@pytest.fixture(name="bulk")
+def bulk_request(ftc, login):
+    """
+    A function sending the passed operations to the bulk route as ``test|1``, and returning the results.
+    """
+
+    def bulk(*operations: dict) -> list[dict]:
+        response = ftc.post("/elements/mine/bulk", json=list(operations), headers=login("test|1"))
+        assert response.status_code == 200
+        return response.json()
+
+    return bulk
+
+
+def counters(session) -> tuple[dict, dict]:
+    """
+    The non-zero counters of the libraries and of the games.
+    """
+
+    libraries = {
+        (row.owner_id, row.key): row.count
+        for row in session.execute(ss.select(tables.LibraryStat)).scalars()
+        if row.count
+    }
+    games = {
+        row.game_id: {column.key: getattr(row, column.key) for column in tables.GameStats.__table__.columns}
+        for row in session.execute(ss.select(tables.GameStats)).scalars()
+        if row.owners
+    }
+    return libraries, games
+
+
+def assert_counted(session) -> None:
+    """
+    Assert that the counters kept up to date by the writes are the same a full recount produces.
+    """
+
+    session.expire_all()
+    kept = counters(session)
+    stats.rebuild_libraries(session)
+    stats.rebuild_games(session)
+    session.flush()
+    session.expire_all()
+    assert counters(session) == kept
+    session.rollback()
+
+
+def changelog(session) -> list[tuple]:
+    return session.execute(
+        ss.select(tables.ElementChangeLog.kind, tables.ElementChangeLog.game_id, tables.ElementChangeLog.rating, tables.ElementChangeLog.completition)
+        .where(tables.ElementChangeLog.owner_id == "test|1")
+        .order_by(tables.ElementChangeLog.seq)
+    ).all()
+
+
+def test_bulk_replace(library, bulk, session):
+    # The element is deleted before the new one for the same game is created
+    results = bulk(
+        {"kind": "CREATE", "data": {"game_id": 1, "rating": "DISLIKED"}},
+        {"kind": "DELETE", "id": library[1]},
+    )
+    assert [result["status"] for result in results] == [201, 204]
+    assert results[0]["element"]["game_id"] == 1
+    assert results[0]["element"]["id"] != library[1]
+
+    assert changelog(session) == [
+        (enums.ChangeKind.DELETED, 1, enums.Rating.LIKED, enums.Completition.BEATEN),
+        (enums.ChangeKind.CREATED, 1, enums.Rating.DISLIKED, None),
+    ]
+    assert stats.read(session, "test|1").rating[enums.Rating.DISLIKED] == 1
+    assert stats.read(session, "test|1").rating[enums.Rating.LIKED] == 0
+    assert_counted(session)
+
+
+def test_bulk_duplicate_games(library, bulk, session):
+    results = bulk(
+        {"kind": "CREATE", "data": {"game_id": 4}},
+        {"kind": "CREATE", "data": {"game_id": 4, "rating": "LOVED"}},
+        # Already in the library
+        {"kind": "CREATE", "data": {"game_id": 1}},
+        {"kind": "UPDATE", "id": library[2], "data": {"game_id": 5}},
+        {"kind": "UPDATE", "id": library[3], "data": {"game_id": 5}},
+    )
+    assert [result["status"] for result in results] == [201, 409, 409, 200, 409]
+    assert results[1]["element"] is None
+    assert results[1]["detail"]
+
+    assert [kind for kind, *_ in changelog(session)] == [enums.ChangeKind.UPDATED, enums.ChangeKind.CREATED]
+    assert stats.read(session, "test|1").total == 4
+    assert_counted(session)
+
+
+def test_bulk_not_found(library, bulk, session):
+    with engine.begin() as connection:
+        other = connection.execute(ss.text("SELECT id FROM elements WHERE owner_id = 'test|2'")).scalar()
+
+    results = bulk(
+        {"kind": "CREATE", "data": {"game_id": 6}},
+        {"kind": "UPDATE", "id": library[1], "data": {"game_id": 6}},
+        # Elements of other users are not found either
+        {"kind": "UPDATE", "id": other, "data": {"game_id": 4}},
+        {"kind": "DELETE", "id": 1000},
+        {"kind": "UPDATE", "id": library[3], "data": {"game_id": 3, "rating": "LOVED"}},
+    )
+    assert [result["status"] for result in results] == [404, 404, 404, 404, 200]
+    assert results[0]["detail"] == "Game not found"
+    assert results[2]["detail"] == "Not found"
+    assert [result["status"] for result in bulk({"kind": "DELETE", "id": other})] == [404]
+
+    assert changelog(session) == [(enums.ChangeKind.UPDATED, 3, enums.Rating.LOVED, None)]
+    assert session.execute(ss.select(tables.Element.owner_id).where(tables.Element.id == other)).scalar() == "test|2"
+    assert_counted(session)
+
+
+def test_bulk_move_to_held_game(library, bulk, session):
+    results = bulk({"kind": "UPDATE", "id": library[1], "data": {"game_id": 2, "rating": "LOVED"}})
+    assert [result["status"] for result in results] == [409]
+
+    # Moving is allowed once the element holding the game is deleted in the same request
+    results = bulk(
+        {"kind": "DELETE", "id": library[2]},
+        {"kind": "UPDATE", "id": library[1], "data": {"game_id": 2, "rating": "LOVED"}},
+    )
+    assert [result["status"] for result in results] == [204, 200]
+    assert results[1]["element"] == {"id": library[1], "owner_id": "test|1", "game_id": 2, "rating": "LOVED", "completition": None}
+
+    assert changelog(session) == [
+        (enums.ChangeKind.DELETED, 2, None, enums.Completition.STARTED),
+        (enums.ChangeKind.UPDATED, 2, enums.Rating.LOVED, None),
+    ]
+    assert_counted(session)
+
+
+def test_bulk_kinds(library, bulk, session):
+    results = bulk(
+        {"kind": "CREATE", "data": {"game_id": 4, "completition": "MASTERED"}},
+        {"kind": "UPDATE", "id": library[2], "data": {"game_id": 2, "rating": "LIKED", "completition": "COMPLETED"}},
+        {"kind": "DELETE", "id": library[3]},
+    )
+    assert [result["status"] for result in results] == [201, 200, 204]
+
+    assert changelog(session) == [
+        (enums.ChangeKind.DELETED, 3, enums.Rating.MIXED, None),
+        (enums.ChangeKind.UPDATED, 2, enums.Rating.LIKED, enums.Completition.COMPLETED),
+        (enums.ChangeKind.CREATED, 4, None, enums.Completition.MASTERED),
+    ]
+
+    library_stats = stats.read(session, "test|1")
+    assert library_stats.total == 3
+    assert library_stats.rating[enums.Rating.LIKED] == 2
+    assert library_stats.rating[enums.Rating.MIXED] == 0
+    assert library_stats.completition[enums.Completition.MASTERED] == 1
+    assert session.get(tables.GameStats, 3) is None or session.get(tables.GameStats, 3).owners == 0
+    assert session.get(tables.GameStats, 4).owners == 1
+    assert_counted(session)
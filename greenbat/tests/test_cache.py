@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+import sqlalchemy.sql as ss
+
+import greenbat.database.stats as stats
+import greenbat.database.tables as tables
+import greenbat.utils.cache as cache
+from greenbat.database.engine import engine
+
+
+class FakeRedis:
+    """
+    A stand-in for a Redis client supporting the commands used by :class:`greenbat.utils.cache.RedisBackend`.
+    """
+
+    def __init__(self):
+        self.values: dict[str, bytes] = {}
+        self.calls: list[tuple[str, bool]] = []
+        """
+        The commands received, and whether each of them blocked the event loop.
+        """
+
+    def record(self, command: str) -> None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.calls.append((command, False))
+        else:
+            self.calls.append((command, True))
+
+    def get(self, key):
+        self.record("get")
+        return self.values.get(key)
+
+    def set(self, key, value, px=None):
+        self.record("set")
+        self.values[key] = value
+
+    def mget(self, keys):
+        self.record("mget")
+        return [self.values.get(key) for key in keys]
+
+    def incr(self, key):
+        self.record("incr")
+        self.values[key] = str(int(self.values.get(key, 0)) + 1).encode()
+        return int(self.values[key])
+
+
+def test_backend_abstract():
+    with pytest.raises(TypeError):
+        cache.Backend()
+
+
+def test_memory_backend_not_shared():
+    # Two processes using the memory backend do not see each other's invalidations
+    first, second = cache.ResponseCache(cache.MemoryBackend(max_size=10), ttl=60), cache.ResponseCache(cache.MemoryBackend(max_size=10), ttl=60)
+    key = second.key("/games/all/1", ["games"])
+    first.invalidate(["games"])
+    assert second.key("/games/all/1", ["games"]) == key
+    assert not first.backend.shared
+
+
+def test_redis_backend_shared():
+    client = FakeRedis()
+    first, second = cache.ResponseCache(cache.RedisBackend(client=client), ttl=60), cache.ResponseCache(cache.RedisBackend(client=client), ttl=60)
+    key = second.key("/games/all/1", ["games"])
+    first.invalidate(["games"])
+    assert second.key("/games/all/1", ["games"]) != key
+    assert first.backend.shared
+
+
+def test_require_shared(monkeypatch):
+    monkeypatch.setattr(cache.responses, "backend", cache.MemoryBackend(max_size=10))
+    cache.require_shared(1)
+    with pytest.raises(RuntimeError):
+        cache.require_shared(2)
+
+    monkeypatch.setattr(cache.responses, "backend", cache.RedisBackend(client=FakeRedis()))
+    cache.require_shared(2)
+
+
+def test_stats_rebuild_invalidates(database, session):
+    tags = [tables.LibraryStat.__tablename__, tables.GameStats.__tablename__]
+    before = cache.responses.backend.generations(tags)
+
+    stats.rebuild_libraries(session)
+    stats.rebuild_games(session)
+    session.commit()
+
+    after = cache.responses.backend.generations(tags)
+    assert all(new > old for old, new in zip(before, after))
+
+
+@pytest.fixture(name="redis")
+def redis_responses(monkeypatch) -> FakeRedis:
+    client = FakeRedis()
+    monkeypatch.setattr(cache.responses, "backend", cache.RedisBackend(client=client))
+    return client
+
+
+def test_redis_backend_route(ftc, login, database, redis):
+    with engine.begin() as connection:
+        connection.execute(ss.text("INSERT INTO games (id) VALUES (1)"))
+        connection.execute(ss.text("INSERT INTO metadata_steam (game_id, appid, title) VALUES (1, 10, 'Counter-Strike')"))
+
+    first = ftc.get("/games/all/1")
+    assert first.headers["X-Cache"] == "MISS"
+    assert first.json()["stats"]["owners"] == 0
+    assert ftc.get("/games/all/1").headers["X-Cache"] == "HIT"
+
+    # Committing the AsyncSession of the route invalidates the responses built from the written tables
+    assert ftc.post("/elements/mine/", json={"game_id": 1}, headers=login("test|1")).status_code == 201
+    after = ftc.get("/games/all/1")
+    assert after.headers["X-Cache"] == "MISS"
+    assert after.json()["stats"]["owners"] == 1
+
+    commands = {command for command, _ in redis.calls}
+    assert commands == {"get", "set", "mget", "incr"}
+    assert not any(blocking for _, blocking in redis.calls)
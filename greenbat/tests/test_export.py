@@ -0,0 +1,54 @@
+import json
+
+import pytest
+import sqlalchemy.sql as ss
+
+import greenbat.utils.export as export
+from greenbat.database.engine import engine
+
+
+@pytest.fixture(name="library")
+def seeded_library(database, monkeypatch) -> None:
+    # Export more rows than fit in a single batch
+    monkeypatch.setenv("GREENBAT_API_EXPORT_BATCHSIZE", "2")
+
+    with engine.begin() as connection:
+        connection.execute(ss.text("""
+            INSERT INTO users (sub, name, picture, last_update)
+            VALUES ('test|1', 'Test 1', 'https://example.org/picture.png', now()),
+                   ('test|2', 'Test 2', 'https://example.org/picture.png', now())
+        """))
+        connection.execute(ss.text("INSERT INTO games (id) SELECT generate_series(1, 5)"))
+        connection.execute(ss.text("INSERT INTO metadata_steam (game_id, appid, title) VALUES (1, 10, 'Counter-Strike'), (2, 20, 'Team Fortress Classic')"))
+        connection.execute(ss.text("INSERT INTO metadata_custom (game_id, creator_sub, title, url) VALUES (3, 'test|1', 'Baba Is You', 'https://hempuli.com/baba/')"))
+        connection.execute(ss.text("""
+            INSERT INTO elements (owner_id, game_id, rating, completition)
+            VALUES ('test|1', 1, 'LIKED', 'BEATEN'), ('test|1', 3, NULL, 'STARTED'), ('test|1', 4, 'MIXED', NULL),
+                   ('test|2', 1, 'LOVED', NULL)
+        """))
+
+
+def lines(response) -> list[dict]:
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith(export.MEDIA_TYPE)
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.parametrize("export_path, list_path", [
+    ("/games/all/export", "/games/all/"),
+    ("/elements/of/test|1/export", "/elements/of/test|1/"),
+])
+def test_export_matches_list(ftc, library, export_path, list_path):
+    exported = lines(ftc.get(export_path))
+    assert exported
+    assert exported == ftc.get(list_path).json()
+
+
+def test_export_empty_library(ftc, library):
+    with engine.begin() as connection:
+        connection.execute(ss.text("DELETE FROM elements WHERE owner_id = 'test|2'"))
+    assert lines(ftc.get("/elements/of/test|2/export")) == []
+
+
+def test_export_unknown_user(ftc, library):
+    assert ftc.get("/elements/of/test|3/export").status_code == 404
@@ -0,0 +1,99 @@
+import pytest
+import sqlalchemy.sql as ss
+
+import greenbat.database.stats as stats
+from greenbat.database.engine import engine
+
+
+@pytest.fixture(name="element")
+def seeded_element(database, session) -> int:
+    with engine.begin() as connection:
+        connection.execute(ss.text("""
+            INSERT INTO users (sub, name, picture, last_update)
+            VALUES ('test|1', 'Test 1', 'https://example.org/picture.png', now())
+        """))
+        connection.execute(ss.text("INSERT INTO games (id) VALUES (1), (2)"))
+        connection.execute(ss.text("INSERT INTO metadata_steam (game_id, appid, title) VALUES (1, 10, 'Counter-Strike')"))
+        connection.execute(ss.text("INSERT INTO metadata_custom (game_id, creator_sub, title) VALUES (2, 'test|1', 'Baba Is You')"))
+        element = connection.execute(ss.text("""
+            INSERT INTO elements (owner_id, game_id, rating, completition)
+            VALUES ('test|1', 1, 'LIKED', 'BEATEN'), ('test|1', 2, NULL, 'STARTED')
+            RETURNING id
+        """)).scalars().first()
+    stats.rebuild_games(session)
+    session.commit()
+    return element
+
+
+def selects(statements) -> list[str]:
+    return [statement for statement, _ in statements if statement.startswith("SELECT")]
+
+
+def test_fields_id(ftc, element, statements):
+    # The serialization would fail with MissingGreenlet if any unloaded attribute was accessed
+    response = ftc.get(f"/elements/{element}", params={"fields": "id"})
+    assert response.status_code == 200
+    assert response.json() == {"id": element}
+
+    [select] = selects(statements)
+    assert "JOIN" not in select
+    assert "elements.rating" not in select
+    assert "elements.owner_id" not in select
+
+
+def test_fields_nested(ftc, element, statements):
+    response = ftc.get(f"/elements/{element}", params={"fields": "rating,game.metadata_steam.title"})
+    assert response.status_code == 200
+    assert response.json() == {"rating": "LIKED", "game": {"metadata_steam": {"title": "Counter-Strike"}}}
+
+    [select] = selects(statements)
+    assert "metadata_steam" in select
+    assert "metadata_steam.appid" not in select
+    assert "metadata_custom" not in select
+    assert "users" not in select
+    assert "elements.completition" not in select
+
+
+def test_fields_nested_collection(ftc, login, element, statements):
+    response = ftc.get("/users/me", params={"fields": "sub,elements.game_id"}, headers=login("test|1"))
+    assert response.status_code == 200
+    assert response.json() == {"sub": "test|1", "elements": [{"game_id": 1}, {"game_id": 2}]}
+
+    loaded = " ".join(selects(statements))
+    assert "FROM elements" in loaded
+    assert "elements.rating" not in loaded
+    assert "accounts_steam" not in loaded
+    assert "metadata_custom" not in loaded
+
+
+def test_fields_stats_completion(ftc, element, statements):
+    response = ftc.get("/games/all/1", params={"fields": "stats.completion"})
+    assert response.status_code == 200
+    assert response.json() == {"stats": {"completion": 100.0}}
+
+    [select] = selects(statements)
+    assert "game_stats" in select
+    assert "metadata_steam" not in select
+
+
+def test_fields_after_create(ftc, login, database, statements):
+    # The user is created by the request itself, and then reloaded with only the selected fields
+    response = ftc.get("/users/me", params={"fields": "name,metadata_custom_owned.title"}, headers=login("test|1"))
+    assert response.status_code == 200
+    assert response.json() == {"name": "Test test|1", "metadata_custom_owned": []}
+    assert not any("FROM elements" in select or "accounts_steam" in select for select in selects(statements))
+
+    response = ftc.post("/games/custom/mine/", json={"title": "Outer Wilds", "url": "https://www.mobiusdigitalgames.com/outer-wilds.html"}, headers=login("test|1"))
+    assert response.status_code == 201
+    game = response.json()
+    assert game["metadata_custom"]["title"] == "Outer Wilds"
+    # Games no element refers to have empty statistics
+    assert game["stats"]["completion"] == 0.0
+
+    response = ftc.get(f"/games/all/{game['id']}", params={"fields": "id,metadata_custom.title,stats.completion"})
+    assert response.status_code == 200
+    assert response.json() == {"id": game["id"], "metadata_custom": {"title": "Outer Wilds"}, "stats": {"completion": 0.0}}
+
+    response = ftc.post("/elements/mine/", json={"game_id": game["id"], "rating": "LOVED"}, headers=login("test|1"))
+    assert response.status_code == 201
+    assert response.json()["game"]["metadata_custom"]["title"] == "Outer Wilds"
@@ -0,0 +1,89 @@
+import pytest
+import sqlalchemy.sql as ss
+
+import greenbat.utils.pagination as pagination
+from greenbat.database.engine import engine
+
+
+USERS = 1000
+LIBRARY = 50
+GAMES = 5000
+
+INDEXED = {"elements", "metadata_custom", "accounts_steam"}
+"""
+The tables whose foreign keys are indexed, which the hot routes must never scan sequentially.
+"""
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded(reset) -> None:
+    reset()
+    with engine.begin() as connection:
+        connection.execute(ss.text("INSERT INTO games (id) SELECT generate_series(1, :games)"), {"games": GAMES})
+        connection.execute(ss.text("""
+            INSERT INTO users (sub, name, picture, last_update)
+            SELECT 'test|' || n, 'Test ' || n, 'https://example.org/picture.png', now()
+            FROM generate_series(1, :users) AS n
+        """), {"users": USERS})
+        connection.execute(ss.text("""
+            INSERT INTO elements (owner_id, game_id)
+            SELECT 'test|' || n, 1 + (n * 7 + m * 97) % :games
+            FROM generate_series(1, :users) AS n, generate_series(1, :library) AS m
+            ON CONFLICT DO NOTHING
+        """), {"users": USERS, "library": LIBRARY, "games": GAMES})
+        connection.execute(ss.text("""
+            INSERT INTO metadata_custom (game_id, creator_sub, title)
+            SELECT n, 'test|' || (1 + n % :users), 'Game ' || n
+            FROM generate_series(1, :games) AS n
+        """), {"users": USERS, "games": GAMES})
+        connection.execute(ss.text("""
+            INSERT INTO accounts_steam (steamid, owner_id, last_update)
+            SELECT 76561197960265728 + n, 'test|' || n, now()
+            FROM generate_series(1, :users) AS n
+        """), {"users": USERS})
+        connection.exec_driver_sql("ANALYZE")
+    yield
+    reset()
+
+
+def scanned(plan: dict) -> set[tuple[str, str]]:
+    """
+    Get the node types and the relations of all the nodes of a plan in the JSON format of ``EXPLAIN``.
+    """
+
+    nodes = {(plan["Node Type"], plan.get("Relation Name"))}
+    for child in plan.get("Plans", []):
+        nodes |= scanned(child)
+    return nodes
+
+
+def sequentially_scanned(statements: list[tuple[str, tuple]]) -> set[str]:
+    """
+    Explain the captured statements, returning the indexed tables any of them scans sequentially.
+    """
+
+    tables = set()
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith("SELECT"):
+                continue
+            [plan] = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+            tables |= {relation for node, relation in scanned(plan["Plan"]) if node == "Seq Scan"} & INDEXED
+    return tables
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/elements/of/test|1/", {}),
+    ("/elements/of/test|1/", {"after": pagination.encode_cursor([1000])}),
+    ("/games/all/1/elements/", {}),
+    ("/games/all/1/elements/", {"after": pagination.encode_cursor([1000])}),
+    ("/games/custom/of/test|1/", {}),
+    ("/users/test|1", {}),
+    ("/match/shared", {"subs": ["test|1", "test|2"]}),
+    ("/match/combined", {"subs": ["test|1", "test|2"]}),
+])
+def test_no_sequential_scans(ftc, statements, path, params):
+    response = ftc.get(path, params=params)
+    assert response.status_code == 200
+    assert statements
+    assert sequentially_scanned(statements) == set()
@@ -0,0 +1,145 @@
+import datetime
+import functools
+
+import pytest
+import sqlalchemy
+import sqlalchemy.sql as ss
+import steam.steamid
+
+import greenbat.database.enums as enums
+import greenbat.database.tables as tables
+import greenbat.utils.jobs as jobs
+import greenbat.utils.steamapi as steamapi
+import greenbat.utils.sync as sync
+from greenbat.database.engine import Session, engine
+
+
+STEAMID = steam.steamid.SteamID(76561197960265729)
+
+
+@pytest.fixture(name="user")
+def seeded_user(database) -> str:
+    with engine.begin() as connection:
+        connection.execute(ss.text("""
+            INSERT INTO users (sub, name, picture, last_update)
+            VALUES ('test|1', 'Test 1', 'https://example.org/picture.png', now())
+        """))
+        connection.execute(ss.text("""
+            INSERT INTO accounts_steam (steamid, owner_id, last_update)
+            VALUES (:steamid, 'test|1', now())
+        """), {"steamid": STEAMID.as_64})
+    return "test|1"
+
+
+@pytest.fixture(name="api")
+def fake_steam_api() -> steamapi.FakeSteamAPI:
+    return steamapi.FakeSteamAPI({STEAMID.as_64: [
+        steamapi.OwnedGame(appid=10, title="Counter-Strike"),
+        steamapi.OwnedGame(appid=20, title="Team Fortress Classic"),
+        steamapi.OwnedGame(appid=10, title="Counter-Strike"),
+    ]})
+
+
+@pytest.fixture(name="pool")
+def worker_pool(api) -> jobs.WorkerPool:
+    return jobs.WorkerPool(
+        session_factory=functools.partial(Session, future=True),
+        steam_api_factory=lambda: api,
+        workers=1,
+        poll=0.1,
+        timeout=60,
+    )
+
+
+def enqueue(owner_id: str) -> int:
+    with Session(future=True) as session:
+        job, _ = jobs.enqueue(session, owner_id, "sync:library_steam")
+        return job.id
+
+
+def test_sync_job(user, pool, session):
+    job_id = enqueue(user)
+    assert pool.execute_one()
+
+    job = session.get(tables.Job, job_id)
+    assert job.status == enums.JobStatus.DONE
+    assert job.attempt == 1
+    # Games owned twice are imported, and counted, once
+    assert job.total == job.progress == 2
+    assert job.result == {"created": 2}
+
+    assert not pool.execute_one()
+
+
+def test_sync_job_private(user, pool, api, session):
+    api.libraries.clear()
+    job_id = enqueue(user)
+    assert pool.execute_one()
+
+    job = session.get(tables.Job, job_id)
+    assert job.status == enums.JobStatus.FAILED
+    assert "not public" in job.error
+
+
+def test_enqueue_active(user):
+    first = enqueue(user)
+    assert enqueue(user) == first
+
+
+def test_enqueue_finished_meanwhile(user):
+    first = enqueue(user)
+
+    def finish(_connection, _cursor, statement, _parameters, _context, _executemany):
+        # The active job finishes between the insert that conflicted with it and the select looking for it
+        if statement.startswith("SELECT") and "jobs.status IN" in statement and not finished:
+            finished.append(first)
+            with engine.begin() as connection:
+                connection.execute(ss.update(tables.Job).where(tables.Job.id == first).values(status=enums.JobStatus.DONE))
+
+    finished = []
+    sqlalchemy.event.listen(engine, "before_cursor_execute", finish)
+    try:
+        with Session(future=True) as session:
+            job, queued = jobs.enqueue(session, user, "sync:library_steam")
+            assert queued
+            assert job.id != first
+            assert job.status == enums.JobStatus.QUEUED
+    finally:
+        sqlalchemy.event.remove(engine, "before_cursor_execute", finish)
+
+    assert finished
+
+
+def test_reclaimed_job(user, pool):
+    job_id = enqueue(user)
+
+    with Session(future=True) as slow, Session(future=True) as other:
+        job = pool.claim(slow)
+        assert job.id == job_id
+
+        # The job is not claimed again while its worker is reporting progress
+        assert pool.claim(other) is None
+        jobs.report(slow, job, 1)
+
+        slow.execute(ss.update(tables.Job).values(updated=datetime.datetime.now() - datetime.timedelta(seconds=pool.timeout + 1)))
+        slow.commit()
+        reclaimed = pool.claim(other)
+        assert reclaimed.id == job_id
+        assert reclaimed.attempt == 2
+
+        # The slow worker can no longer write anything together with the progress of the job
+        slow.execute(ss.update(tables.AccountSteam).values(last_update=datetime.datetime(2000, 1, 1)))
+        with pytest.raises(jobs.JobLostError):
+            jobs.report(slow, job, 2)
+        slow.rollback()
+
+        jobs.report(other, reclaimed, 3)
+
+    with Session(future=True) as session:
+        assert session.get(tables.Job, job_id).progress == 3
+        assert session.execute(ss.select(tables.AccountSteam.last_update)).scalar() != datetime.datetime(2000, 1, 1)
+
+
+def test_unique():
+    owned = [steamapi.OwnedGame(appid=1, title="A"), steamapi.OwnedGame(appid=2, title="B"), steamapi.OwnedGame(appid=1, title="C")]
+    assert sync.unique(owned) == [steamapi.OwnedGame(appid=1, title="C"), steamapi.OwnedGame(appid=2, title="B")]
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+import greenbat.database.changes as changes
+import greenbat.utils.ownership as ownership
+
+
+@pytest.fixture(name="libraries")
+def random_libraries() -> list[set[int]]:
+    rng = random.Random(0)
+    # Cover empty, sparse and dense ranges, and ids spanning many ranges
+    return [
+        set(),
+        {0, ownership.LOW_MASK, ownership.LOW_MASK + 1},
+        set(rng.sample(range(150000), 300)),
+        set(rng.sample(range(150000), 300)) | set(range(1000, 1000 + ownership.ARRAY_MAX + 1)),
+        set(range(0, 200000, 3)),
+    ]
+
+
+def test_bitmap_roundtrip(libraries):
+    for library in libraries:
+        bitmap = ownership.Bitmap.from_ids(library)
+        assert list(bitmap) == sorted(library)
+        assert len(bitmap) == len(library)
+
+
+def test_bitmap_operations(libraries):
+    for a in libraries:
+        for b in libraries:
+            assert list(ownership.Bitmap.from_ids(a) & ownership.Bitmap.from_ids(b)) == sorted(a & b)
+            assert list(ownership.Bitmap.from_ids(a) | ownership.Bitmap.from_ids(b)) == sorted(a | b)
+
+
+def test_bitmap_add_discard(libraries):
+    rng = random.Random(0)
+    for library in libraries:
+        bitmap, expected = ownership.Bitmap.from_ids(library), set(library)
+        for _ in range(500):
+            i = rng.choice(sorted(expected)) if expected and rng.random() < 0.5 else rng.randrange(200000)
+            if rng.random() < 0.5:
+                bitmap, _ = bitmap.add(i), expected.add(i)
+            else:
+                bitmap, _ = bitmap.discard(i), expected.discard(i)
+        assert list(bitmap) == sorted(expected)
+        # Every range is stored in its smallest container
+        for container in bitmap.chunks.values():
+            if isinstance(container, int):
+                assert bin(container).count("1") > ownership.ARRAY_MAX
+            else:
+                assert 0 < len(container) <= ownership.ARRAY_MAX
+
+
+def test_bitmap_is_compressed():
+    # A single large id must not take space proportional to its value
+    assert ownership.Bitmap.from_ids([150000]).nbytes == 2
+    assert ownership.Bitmap.from_ids(range(300)).nbytes == 600
+    assert ownership.Bitmap.from_ids(range(65536)).nbytes == 8192
+
+
+def state(owner_id: str, game_id: int) -> changes.ElementState:
+    return changes.ElementState(owner_id=owner_id, game_id=game_id, rating=None, completition=None)
+
+
+def test_index_apply():
+    index = ownership.OwnershipIndex()
+    index.loaded = True
+    index.apply([
+        changes.ElementChange(id=1, before=None, after=state("a", 1)),
+        changes.ElementChange(id=2, before=None, after=state("a", 100000)),
+        changes.ElementChange(id=3, before=None, after=state("b", 100000)),
+        changes.ElementChange(id=4, before=None, after=state("b", 2)),
+    ])
+    assert index.shared(["a", "b"]) == [100000]
+    assert index.combined(["a", "b"]) == [1, 2, 100000]
+
+    index.apply([
+        changes.ElementChange(id=3, before=state("b", 100000), after=state("b", 1)),
+        changes.ElementChange(id=4, before=state("b", 2), after=None),
+    ])
+    assert index.shared(["a", "b"]) == [1]
+    assert index.combined(["b", "unknown"]) == [1]
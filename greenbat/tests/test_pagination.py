@@ -0,0 +1,51 @@
+import fastapi
+import pytest
+
+import greenbat.database.tables as tables
+import greenbat.utils.pagination as pagination
+
+
+@pytest.mark.parametrize("values", [
+    ["abc"],
+    [{"a": 1}],
+    [[1]],
+    [None],
+    [True],
+    [1.5],
+    [2 ** 31],
+    [-2 ** 31 - 1],
+    [],
+    [1, 2],
+])
+def test_invalid_integer_cursor(values):
+    with pytest.raises(fastapi.HTTPException) as info:
+        pagination.after(tables.Game, pagination.encode_cursor(values))
+    assert info.value.status_code == 400
+
+
+def test_invalid_bigint_cursor():
+    with pytest.raises(fastapi.HTTPException):
+        pagination.after(tables.Element, pagination.encode_cursor([2 ** 63]))
+    pagination.after(tables.Element, pagination.encode_cursor([2 ** 31]))
+
+
+def test_invalid_string_cursor():
+    with pytest.raises(fastapi.HTTPException):
+        pagination.after(tables.User, pagination.encode_cursor([1]))
+    pagination.after(tables.User, pagination.encode_cursor(["auth0|1"]))
+
+
+@pytest.mark.parametrize("cursor", ["!!!", pagination.encode_cursor(["abc"]), pagination.encode_cursor([{"a": 1}]), "eyJhIjoxfQ"])
+def test_invalid_cursor_route(ftc, cursor):
+    assert ftc.get("/games/all/", params={"after": cursor}).status_code == 400
+    assert ftc.get("/elements/", params={"after": cursor}).status_code == 400
+
+
+def test_valid_cursor_route(ftc):
+    assert ftc.get("/games/all/", params={"after": pagination.encode_cursor([0])}).status_code == 200
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_invalid_limit_route(ftc, limit):
+    assert ftc.get("/games/all/", params={"limit": limit}).status_code == 422
+    assert ftc.get("/elements/", params={"limit": limit}).status_code == 422
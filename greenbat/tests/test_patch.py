@@ -0,0 +1,100 @@
+import fastapi
+import pytest
+import sqlalchemy
+import sqlalchemy.sql as ss
+
+import greenbat.models as models
+import greenbat.database.enums as enums
+import greenbat.database.tables as tables
+import greenbat.utils.queries as queries
+from greenbat.database.engine import engine
+
+
+@pytest.fixture(name="element")
+def seeded_element(database) -> int:
+    with engine.begin() as connection:
+        connection.execute(ss.text("""
+            INSERT INTO users (sub, name, picture, last_update)
+            VALUES ('test|1', 'Test 1', 'https://example.org/picture.png', now()),
+                   ('test|2', 'Test 2', 'https://example.org/picture.png', now())
+        """))
+        connection.execute(ss.text("INSERT INTO games (id) VALUES (1)"))
+        return connection.execute(ss.text("INSERT INTO elements (owner_id, game_id) VALUES ('test|1', 1) RETURNING id")).scalar()
+
+
+@pytest.fixture(name="patch")
+def counted_patch(session, monkeypatch):
+    """
+    A function calling :func:`greenbat.utils.queries.patch` with the sync session, and returning its result together
+    with the statements it executed before committing the session.
+    """
+
+    executed, committed = [], []
+
+    def capture(_connection, _cursor, statement, _parameters, _context, _executemany):
+        executed.append(statement)
+
+    # The handlers of the commit write the change log and the statistics, which are not the concern of patch
+    commit = queries.commit
+    monkeypatch.setattr(queries, "commit", lambda session: committed.append(len(executed)) or commit(session))
+
+    def patch(*args, **kwargs):
+        executed.clear()
+        committed.clear()
+        try:
+            result = queries.patch(session, *args, **kwargs)
+        except fastapi.HTTPException as e:
+            result = e
+        return result, executed[:committed[0]] if committed else list(executed)
+
+    sqlalchemy.event.listen(engine, "before_cursor_execute", capture)
+    yield patch
+    sqlalchemy.event.remove(engine, "before_cursor_execute", capture)
+
+
+def test_patch_statements(element, patch):
+    result, statements = patch(
+        tables.Element,
+        ss.and_(tables.Element.id == element, tables.Element.owner_id == "test|1"),
+        {"rating": enums.Rating.LIKED},
+        model=models.retrieve.ElementRetrieve,
+    )
+    assert result.rating == enums.Rating.LIKED
+    assert models.retrieve.ElementRetrieve.from_orm(result).game.id == 1
+
+    # One UPDATE checking the condition, and one SELECT loading the relationships of the model
+    assert len(statements) == 2
+    assert statements[0].startswith("UPDATE elements")
+    assert statements[1].startswith("SELECT")
+
+
+def test_patch_not_found(element, patch):
+    result, statements = patch(
+        tables.Element,
+        ss.and_(tables.Element.id == element, tables.Element.owner_id == "test|2"),
+        {"rating": enums.Rating.LIKED},
+        model=models.retrieve.ElementRetrieve,
+    )
+    assert isinstance(result, fastapi.HTTPException)
+    assert result.status_code == 404
+    assert len(statements) == 1
+
+
+def test_patch_logged(element, patch, session):
+    patch(tables.Element, tables.Element.id == element, {"completition": enums.Completition.BEATEN})
+    patch(tables.Element, tables.Element.id == element, {"rating": enums.Rating.LOVED})
+
+    log = session.execute(ss.select(tables.ElementChangeLog).order_by(tables.ElementChangeLog.seq)).scalars().all()
+    assert [(entry.kind, entry.rating, entry.completition) for entry in log] == [
+        (enums.ChangeKind.UPDATED, None, enums.Completition.BEATEN),
+        (enums.ChangeKind.UPDATED, enums.Rating.LOVED, enums.Completition.BEATEN),
+    ]
+
+
+@pytest.mark.parametrize("path, value", [("rating", "LIKED"), ("completition", "BEATEN")])
+def test_patch_routes(ftc, login, element, path, value):
+    response = ftc.patch(f"/elements/mine/{element}/{path}", json=value, headers=login("test|1"))
+    assert response.status_code == 200
+    assert response.json()[path] == value
+
+    assert ftc.patch(f"/elements/mine/{element}/{path}", json=value, headers=login("test|2")).status_code == 404
@@ -0,0 +1,93 @@
+import pytest
+import sqlalchemy.exc
+import sqlalchemy.sql as ss
+
+import greenbat.utils.search as search
+from greenbat.config import cfg
+from greenbat.database.engine import engine
+
+
+TITLES = {
+    1: "Baba Is You",
+    2: "The Witness",
+    3: "Portal 2",
+    4: "Outer Wilds",
+    5: "100% Orange Juice",
+}
+
+
+@pytest.fixture(name="titles")
+def seeded_titles(database) -> dict[int, str]:
+    with engine.begin() as connection:
+        connection.execute(ss.text("INSERT INTO games (id) SELECT generate_series(1, 6)"))
+        connection.execute(ss.text("INSERT INTO metadata_steam (game_id, appid, title) VALUES (:id, :id * 10, :title)"), [
+            {"id": id, "title": title} for id, title in TITLES.items() if id != 4
+        ])
+        connection.execute(ss.text("""
+            INSERT INTO users (sub, name, picture, last_update)
+            VALUES ('test|1', 'Test 1', 'https://example.org/picture.png', now())
+        """))
+        connection.execute(ss.text("INSERT INTO metadata_custom (game_id, creator_sub, title) VALUES (4, 'test|1', :title)"), {"title": TITLES[4]})
+    return TITLES
+
+
+@pytest.fixture(name="trigram")
+def trigram_indexes(titles, session) -> None:
+    try:
+        search.create_trigram_indexes(session)
+        session.commit()
+    except sqlalchemy.exc.DBAPIError as e:
+        pytest.skip(f"The pg_trgm extension is not available: {e.orig}")
+
+
+@pytest.fixture(name="memory")
+def empty_memory_index(monkeypatch) -> None:
+    monkeypatch.setattr(search, "_memory_index", None)
+    monkeypatch.setattr(search, "_memory_refresh", None)
+
+
+@pytest.mark.parametrize("backend", ["prefix", "memory"])
+def test_search_prefix(titles, memory, session, backend):
+    assert search.backends[backend](session, "portal", 10) == [3]
+    assert search.backends[backend](session, "OUT", 10) == [4]
+    # Wildcards are matched literally
+    assert search.backends[backend](session, "100%", 10) == [5]
+    assert search.backends[backend](session, "%", 10) == []
+
+
+def test_search_words(titles, memory, session):
+    # Unlike the prefix backend, the memory one also matches the start of any word
+    assert search.backends["memory"](session, "witn", 10) == [2]
+    assert search.backends["prefix"](session, "witn", 10) == []
+
+
+def test_search_trigram(trigram, session):
+    # Titles starting with the query come first, then the ones with words similar to it, even with typos
+    assert search.backends["trigram"](session, "portal", 10) == [3]
+    assert search.backends["trigram"](session, "witnes", 10) == [2]
+    assert search.backends["trigram"](session, "outr wilds", 10) == [4]
+
+
+def test_memory_index_refresh(titles, memory, session):
+    index = search.memory_index(session)
+    assert index.search("portal", 10) == [3]
+
+    with engine.begin() as connection:
+        connection.execute(ss.text("INSERT INTO games (id) VALUES (7)"))
+        connection.execute(ss.text("INSERT INTO metadata_steam (game_id, appid, title) VALUES (7, 70, 'Portal')"))
+
+    # A stale index keeps being used while the new one is built in the background
+    index.built_at -= cfg["search.refresh"] + 1
+    assert search.memory_index(session) is index
+    if refresh := search._memory_refresh:
+        refresh.join()
+
+    refreshed = search.memory_index(session)
+    assert refreshed is not index
+    assert refreshed.search("portal", 10) == [7, 3]
+
+
+def test_schema_independent_of_backend():
+    # The indexes of the trigram backend are created by its own command, so the schema is the same for every backend
+    for table in search.metadata_tables:
+        assert not any(index.name.endswith("_title_trgm") for index in table.__table__.indexes)
@@ -0,0 +1,71 @@
+import fastapi.encoders
+import pytest
+import sqlalchemy.sql as ss
+import steam.steamid
+
+import greenbat.database.stats as stats
+import greenbat.database.tables as tables
+import greenbat.models as models
+import greenbat.utils.loaders as loaders
+import greenbat.utils.serializers as serializers
+from greenbat.database.engine import engine
+
+
+STEAMID = steam.steamid.SteamID(76561197960265729)
+
+
+@pytest.fixture(name="seeded")
+def seeded_database(database, session) -> None:
+    with engine.begin() as connection:
+        connection.execute(ss.text("""
+            INSERT INTO users (sub, name, picture, last_update)
+            VALUES ('test|1', 'Test 1', 'https://example.org/picture.png', now()),
+                   ('test|2', 'Test 2', 'https://example.org/picture.png', now())
+        """))
+        connection.execute(ss.text("INSERT INTO accounts_steam (steamid, owner_id, last_update) VALUES (:steamid, 'test|1', now())"), {"steamid": STEAMID.as_64})
+        connection.execute(ss.text("INSERT INTO games (id) SELECT generate_series(1, 4)"))
+        connection.execute(ss.text("INSERT INTO metadata_steam (game_id, appid, title) VALUES (1, 10, 'Counter-Strike'), (2, 20, 'Team Fortress Classic')"))
+        connection.execute(ss.text("INSERT INTO metadata_custom (game_id, creator_sub, title, url) VALUES (3, 'test|1', 'Baba Is You', 'https://hempuli.com/baba/')"))
+        connection.execute(ss.text("""
+            INSERT INTO elements (owner_id, game_id, rating, completition)
+            VALUES ('test|1', 1, 'LIKED', 'BEATEN'), ('test|1', 3, NULL, 'STARTED'), ('test|2', 1, 'LOVED', 'NOT_APPLICABLE'),
+                   ('test|2', 2, NULL, NULL)
+        """))
+        connection.execute(ss.text("""
+            INSERT INTO jobs (owner_id, kind, status, progress, total, result, error, created, updated, started, finished)
+            VALUES ('test|1', 'sync:library_steam', 'DONE', 2, 2, '{"created": 2}', NULL, now(), now(), now(), now()),
+                   ('test|1', 'sync:library_steam', 'FAILED', 0, NULL, NULL, 'The library is not public', now(), now(), NULL, now()),
+                   ('test|2', 'sync:library_steam', 'QUEUED', 0, NULL, NULL, NULL, now(), now(), NULL, NULL)
+        """))
+    stats.rebuild_games(session)
+    session.commit()
+
+
+@pytest.mark.parametrize("table, model", [
+    (tables.User, models.retrieve.UserRetrieve),
+    # Game 4 has no statistics, which are then filled by the validator of the stats field
+    (tables.Game, models.retrieve.GameRetrieve),
+    (tables.Game, models.get.GameGet),
+    (tables.Element, models.get.ElementGet),
+    (tables.Element, models.retrieve.ElementRetrieve),
+    (tables.Job, models.get.JobGet),
+])
+def test_serializer_parity(seeded, session, table, model):
+    objects = session.execute(ss.select(table).options(*loaders.for_model(table, model))).unique().scalars().all()
+    assert objects
+
+    serializer = serializers.serializer_for(model)
+    for obj in objects:
+        # The compiled serializers return the same data FastAPI returns when validating the response model
+        expected = fastapi.encoders.jsonable_encoder(model.from_orm(obj))
+        assert serializer(obj) == expected
+        assert serializers.dumps(serializer(obj)) == serializers.dumps(expected)
+
+
+def test_serializer_parity_stats(seeded, session):
+    game = session.get(tables.Game, 1)
+    data = serializers.serializer_for(models.retrieve.GameRetrieve)(game)
+    assert data["stats"]["owners"] == 2
+    assert data["stats"]["completion"] == 100.0
+    assert session.get(tables.Game, 4).stats is None
+    assert serializers.serializer_for(models.retrieve.GameRetrieve)(session.get(tables.Game, 4))["stats"]["owners"] == 0
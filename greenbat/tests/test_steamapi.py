@@ -0,0 +1,181 @@
+import http.server
+import json
+import threading
+import time
+import typing as t
+
+import pytest
+import steam.steamid
+
+import greenbat.utils.steamapi as steamapi
+import greenbat.utils.sync as sync
+
+
+STEAMID = steam.steamid.SteamID(76561197960265729)
+
+OWNED_GAMES = "/IPlayerService/GetOwnedGames/v1/"
+APP_DETAILS = "/api/appdetails"
+
+
+class StandIn(http.server.ThreadingHTTPServer):
+    """
+    A local stand-in for the Steam Web API, answering every request with the next of the responses queued for its path,
+    or with the last one once the queue is exhausted, and recording the requests it received.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.responses: dict[str, list[tuple[int, dict[str, str], t.Any]]] = {}
+        self.requests: list[tuple[float, str, dict[str, str]]] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def queue(self, path: str, status: int, body: t.Any = None, headers: t.Optional[dict[str, str]] = None) -> None:
+        self.responses.setdefault(path, []).append((status, headers or {}, body))
+
+    def received(self, path: str) -> list[tuple[float, dict[str, str]]]:
+        return [(moment, headers) for moment, requested, headers in self.requests if requested == path]
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    server: StandIn
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        self.server.requests.append((time.monotonic(), path, dict(self.headers)))
+        queued = self.server.responses[path]
+        status, headers, body = queued.pop(0) if len(queued) > 1 else queued[0]
+
+        content = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(name="server")
+def stand_in() -> StandIn:
+    server = StandIn()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client(server: StandIn, **kwargs) -> steamapi.WebSteamAPI:
+    options = {"key": "test", "timeout": 5, "rate": 1000, "burst": 1000, "retries": 3, "backoff": 0.01, **kwargs}
+    return steamapi.WebSteamAPI(api_url=server.url, store_url=server.url, **options)
+
+
+def library(*games: tuple[int, str]) -> dict:
+    return {"response": {"game_count": len(games), "games": [{"appid": appid, "name": name} for appid, name in games]}}
+
+
+def test_owned_games(server):
+    server.queue(OWNED_GAMES, 200, library((10, "Counter-Strike"), (20, "Team Fortress Classic")))
+    assert client(server).owned_games(STEAMID) == [
+        steamapi.OwnedGame(appid=10, title="Counter-Strike"),
+        steamapi.OwnedGame(appid=20, title="Team Fortress Classic"),
+    ]
+
+
+def test_private_library(server):
+    server.queue(OWNED_GAMES, 200, {"response": {}})
+    with pytest.raises(steamapi.PrivateLibraryError):
+        client(server).owned_games(STEAMID)
+
+
+def test_retries(server):
+    server.queue(OWNED_GAMES, 500)
+    server.queue(OWNED_GAMES, 503)
+    server.queue(OWNED_GAMES, 200, library((10, "Counter-Strike")))
+    assert client(server).owned_games(STEAMID) == [steamapi.OwnedGame(appid=10, title="Counter-Strike")]
+    assert len(server.received(OWNED_GAMES)) == 3
+
+
+def test_retries_exhausted(server):
+    server.queue(OWNED_GAMES, 500)
+    with pytest.raises(steamapi.SteamAPIError):
+        client(server, retries=2).owned_games(STEAMID)
+    assert len(server.received(OWNED_GAMES)) == 3
+
+
+def test_client_error_not_retried(server):
+    server.queue(OWNED_GAMES, 403)
+    with pytest.raises(steamapi.SteamAPIError):
+        client(server).owned_games(STEAMID)
+    assert len(server.received(OWNED_GAMES)) == 1
+
+
+def test_retry_after(server):
+    server.queue(OWNED_GAMES, 429, headers={"Retry-After": "1"})
+    server.queue(OWNED_GAMES, 200, library((10, "Counter-Strike")))
+    client(server).owned_games(STEAMID)
+
+    [(first, _), (second, _)] = server.received(OWNED_GAMES)
+    # The server asked for a longer wait than the backoff
+    assert second - first >= 0.95
+
+
+def test_token_bucket(server):
+    server.queue(OWNED_GAMES, 200, library())
+    api = client(server, rate=20, burst=2)
+
+    start = time.monotonic()
+    for _ in range(6):
+        api.owned_games(STEAMID)
+    # The burst is spent immediately, then a token is added every 1/20 s
+    assert time.monotonic() - start >= (6 - 2) / 20 * 0.9
+
+
+def test_token_bucket_burst():
+    bucket = steamapi.TokenBucket(rate=10, burst=5)
+
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_app_details_etag(server):
+    details = {"name": "Counter-Strike", "type": "game"}
+    server.queue(APP_DETAILS, 200, {"10": {"success": True, "data": details}}, headers={"ETag": '"v1"'})
+    server.queue(APP_DETAILS, 304)
+    api = client(server)
+
+    assert api.app_details(10) == details
+    assert api.app_details(10) == details
+
+    [(_, first), (_, second)] = server.received(APP_DETAILS)
+    assert "If-None-Match" not in first
+    assert second["If-None-Match"] == '"v1"'
+
+
+def test_app_details_unknown(server):
+    server.queue(APP_DETAILS, 200, {"10": {"success": False}})
+    with pytest.raises(steamapi.UnknownAppError):
+        client(server).app_details(10)
+
+
+def test_titled(server):
+    server.queue(OWNED_GAMES, 200, {"response": {"game_count": 3, "games": [{"appid": 10, "name": "Counter-Strike"}, {"appid": 20}, {"appid": 30}]}})
+    server.queue(APP_DETAILS, 200, {"20": {"success": True, "data": {"name": "Team Fortress Classic"}}})
+    server.queue(APP_DETAILS, 200, {"30": {"success": False}})
+    api = client(server)
+
+    # Titles missing from the library are read from the store, and games without a store page are skipped
+    assert sync.titled(api, api.owned_games(STEAMID)) == [
+        steamapi.OwnedGame(appid=10, title="Counter-Strike"),
+        steamapi.OwnedGame(appid=20, title="Team Fortress Classic"),
+    ]
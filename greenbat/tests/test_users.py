@@ -0,0 +1,47 @@
+import datetime
+
+import greenbat.dependencies as deps
+
+
+def known(age: float = 0) -> deps.KnownUser:
+    return deps.KnownUser(
+        name="Test",
+        picture="https://example.org/picture.png",
+        last_update=datetime.datetime.now() - datetime.timedelta(seconds=age),
+    )
+
+
+def test_known_users_bounded():
+    users = deps.KnownUsers(size=2, staleness=datetime.timedelta(seconds=60))
+    users.put("test|1", known())
+    users.put("test|2", known())
+    assert users.get("test|1") is not None
+
+    # The least recently used user is evicted
+    users.put("test|3", known())
+    assert len(users) == 2
+    assert users.get("test|2") is None
+    assert users.get("test|1") is not None
+    assert users.get("test|3") is not None
+
+
+def test_known_users_stale():
+    users = deps.KnownUsers(size=2, staleness=datetime.timedelta(seconds=60))
+    users.put("test|1", known(age=61))
+    users.put("test|2", known(age=59))
+
+    assert users.get("test|1") is None
+    assert users.get("test|2") is not None
+    # Stale users are dropped instead of being kept around
+    assert len(users) == 1
+
+
+def test_known_users_written(ftc, login, database, statements):
+    assert ftc.get("/users/me", headers=login("test|1")).status_code == 200
+    assert ftc.get("/users/me", headers=login("test|1")).status_code == 200
+    assert len([statement for statement, _ in statements if statement.startswith("INSERT INTO users")]) == 1
+
+    # Forgotten users are written again
+    deps.known_users.clear()
+    assert ftc.get("/users/me", headers=login("test|1")).status_code == 200
+    assert len([statement for statement, _ in statements if statement.startswith("INSERT INTO users")]) == 2
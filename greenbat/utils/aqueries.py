@@ -0,0 +1,94 @@
+"""
+:mod:`asyncio` counterparts of the helpers in :mod:`greenbat.utils.queries`, to be used with a
+:class:`sqlalchemy.ext.asyncio.AsyncSession`.
+
+Every helper runs its synchronous counterpart through :meth:`sqlalchemy.ext.asyncio.AsyncSession.run_sync`, so that
+the same query logic is shared by both.
+"""
+
+import sqlalchemy.ext.asyncio as sa
+
+import greenbat.utils.queries as queries
+
+
+RowType = queries.RowType
+
+
+async def list_(session: sa.AsyncSession, *args, **kwargs) -> list[RowType]:
+    """
+    See :func:`greenbat.utils.queries.list_`.
+    """
+
+    return await session.run_sync(queries.list_, *args, **kwargs)
+
+
+async def list_joined(session: sa.AsyncSession, *args, **kwargs) -> list[RowType]:
+    """
+    See :func:`greenbat.utils.queries.list_joined`.
+    """
+
+    return await session.run_sync(queries.list_joined, *args, **kwargs)
+
+
+async def retrieve(session: sa.AsyncSession, *args, **kwargs) -> RowType:
+    """
+    See :func:`greenbat.utils.queries.retrieve`.
+    """
+
+    return await session.run_sync(queries.retrieve, *args, **kwargs)
+
+
+async def retrieve_many(session: sa.AsyncSession, *args, **kwargs) -> tuple[list[RowType], list]:
+    """
+    See :func:`greenbat.utils.queries.retrieve_many`.
+    """
+
+    return await session.run_sync(queries.retrieve_many, *args, **kwargs)
+
+
+async def refresh(session: sa.AsyncSession, *args, **kwargs) -> RowType:
+    """
+    See :func:`greenbat.utils.queries.refresh`.
+    """
+
+    return await session.run_sync(queries.refresh, *args, **kwargs)
+
+
+async def create(session: sa.AsyncSession, *args, **kwargs) -> RowType:
+    """
+    See :func:`greenbat.utils.queries.create`.
+    """
+
+    return await session.run_sync(queries.create, *args, **kwargs)
+
+
+async def merge(session: sa.AsyncSession, *args, **kwargs) -> tuple[RowType, bool]:
+    """
+    See :func:`greenbat.utils.queries.merge`.
+    """
+
+    return await session.run_sync(queries.merge, *args, **kwargs)
+
+
+async def edit(session: sa.AsyncSession, *args, **kwargs) -> RowType:
+    """
+    See :func:`greenbat.utils.queries.edit`.
+    """
+
+    return await session.run_sync(queries.edit, *args, **kwargs)
+
+
+async def patch(session: sa.AsyncSession, *args, **kwargs) -> RowType:
+    """
+    See :func:`greenbat.utils.queries.patch`.
+    """
+
+    return await session.run_sync(queries.patch, *args, **kwargs)
+
+
+async def destroy(session: sa.AsyncSession, *args, **kwargs) -> None:
+    """
+    See :func:`greenbat.utils.queries.destroy`.
+    """
+
+    return await session.run_sync(queries.destroy, *args, **kwargs)
@@ -0,0 +1,224 @@
+"""
+Bulk edits of the elements of a library, applying many operations in a single transaction.
+
+Operations are grouped by kind and applied with a handful of statements per ``api.bulk.batchsize`` operations instead
+of loading an ORM object for each of them: deletions first, then updates, then creations, so that an element can be
+replaced by deleting it and creating a new one for the same game in the same request.
+"""
+
+import royalnet.royaltyping as t
+
+import fastapi as f
+import sqlalchemy as s
+import sqlalchemy.exc
+import sqlalchemy.orm as so
+import sqlalchemy.sql as ss
+import sqlalchemy.dialects.postgresql as sp
+
+import greenbat.database.tables as tables
+import greenbat.database.enums as enums
+import greenbat.database.changes as changes
+import greenbat.models as models
+import greenbat.utils.queries as queries
+from greenbat.utils.sync import batches
+from greenbat.config import cfg
+
+
+SCOPES: dict[enums.OperationKind, set[str]] = {
+    enums.OperationKind.CREATE: {"create:element"},
+    enums.OperationKind.UPDATE: {"rate:element", "complete:element", "move:element"},
+    enums.OperationKind.DELETE: {"destroy:element"},
+}
+"""
+The OAuth2 scopes required to apply each kind of operation, the same required by the routes editing single elements.
+"""
+
+
+class Result(t.NamedTuple):
+    """
+    The outcome of a single operation, with the HTTP status code the route editing a single element would have
+    returned.
+    """
+
+    status: int
+    element: t.Optional[s.engine.Row] = None
+    detail: t.Optional[str] = None
+
+
+NOT_FOUND = Result(404, detail="Not found")
+GAME_NOT_FOUND = Result(404, detail="Game not found")
+DUPLICATE = Result(409, detail="The library already contains an element referring to the same game")
+
+
+def scopes_for(operations: t.Iterable[models.bulk.ElementOperation]) -> set[str]:
+    """
+    Get the OAuth2 scopes required to apply all the passed operations.
+    """
+
+    return set().union(*(SCOPES[operation.kind] for operation in operations))
+
+
+def _delete(session: so.Session, owner_id: str, ids: list[int]) -> dict[int, s.engine.Row]:
+    deleted = session.execute(
+        ss.delete(tables.Element)
+        .where(tables.Element.owner_id == owner_id, tables.Element.id.in_(ids))
+        .returning(*tables.Element.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    changes.record_rows(session, tables.Element, [(row._mapping, None) for row in deleted])
+    return {row.id: row for row in deleted}
+
+
+def _update(session: so.Session, owner_id: str, data: dict[int, models.edit.ElementEdit]) -> tuple[dict[int, s.engine.Row], set[int]]:
+    columns = list(tables.Element.__table__.columns)
+
+    # Lock the elements first, so that the values before the update can be recorded too
+    before = {row.id: row for row in session.execute(
+        ss.select(*columns)
+        .where(tables.Element.owner_id == owner_id, tables.Element.id.in_(data))
+        .with_for_update()
+    )}
+    if not before:
+        return {}, set()
+
+    values = ss.values(
+        ss.column(tables.Element.id.key, tables.Element.id.type),
+        ss.column(tables.Element.game_id.key, tables.Element.game_id.type),
+        ss.column(tables.Element.rating.key, tables.Element.rating.type),
+        ss.column(tables.Element.completition.key, tables.Element.completition.type),
+        name="data",
+    ).data([(id, data[id].game_id, data[id].rating, data[id].completition) for id in before])
+
+    # Elements cannot be moved to a game another element of the library already refers to
+    other = so.aliased(tables.Element)
+    updated = session.execute(
+        ss.update(tables.Element)
+        .where(
+            tables.Element.id == values.c.id,
+            ~ss.exists().where(other.owner_id == owner_id, other.game_id == values.c.game_id, other.id != values.c.id),
+        )
+        .values(
+            game_id=values.c.game_id,
+            # The rows of a VALUES list are untyped, so their enums have to be cast explicitly
+            rating=ss.cast(values.c.rating, tables.Element.rating.type),
+            completition=ss.cast(values.c.completition, tables.Element.completition.type),
+        )
+        .returning(*columns)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    changes.record_rows(session, tables.Element, [
+        (before[row.id]._mapping, row._mapping)
+        for row in updated
+        if tuple(before[row.id]) != tuple(row)
+    ])
+    return {row.id: row for row in updated}, set(before)
+
+
+def _create(session: so.Session, owner_id: str, data: list[models.edit.ElementEdit]) -> dict[int, s.engine.Row]:
+    created = session.execute(
+        sp.insert(tables.Element)
+        .values([{"owner_id": owner_id, **element.dict()} for element in data])
+        .on_conflict_do_nothing(index_elements=[tables.Element.owner_id, tables.Element.game_id])
+        .returning(*tables.Element.__table__.columns)
+    ).all()
+
+    changes.record_rows(session, tables.Element, [(None, row._mapping) for row in created])
+    return {row.game_id: row for row in created}
+
+
+def _apply(session: so.Session, owner_id: str, operations: list[models.bulk.ElementOperation], batch_size: int) -> list[Result]:
+    results: list[t.Optional[Result]] = [None] * len(operations)
+
+    def positions(kind: enums.OperationKind) -> list[int]:
+        return [position for position, operation in enumerate(operations) if operation.kind == kind]
+
+    deletions, updates, creations = map(positions, [enums.OperationKind.DELETE, enums.OperationKind.UPDATE, enums.OperationKind.CREATE])
+
+    # Games referred to by the updated and created elements
+    game_ids = {operations[position].data.game_id for position in updates + creations}
+    known_games = set()
+    for batch in batches(game_ids, batch_size):
+        known_games.update(session.execute(ss.select(tables.Game.id).where(tables.Game.id.in_(batch))).scalars())
+
+    for batch in batches(deletions, batch_size):
+        deleted = _delete(session, owner_id, [operations[position].id for position in batch])
+        for position in batch:
+            results[position] = Result(204) if operations[position].id in deleted else NOT_FOUND
+
+    for position in updates + creations:
+        if operations[position].data.game_id not in known_games:
+            results[position] = GAME_NOT_FOUND
+
+    # Only the first of the operations of the same kind referring to the same game can succeed, as a statement cannot
+    # check the conflicts between its own rows; conflicts with the rows written by earlier statements are detected
+    # by the statements themselves
+    def first_per_game(positions: list[int]) -> list[int]:
+        claimed, first = set(), []
+        for position in positions:
+            game_id = operations[position].data.game_id
+            if results[position] is not None:
+                continue
+            if game_id in claimed:
+                results[position] = DUPLICATE
+            else:
+                claimed.add(game_id)
+                first.append(position)
+        return first
+
+    for batch in batches(first_per_game(updates), batch_size):
+        updated, existing = _update(session, owner_id, {operations[position].id: operations[position].data for position in batch})
+        for position in batch:
+            id = operations[position].id
+            if id in updated:
+                results[position] = Result(200, element=updated[id])
+            else:
+                results[position] = DUPLICATE if id in existing else NOT_FOUND
+
+    pending = first_per_game(creations)
+    for batch in batches(pending, batch_size):
+        created = _create(session, owner_id, [operations[position].data for position in batch])
+        for position in batch:
+            row = created.get(operations[position].data.game_id)
+            results[position] = Result(201, element=row) if row is not None else DUPLICATE
+
+    return results
+
+
+def elements(session: so.Session, owner_id: str, operations: list[models.bulk.ElementOperation], batch_size: t.Optional[int] = None) -> list[Result]:
+    """
+    Apply the passed operations to the library of the user with the passed `owner_id`, **committing the session** in
+    the process.
+
+    Operations failing on their own, such as updates of elements not in the library, are reported in their result
+    without affecting the others; if the transaction cannot be committed at all, a 409 :class:`fastapi.HTTPException`
+    is raised and no operation is applied.
+
+    :param session: The :class:`sqlalchemy.orm.Session` to use.
+    :param owner_id: The `sub` of the user owning the edited elements.
+    :param operations: The operations to apply; their number must be lower than ``api.bulk.maxsize``, and no
+                       element can be the target of more than one of them.
+    :param batch_size: How many operations should be applied with each statement; defaults to ``api.bulk.batchsize``.
+    :return: The :class:`list` of the results of the operations, in the same order.
+    """
+
+    max_size = cfg["api.bulk.maxsize"]
+    if len(operations) > max_size:
+        raise f.HTTPException(400, f"Max size of {max_size} exceeded, try sending fewer operations")
+
+    targeted = set()
+    for operation in operations:
+        if operation.id is not None:
+            if operation.id in targeted:
+                raise f.HTTPException(400, f"Element targeted by more than one operation: {operation.id}")
+            targeted.add(operation.id)
+
+    try:
+        results = _apply(session, owner_id, operations, batch_size or cfg["api.bulk.batchsize"])
+    except sqlalchemy.exc.IntegrityError:
+        session.rollback()
+        raise f.HTTPException(409, "Conflict with the current state of the database")
+
+    queries.commit(session)
+    return results
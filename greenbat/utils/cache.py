@@ -0,0 +1,354 @@
+"""
+A cache of serialized responses, invalidated when the tables they were built from are written to.
+
+Every cached response is tagged with the names of the tables it was built from, and its key includes the current
+*generation* of each of them; invalidating a table increments its generation, making all the responses built from it
+unreachable, and leaving them to be evicted by the size and TTL limits of the backend.
+
+Since the generations are read before the response is built, a response built from data read before a write can
+never be returned after the write is committed.
+
+The tables written to by a transaction are collected automatically when the session is flushed, from the element
+changes reported to :mod:`greenbat.database.changes`, and from the tables reported with :func:`touch` by statements
+bypassing the ORM; they are invalidated after the transaction is committed.
+
+The generations are stored in the backend, and incremented by the process committing the transaction: with the
+``memory`` backend they are local to every process, so writes committed by other processes, such as other API workers,
+``python -m greenbat.utils.catalog`` or ``python -m greenbat.database.stats``, leave the responses cached by a process
+stale until they expire after ``cache.ttl`` seconds. Deployments running more than one API process must therefore use
+the ``redis`` backend, which is shared by all of them; the app refuses to start otherwise.
+
+The calls to the ``redis`` backend wait for the network, so they are run in the threadpool when made from the event
+loop, including the invalidations made when an :class:`sqlalchemy.ext.asyncio.AsyncSession` is committed.
+"""
+
+import abc
+import asyncio
+import collections
+import logging
+import threading
+import time
+import royalnet.royaltyping as t
+
+import fastapi as f
+import pydantic
+import sqlalchemy as s
+import sqlalchemy.orm as so
+import sqlalchemy.util
+import starlette.concurrency
+import starlette.requests
+
+import greenbat.database.changes as changes
+import greenbat.database.tables as tables
+import greenbat.utils.loaders as loaders
+import greenbat.utils.fieldsets as fieldsets
+import greenbat.utils.serializers as serializers
+from greenbat.config import cfg
+
+
+log = logging.getLogger(__name__)
+
+PENDING_KEY = "greenbat.cache.pending"
+
+
+class Backend(abc.ABC):
+    """
+    The interface every cache backend implements.
+    """
+
+    shared: bool = False
+    """
+    Whether the entries and the generations of the backend are shared by all the processes using it.
+    """
+
+    blocking: bool = False
+    """
+    Whether the methods of the backend wait for the network, and therefore should not be called on the event loop.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str) -> t.Optional[bytes]:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def generations(self, tags: list[str]) -> list[int]:
+        """
+        Get the current generations of the passed tags.
+        """
+
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def invalidate(self, tags: t.Iterable[str]) -> None:
+        """
+        Increment the generations of the passed tags.
+        """
+
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def size(self) -> int:
+        raise NotImplementedError()
+
+
+class MemoryBackend(Backend):
+    """
+    A LRU cache local to this process, with a maximum number of entries.
+
+    Writes committed by other processes do not invalidate its entries.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size: int = max_size
+        self.entries: collections.OrderedDict[str, tuple[float, bytes]] = collections.OrderedDict()
+        self.tags: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> t.Optional[bytes]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def generations(self, tags: list[str]) -> list[int]:
+        with self._lock:
+            return [self.tags.get(tag, 0) for tag in tags]
+
+    def invalidate(self, tags: t.Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                self.tags[tag] = self.tags.get(tag, 0) + 1
+
+    def size(self) -> int:
+        return len(self.entries)
+
+
+class RedisBackend(Backend):
+    """
+    A cache shared by all the processes connected to the same Redis server, which evicts entries according to its own
+    ``maxmemory-policy``.
+
+    Requires the optional ``redis`` dependency.
+    """
+
+    shared = True
+    blocking = True
+
+    def __init__(self, url: t.Optional[str] = None, client=None, prefix: str = "greenbat:cache:"):
+        """
+        :param url: The URL of the Redis server to connect to.
+        :param client: An already created client to use instead of connecting to `url`, such as a local stand-in.
+        :param prefix: The prefix of all the keys set by the cache.
+        """
+
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self.prefix: str = prefix
+
+    def get(self, key: str) -> t.Optional[bytes]:
+        return self.client.get(f"{self.prefix}entry:{key}")
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.client.set(f"{self.prefix}entry:{key}", value, px=int(ttl * 1000))
+
+    def generations(self, tags: list[str]) -> list[int]:
+        return [int(value or 0) for value in self.client.mget([f"{self.prefix}tag:{tag}" for tag in tags])]
+
+    def invalidate(self, tags: t.Iterable[str]) -> None:
+        for tag in tags:
+            self.client.incr(f"{self.prefix}tag:{tag}")
+
+    def size(self) -> int:
+        return -1
+
+
+class ResponseCache:
+    """
+    The cache of serialized responses used by the routes.
+    """
+
+    def __init__(self, backend: Backend, ttl: float):
+        """
+        :param backend: The backend to store the responses in.
+        :param ttl: How many seconds a response can be returned from the cache after it was built.
+        """
+
+        self.backend: Backend = backend
+        self.ttl: float = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidations: int = 0
+
+    def key(self, name: str, tags: list[str]) -> str:
+        generations = self.backend.generations(tags)
+        return f"{name}|" + ",".join(f"{tag}={generation}" for tag, generation in zip(tags, generations))
+
+    async def response(self, request: starlette.requests.Request, tags: list[str], model: t.Type[pydantic.BaseModel], build: t.Callable[[], t.Awaitable], headers: t.Optional[t.Mapping[str, str]] = None, fields: t.Optional[str] = None) -> f.Response:
+        """
+        Get the cached response to the passed request, or build, serialize and cache it if it is missing.
+
+        :param request: The request to answer; its URL identifies the response.
+        :param tags: The names of the tables the response is built from, as returned by :func:`tags_for`.
+        :param model: The model to serialize the result of `build` with.
+        :param build: An async function returning the object to serialize; exceptions it raises are not cached.
+        :param headers: Additional headers to send with the response.
+        :param fields: The value of the ``fields`` query parameter, restricting the serialized fields; since it is
+                       part of the URL, every selection is cached separately.
+        :return: A :class:`fastapi.Response` containing the serialized response.
+        """
+
+        serializer = serializers.serializer_for(model, fieldsets.parse(model, fields))
+        key = await self._offload(self.key, f"{request.url.path}?{request.url.query}", tags)
+        headers = dict(headers or {})
+
+        if (body := await self._offload(self.backend.get, key)) is not None:
+            self.hits += 1
+            return f.Response(content=body, media_type="application/json", headers={**headers, "X-Cache": "HIT"})
+
+        self.misses += 1
+        body = serializers.dumps(serializer(await build()))
+        await self._offload(self.backend.set, key, body, self.ttl)
+        return f.Response(content=body, media_type="application/json", headers={**headers, "X-Cache": "MISS"})
+
+    async def _offload(self, function: t.Callable, *args):
+        """
+        Call a method of the backend from the event loop, in the threadpool if it is blocking.
+        """
+
+        if self.backend.blocking:
+            return await starlette.concurrency.run_in_threadpool(function, *args)
+        return function(*args)
+
+    def invalidate(self, tags: t.Iterable[str]) -> None:
+        self.invalidations += 1
+        tags = list(tags)
+
+        if self.backend.blocking and _on_event_loop():
+            # The listeners of the sessions committed by the async routes run on the event loop, inside the greenlet
+            # of the AsyncSession, which can wait for a coroutine
+            sqlalchemy.util.await_only(starlette.concurrency.run_in_threadpool(self.backend.invalidate, tags))
+        else:
+            self.backend.invalidate(tags)
+
+    def stats(self) -> dict[str, t.Union[int, float]]:
+        requests = self.hits + self.misses
+        return {
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def tags_for(table, model: t.Type[pydantic.BaseModel]) -> list[str]:
+    """
+    Get the names of the tables read to serialize objects of `table` with `model`.
+    """
+
+    names = {table.__tablename__}
+    for path in loaders.relationship_paths(table, model):
+        names.update(relationship.mapper.class_.__tablename__ for relationship in path)
+    return sorted(names)
+
+
+def touch(session: so.Session, names: t.Iterable[str]) -> None:
+    """
+    Invalidate the responses built from the tables with the passed `names` when the current transaction of the
+    passed `session` is committed.
+    """
+
+    session.info.setdefault(PENDING_KEY, set()).update(names)
+
+
+@s.event.listens_for(so.Session, "after_flush")
+def _collect(session: so.Session, _flush_context) -> None:
+    names = set()
+    for obj in [*session.new, *session.deleted]:
+        names.add(type(obj).__tablename__)
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            names.add(type(obj).__tablename__)
+    if names:
+        touch(session, names)
+
+
+@s.event.listens_for(so.Session, "after_commit")
+def _invalidate(session: so.Session) -> None:
+    if names := session.info.pop(PENDING_KEY, None):
+        responses.invalidate(names)
+
+
+@changes.on_commit
+def _invalidate_elements(_changes: list[changes.ElementChange]) -> None:
+    # Elements are also written in bulk with statements bypassing the ORM, which are reported to changes instead;
+    # the same goes for the statistics derived from them
+    responses.invalidate([tables.Element.__tablename__, tables.LibraryStat.__tablename__, tables.GameStats.__tablename__])
+
+
+@s.event.listens_for(so.Session, "after_rollback")
+def _discard(session: so.Session) -> None:
+    session.info.pop(PENDING_KEY, None)
+
+
+backends: dict[str, t.Callable[[], Backend]] = {
+    "memory": lambda: MemoryBackend(max_size=cfg["cache.size"]),
+    "redis": lambda: RedisBackend(url=cfg["cache.redis.url"]),
+}
+
+responses = ResponseCache(backend=backends[cfg["cache.backend"]](), ttl=cfg["cache.ttl"])
+
+
+def require_shared(processes: int) -> None:
+    """
+    Ensure that the backend of :data:`responses` can be used by the passed number of API processes.
+
+    :raises RuntimeError: If more than one process would use a backend that is not shared.
+    """
+
+    if processes > 1 and not responses.backend.shared:
+        raise RuntimeError(
+            f"The {cfg['cache.backend']!r} cache backend cannot be used by {processes} processes, as they would not "
+            f"invalidate each other's responses: set cache.backend to 'redis'"
+        )
+
+
+def warn_unshared() -> None:
+    """
+    Warn that the writes committed by this process did not invalidate the responses cached by the API processes, if
+    the backend of :data:`responses` is not shared; to be called by the commands run separately from the API.
+    """
+
+    if not responses.backend.shared:
+        log.warning(
+            f"The {cfg['cache.backend']!r} cache backend is local to every process: "
+            f"the API may return stale responses for up to {cfg['cache.ttl']} seconds"
+        )
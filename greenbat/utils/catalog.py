@@ -0,0 +1,261 @@
+"""
+Bulk ingest of the full Steam app catalog into ``metadata_steam``.
+
+The catalog is a JSON document shaped like the response of ``ISteamApps/GetAppList/v2``; it is parsed incrementally
+and copied in batches into a temporary staging table with ``COPY``, so memory usage does not depend on its size.
+The staging table is then diffed against ``metadata_steam`` in the database, creating the missing games and updating
+the changed titles with a few set-based statements.
+
+Run it with::
+
+    python -m greenbat.utils.catalog [FILE_OR_URL]
+"""
+
+import argparse
+import codecs
+import csv
+import io
+import json
+import logging
+import time
+import royalnet.royaltyping as t
+
+import requests
+import sqlalchemy as s
+import sqlalchemy.orm as so
+import sqlalchemy.sql as ss
+
+import greenbat.database.tables as tables
+import greenbat.database.versions as versions
+import greenbat.utils.sync as sync
+import greenbat.utils.cache as cache
+from greenbat.database.engine import Session
+from greenbat.config import cfg
+
+
+log = logging.getLogger(__name__)
+
+
+class CatalogApp(t.NamedTuple):
+    appid: int
+    title: str
+
+
+class CatalogError(Exception):
+    """
+    The catalog document is not shaped as expected.
+    """
+
+
+def iter_apps(stream: t.BinaryIO, chunk_size: int = 1 << 16) -> t.Iterator[CatalogApp]:
+    """
+    Incrementally parse the apps contained in the ``applist.apps`` array of the passed catalog document.
+
+    Only the array itself is parsed: everything before the ``"apps"`` key is skipped, and everything after the end of
+    the array is ignored.
+
+    :param stream: A binary file-like object containing the document.
+    :param chunk_size: How many bytes to read from the stream at once.
+    """
+
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, position, eof
+        if eof:
+            return False
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[position:] + utf8.decode(chunk)
+        position = 0
+        return True
+
+    # Find the start of the array
+    while True:
+        key = buffer.find('"apps"', position)
+        if key != -1:
+            start = buffer.find("[", key)
+            if start != -1:
+                position = start + 1
+                break
+        elif len(buffer) > 6:
+            # Keep the tail of the buffer, in case the key is split between two chunks
+            position = len(buffer) - 6
+        if not fill():
+            raise CatalogError("The document does not contain an \"apps\" array")
+
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position == len(buffer):
+            if not fill():
+                raise CatalogError("The document ended before the end of the \"apps\" array")
+            continue
+        if buffer[position] == "]":
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if not fill():
+                raise CatalogError(f"Invalid app in the \"apps\" array: {buffer[position:position + 80]!r}")
+            continue
+
+        position = end
+        try:
+            yield CatalogApp(appid=int(obj["appid"]), title=str(obj["name"]))
+        except (KeyError, TypeError, ValueError):
+            raise CatalogError(f"Invalid app in the \"apps\" array: {obj!r}")
+
+
+staging_metadata = s.MetaData()
+
+staging = s.Table(
+    "staging_metadata_steam", staging_metadata,
+    s.Column("line", s.BigInteger, s.Identity()),
+    s.Column("appid", s.BigInteger, nullable=False),
+    s.Column("title", s.String, nullable=False),
+    s.Column("game_id", s.Integer),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+def copy_batch(session: so.Session, apps: list[CatalogApp]) -> None:
+    """
+    Copy the passed apps in the staging table with a single ``COPY`` statement.
+    """
+
+    data = io.StringIO()
+    csv.writer(data).writerows(apps)
+    data.seek(0)
+
+    cursor = session.connection().connection.cursor()
+    cursor.copy_expert(f"COPY {staging.name} (appid, title) FROM STDIN WITH (FORMAT csv)", data)
+
+
+class IngestStats(t.NamedTuple):
+    read: int
+    created: int
+    renamed: int
+    seconds: float
+
+    @property
+    def rate(self) -> float:
+        return self.read / self.seconds if self.seconds else 0.0
+
+
+def ingest(session: so.Session, apps: t.Iterable[CatalogApp], batch_size: t.Optional[int] = None) -> IngestStats:
+    """
+    Create a game for every app in `apps` without Steam metadata, and update the titles of the existing ones,
+    **committing the session** in the process.
+
+    If an appid is repeated, the title of its last occurrence is used.
+
+    :param session: The :class:`sqlalchemy.orm.Session` to use; it must be bound to a ``psycopg2`` engine.
+    :param apps: The apps of the catalog.
+    :param batch_size: How many apps should be copied with each ``COPY``; defaults to ``steam.catalog.batchsize``.
+    :return: The number of apps read, games created and titles updated, and the time it took.
+    """
+
+    batch_size = batch_size or cfg["steam.catalog.batchsize"]
+    started = time.monotonic()
+
+    staging.create(session.connection())
+
+    read = 0
+    for batch in sync.batches(apps, batch_size):
+        copy_batch(session, batch)
+        read += len(batch)
+        elapsed = time.monotonic() - started
+        log.info(f"Read {read} apps ({read / elapsed:.0f} rows/s)")
+
+    s.Index("ix_staging_metadata_steam_appid", staging.c.appid).create(session.connection())
+    session.execute(ss.text(f"ANALYZE {staging.name}"))
+
+    duplicate = staging.alias("duplicate")
+    session.execute(
+        ss.delete(staging)
+        .where(staging.c.appid == duplicate.c.appid)
+        .where(staging.c.line < duplicate.c.line)
+    )
+
+    # Prevent library syncs from creating the same games while the new ones are being inserted
+    session.execute(ss.text(f"LOCK TABLE {tables.MetadataSteam.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))
+
+    sequence = ss.func.pg_get_serial_sequence(tables.Game.__tablename__, tables.Game.id.key)
+    created = session.execute(
+        ss.update(staging)
+        .where(~ss.exists().where(tables.MetadataSteam.appid == staging.c.appid))
+        .values(game_id=ss.func.nextval(sequence))
+    ).rowcount
+
+    session.execute(
+        ss.insert(tables.Game)
+        .from_select([tables.Game.id], ss.select(staging.c.game_id).where(staging.c.game_id.isnot(None)))
+    )
+    session.execute(
+        ss.insert(tables.MetadataSteam)
+        .from_select(
+            [tables.MetadataSteam.game_id, tables.MetadataSteam.appid, tables.MetadataSteam.title],
+            ss.select(staging.c.game_id, staging.c.appid, staging.c.title).where(staging.c.game_id.isnot(None)),
+        )
+    )
+
+    renamed = session.execute(
+        ss.update(tables.MetadataSteam)
+        .where(tables.MetadataSteam.appid == staging.c.appid)
+        .where(staging.c.game_id.is_(None))
+        .where(tables.MetadataSteam.title != staging.c.title)
+        .values(title=staging.c.title)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    if created or renamed:
+        versions.bump(session, [versions.CATALOG])
+        cache.touch(session, [tables.Game.__tablename__, tables.MetadataSteam.__tablename__])
+
+    session.commit()
+    return IngestStats(read=read, created=created, renamed=renamed, seconds=time.monotonic() - started)
+
+
+def open_catalog(source: str) -> t.BinaryIO:
+    """
+    Open the catalog at the passed path or URL as a binary stream, without reading it all in memory.
+    """
+
+    if source.startswith(("http://", "https://")):
+        response = requests.get(source, stream=True, timeout=cfg["steam.http.timeout"])
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return response.raw
+    return open(source, "rb")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import the full Steam app catalog into Greenbat.")
+    parser.add_argument("source", nargs="?", default=cfg["steam.catalog.url"], help="The path or the URL of the catalog.")
+    parser.add_argument("--batch-size", type=int, default=None, help="How many apps should be copied at once.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    with open_catalog(args.source) as stream, Session(future=True) as session:
+        stats = ingest(session, iter_apps(stream), batch_size=args.batch_size)
+
+    log.info(
+        f"Read {stats.read} apps, created {stats.created} games and renamed {stats.renamed} in {stats.seconds:.1f}s "
+        f"({stats.rate:.0f} rows/s)"
+    )
+    if stats.created or stats.renamed:
+        cache.warn_unshared()
+
+
+if __name__ == "__main__":
+    main()
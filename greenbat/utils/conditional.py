@@ -0,0 +1,101 @@
+"""
+Conditional requests, answered using the counters of :mod:`greenbat.database.versions`.
+"""
+
+import datetime
+import email.utils
+import hashlib
+import royalnet.royaltyping as t
+
+import fastapi as f
+import sqlalchemy.ext.asyncio as sa
+import sqlalchemy.sql as ss
+import starlette.requests
+
+import greenbat.database.tables as tables
+
+
+class NotModified(Exception):
+    """
+    The representation of the requested resource the client has cached is still valid.
+
+    Handled by the app with an empty ``304 Not Modified`` response carrying the passed `headers`.
+    """
+
+    def __init__(self, headers: dict[str, str]):
+        super().__init__()
+        self.headers: dict[str, str] = headers
+
+
+def etag(versions: dict[str, int]) -> str:
+    """
+    Compute the weak ``ETag`` of a representation built from the resources with the passed versions.
+    """
+
+    data = ",".join(f"{key}={version}" for key, version in sorted(versions.items()))
+    return f'W/"{hashlib.sha1(data.encode()).hexdigest()[:20]}"'
+
+
+def matches(if_none_match: str, tag: str) -> bool:
+    """
+    Check if the passed ``If-None-Match`` header matches the passed ``ETag``, using the weak comparison.
+    """
+
+    opaque = tag.removeprefix("W/")
+    return any(
+        candidate == "*" or candidate.removeprefix("W/") == opaque
+        for candidate in map(str.strip, if_none_match.split(","))
+    )
+
+
+def modified_since(if_modified_since: str, last_modified: datetime.datetime) -> bool:
+    """
+    Check if the passed timezone-aware `last_modified` is later than the passed ``If-Modified-Since`` header,
+    treating invalid headers as always modified.
+    """
+
+    try:
+        since = email.utils.parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return True
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=datetime.timezone.utc)
+    return last_modified.replace(microsecond=0) > since
+
+
+async def check(session: sa.AsyncSession, request: starlette.requests.Request, response: f.Response, keys: t.Iterable[str]) -> None:
+    """
+    Set the ``ETag`` and ``Last-Modified`` headers of the response to the ones of the resources tracked by the
+    counters with the passed `keys`, raising :class:`NotModified` if the client already has their current
+    representation.
+
+    Only the counters are queried, so this should be called before loading the resources themselves.
+
+    :param session: The :class:`sqlalchemy.ext.asyncio.AsyncSession` to use.
+    :param request: The request to answer.
+    :param response: The response to set the headers of.
+    :param keys: The keys of the counters of the resources included in the representation.
+    """
+
+    keys = list(keys)
+    rows = (await session.execute(
+        ss.select(tables.Version.key, tables.Version.version, tables.Version.updated).where(tables.Version.key.in_(keys))
+    )).all()
+
+    versions = {key: 0 for key in keys}
+    versions.update({key: version for key, version, _ in rows})
+
+    headers = {"ETag": etag(versions)}
+    # Timestamps are stored in the local time of the server
+    last_modified = max((updated.astimezone(datetime.timezone.utc) for _, _, updated in rows), default=None)
+    if last_modified:
+        headers["Last-Modified"] = email.utils.format_datetime(last_modified, usegmt=True)
+
+    response.headers.update(headers)
+
+    if if_none_match := request.headers.get("If-None-Match"):
+        if matches(if_none_match, headers["ETag"]):
+            raise NotModified(headers)
+    elif (if_modified_since := request.headers.get("If-Modified-Since")) and last_modified:
+        if not modified_since(if_modified_since, last_modified):
+            raise NotModified(headers)
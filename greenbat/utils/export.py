@@ -0,0 +1,60 @@
+"""
+Streaming exports of whole tables as newline-delimited JSON.
+
+Rows are read through a server-side cursor, ``api.export.batchsize`` at a time, and every batch is serialized and
+sent before the next one is fetched, so memory usage does not depend on the number of exported rows, and the first
+rows are sent as soon as the database returns them.
+"""
+
+import royalnet.royaltyping as t
+
+import fastapi.responses
+import pydantic
+import sqlalchemy.sql as ss
+
+import greenbat.utils.loaders as loaders
+import greenbat.utils.pagination as pagination
+import greenbat.utils.serializers as serializers
+from greenbat.database.engine import AsyncSession
+from greenbat.config import cfg
+
+
+MEDIA_TYPE = "application/x-ndjson"
+
+
+async def ndjson(table, model: t.Type[pydantic.BaseModel], condition=None, batch_size: t.Optional[int] = None) -> t.AsyncIterator[bytes]:
+    """
+    Serialize all the objects of `table` satisfying the `condition` with `model`, one per line, in primary key order.
+
+    A new session is used, so that the rows can be streamed after the request dependencies have been closed.
+
+    :param table: The table to export the objects of.
+    :param model: The model to serialize every object with, through the serializer compiled from it by
+                  :func:`.serializers.serializer_for`; its relationships are eagerly loaded with the objects.
+    :param condition: A filtering condition that exported objects should satisfy.
+    :param batch_size: How many rows should be fetched from the cursor at once; defaults to ``api.export.batchsize``.
+    :return: An async iterator of chunks of lines, one chunk per batch.
+    """
+
+    batch_size = batch_size or cfg["api.export.batchsize"]
+    serializer = serializers.serializer_for(model)
+
+    qy = ss.select(table)
+    qy = qy.where(condition) if condition is not None else qy
+    qy = qy.order_by(*pagination.primary_key(table))
+    qy = qy.options(*loaders.for_model(table, model))
+    qy = qy.execution_options(yield_per=batch_size)
+
+    async with AsyncSession() as session:
+        result = await session.stream(qy)
+        async for partition in result.scalars().partitions():
+            # The identity map only keeps weak references, so the objects are freed once serialized
+            yield b"".join(serializers.dumps(serializer(obj)) + b"\n" for obj in partition)
+
+
+def response(table, model: t.Type[pydantic.BaseModel], condition=None) -> fastapi.responses.StreamingResponse:
+    """
+    Stream the export of `table` built by :func:`ndjson` as the response.
+    """
+
+    return fastapi.responses.StreamingResponse(ndjson(table, model, condition), media_type=MEDIA_TYPE)
@@ -0,0 +1,142 @@
+"""
+Sparse fieldsets, restricting the fields of a response model returned by a route to the ones requested by the client
+with the ``fields`` query parameter.
+
+The parameter is a comma-separated list of field names, in which the fields of nested objects are separated from the
+name of their parent by a dot: ``id,metadata_steam.title`` selects only the ``id`` of a game and the ``title`` of its
+Steam metadata, while ``metadata_steam`` selects all the fields of the Steam metadata.
+
+A parsed :data:`Selection` is used both by :mod:`greenbat.utils.loaders`, to load only the selected columns and
+relationships, and by :mod:`greenbat.utils.serializers`, to serialize only the selected fields.
+"""
+
+import functools
+import inspect
+import royalnet.royaltyping as t
+
+import fastapi as f
+import pydantic
+import pydantic.fields
+
+
+Selection = t.Optional[tuple[tuple[str, "Selection"], ...]]
+"""
+The fields selected from a model, as pairs of the name of each selected field and of the selection of its nested
+fields, in the order they are defined in the model; :data:`None` selects all the fields.
+"""
+
+
+def nested_model(field: pydantic.fields.ModelField) -> t.Optional[t.Type[pydantic.BaseModel]]:
+    """
+    Get the model of the objects contained in the passed field, or :data:`None` if it contains plain values.
+    """
+
+    if isinstance(field.type_, type) and issubclass(field.type_, pydantic.BaseModel):
+        return field.type_
+    return None
+
+
+def _freeze(model: t.Type[pydantic.BaseModel], tree: t.Optional[dict]) -> Selection:
+    if tree is None:
+        return None
+    return tuple(
+        (name, _freeze(nested_model(field), tree[name]))
+        for name, field in model.__fields__.items()
+        if name in tree
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def parse(model: t.Type[pydantic.BaseModel], value: t.Optional[str]) -> Selection:
+    """
+    Parse the value of the ``fields`` query parameter into the selection of fields of `model` it requests, raising a
+    400 :class:`fastapi.HTTPException` if it contains a field `model` does not have.
+
+    :param model: The model of the objects returned by the route.
+    :param value: The value of the parameter; :data:`None` or an empty string select all the fields.
+    """
+
+    paths = [path.strip() for path in (value or "").split(",") if path.strip()]
+    if not paths:
+        return None
+
+    tree = {}
+    for path in paths:
+        names = path.split(".")
+        node, current = tree, model
+        for position, name in enumerate(names):
+            if current is None or name not in current.__fields__:
+                raise f.HTTPException(400, f"Unknown field: {'.'.join(names[:position + 1])}")
+            if position == len(names) - 1:
+                node[name] = None
+            elif name not in node:
+                node[name] = {}
+            elif node[name] is None:
+                # The whole field has already been selected
+                break
+            node = node[name]
+            current = nested_model(current.__fields__[name])
+
+    return _freeze(model, tree)
+
+
+def get(selection: Selection, name: str) -> Selection:
+    """
+    Get the selection of the nested fields of the field with the passed `name`.
+    """
+
+    if selection is None:
+        return None
+    return dict(selection)[name]
+
+
+def has(selection: Selection, name: str) -> bool:
+    """
+    Check if the field with the passed `name` is selected.
+    """
+
+    return selection is None or name in dict(selection)
+
+
+def _reads_values(field: pydantic.fields.ModelField) -> bool:
+    """
+    Check if any validator of the passed field reads the values of the previous fields.
+    """
+
+    for validator in field.class_validators.values():
+        parameters = inspect.signature(validator.func).parameters
+        if "values" in parameters or any(parameter.kind == parameter.VAR_KEYWORD for parameter in parameters.values()):
+            return True
+    return False
+
+
+@functools.lru_cache(maxsize=1024)
+def required(model: t.Type[pydantic.BaseModel], selection: Selection) -> Selection:
+    """
+    Get the fields of `model` that have to be read to serialize the passed `selection`.
+
+    Validators expect the values they are passed to be complete, so selecting a field with validators requires all
+    its nested fields, and also all the fields defined before it if they read their ``values``.
+    """
+
+    if selection is None:
+        return None
+
+    selected = dict(selection)
+    fields = list(model.__fields__.values())
+
+    for position, field in enumerate(fields):
+        if field.name in selected and field.class_validators:
+            selected[field.name] = None
+            if _reads_values(field):
+                for previous in fields[:position]:
+                    selected.setdefault(previous.name, None)
+
+    result = []
+    for field in fields:
+        if field.name not in selected:
+            continue
+        nested = nested_model(field)
+        sub = selected[field.name]
+        result.append((field.name, required(nested, sub) if nested is not None and sub is not None else sub))
+    return tuple(result)
@@ -0,0 +1,303 @@
+"""
+A queue of long-running jobs persisted in the ``jobs`` table, and the pool of worker threads executing them.
+
+Jobs are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``, so any number of workers and processes can share the same
+queue; a running job not reporting any progress for ``jobs.timeout`` seconds is assumed to have been abandoned by a
+crashed worker, and is claimed again.
+
+Every claim increments the `attempt` of the job, and every write a worker makes to a job checks that it is still the
+attempt the worker claimed: a worker whose job was claimed again, because it was too slow rather than crashed, has its
+pending writes rolled back, so that a job is never executed twice at the same time.
+
+Every kind of job is executed by the function registered for it with :func:`handler`.
+"""
+
+import datetime
+import functools
+import logging
+import threading
+import royalnet.royaltyping as t
+
+import sqlalchemy.orm as so
+import sqlalchemy.sql as ss
+import sqlalchemy.dialects.postgresql as sp
+
+import greenbat.database.tables as tables
+import greenbat.database.enums as enums
+import greenbat.utils.steamapi as steamapi
+from greenbat.database.engine import Session
+from greenbat.config import cfg
+
+
+log = logging.getLogger(__name__)
+
+
+class JobError(Exception):
+    """
+    An expected failure of a job, whose message can be shown to its owner.
+    """
+
+
+class JobLostError(Exception):
+    """
+    The job was claimed again by another worker, which is now executing it in place of the current one.
+    """
+
+
+Handler = t.Callable[[so.Session, tables.Job, "WorkerPool"], t.Optional[dict]]
+
+handlers: dict[str, Handler] = {}
+
+ACTIVE = [enums.JobStatus.QUEUED, enums.JobStatus.RUNNING]
+
+CLAIMS_KEY = "greenbat.jobs.claims"
+
+
+def handler(kind: str) -> t.Callable[[Handler], Handler]:
+    """
+    Register the decorated function as the handler of the jobs of the passed `kind`.
+
+    Handlers are called with a :class:`sqlalchemy.orm.Session`, the :class:`.tables.Job` to execute and the
+    :class:`WorkerPool` executing it, which provides the clients of external services; they should periodically call
+    :func:`report`, and may return a JSON-serializable :class:`dict` to be stored as the result of the job.
+    """
+
+    def decorator(f: Handler) -> Handler:
+        handlers[kind] = f
+        return f
+
+    return decorator
+
+
+def enqueue(session: so.Session, owner_id: str, kind: str) -> tuple[tables.Job, bool]:
+    """
+    Queue a new job of the passed `kind` for the user with the passed `owner_id`, **committing the session** in the
+    process, unless the user already has an active job of the same kind.
+
+    :param session: The :class:`sqlalchemy.orm.Session` to use.
+    :param owner_id: The `sub` of the user requesting the job.
+    :param kind: The kind of the job, which must have a registered :func:`handler`.
+    :return: A :class:`tuple` of the queued or already active job, and whether it was just queued.
+    """
+
+    if kind not in handlers:
+        raise KeyError(f"No handler is registered for jobs of kind {kind!r}")
+
+    # The active job found by the insert may finish before it is selected, in which case the insert is retried
+    job = None
+    while job is None:
+        now = datetime.datetime.now()
+        job_id = session.execute(
+            sp.insert(tables.Job)
+            .values(owner_id=owner_id, kind=kind, status=enums.JobStatus.QUEUED, progress=0, created=now, updated=now)
+            .on_conflict_do_nothing(
+                index_elements=[tables.Job.owner_id, tables.Job.kind],
+                index_where=tables.Job.status.in_(ACTIVE),
+            )
+            .returning(tables.Job.id)
+        ).scalar()
+
+        condition = tables.Job.id == job_id if job_id else ss.and_(
+            tables.Job.owner_id == owner_id,
+            tables.Job.kind == kind,
+            tables.Job.status.in_(ACTIVE),
+        )
+        job = session.execute(ss.select(tables.Job).where(condition)).scalar_one_or_none()
+
+    session.commit()
+    return job, job_id is not None
+
+
+def hold(session: so.Session, job: tables.Job) -> None:
+    """
+    Lock the row of a job claimed with the passed `session` until the end of the current transaction, so that it
+    cannot be claimed again in the meantime.
+
+    :raises JobLostError: If the job has already been claimed again by another worker; the session should then be
+                          rolled back.
+    """
+
+    claimed = session.info.get(CLAIMS_KEY, {}).get(job.id)
+    attempt = session.execute(
+        ss.select(tables.Job.attempt)
+        .where(tables.Job.id == job.id)
+        .with_for_update()
+    ).scalar()
+
+    if claimed is None or attempt != claimed:
+        raise JobLostError(f"Job {job.id} was claimed again by another worker")
+
+
+def report(session: so.Session, job: tables.Job, progress: int, total: t.Optional[int] = None) -> None:
+    """
+    Update the progress of a running job, **committing the session** in the process.
+
+    :param session: The :class:`sqlalchemy.orm.Session` the job was claimed with.
+    :param job: The running job.
+    :param progress: How many items have been processed so far.
+    :param total: How many items should be processed in total, if known.
+    :raises JobLostError: If the job has been claimed again by another worker; nothing is committed in that case.
+    """
+
+    hold(session, job)
+    job.progress = progress
+    if total is not None:
+        job.total = total
+    job.updated = datetime.datetime.now()
+    session.commit()
+
+
+class WorkerPool:
+    """
+    A pool of threads executing the queued jobs.
+    """
+
+    def __init__(
+            self,
+            session_factory: t.Callable[[], so.Session],
+            steam_api_factory: t.Callable[[], steamapi.SteamAPI],
+            workers: int,
+            poll: float,
+            timeout: float,
+    ):
+        """
+        :param session_factory: A function returning a new :class:`sqlalchemy.orm.Session`.
+        :param steam_api_factory: A function returning the :class:`.steamapi.SteamAPI` client jobs should use.
+        :param workers: The number of worker threads to start.
+        :param poll: How many seconds an idle worker should wait before checking the queue again, so that jobs queued by
+                     other processes are picked up.
+        :param timeout: How many seconds a running job can go without reporting progress before it is claimed again.
+        """
+
+        self.session_factory: t.Callable[[], so.Session] = session_factory
+        self.steam_api_factory: t.Callable[[], steamapi.SteamAPI] = steam_api_factory
+        self.workers: int = workers
+        self.poll: float = poll
+        self.timeout: float = timeout
+
+        self.threads: list[threading.Thread] = []
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        """
+        Start the worker threads.
+        """
+
+        self._stopping.clear()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self.run, name=f"jobs-worker-{number}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout: t.Optional[float] = None) -> None:
+        """
+        Stop the worker threads, waiting for the jobs they are executing to end.
+        """
+
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def notify(self) -> None:
+        """
+        Wake up an idle worker, so that a just queued job is executed immediately.
+        """
+
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                executed = self.execute_one()
+            except Exception as e:
+                log.error(f"Could not execute a job: {e!r}")
+                executed = False
+
+            if not executed:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll)
+
+    def claim(self, session: so.Session) -> t.Optional[tables.Job]:
+        """
+        Claim the oldest queued or abandoned job, marking it as running, and remember the claimed attempt in the
+        passed `session`.
+        """
+
+        now = datetime.datetime.now()
+        job = session.execute(
+            ss.select(tables.Job)
+            .where(ss.or_(
+                tables.Job.status == enums.JobStatus.QUEUED,
+                ss.and_(
+                    tables.Job.status == enums.JobStatus.RUNNING,
+                    tables.Job.updated < now - datetime.timedelta(seconds=self.timeout),
+                ),
+            ))
+            .order_by(tables.Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar_one_or_none()
+
+        if job is None:
+            session.rollback()
+            return None
+
+        job.status = enums.JobStatus.RUNNING
+        job.attempt += 1
+        job.started = job.updated = now
+        session.commit()
+        session.info.setdefault(CLAIMS_KEY, {})[job.id] = job.attempt
+        return job
+
+    def execute_one(self) -> bool:
+        """
+        Claim and execute a single job.
+
+        :return: Whether a job was executed.
+        """
+
+        with self.session_factory() as session:
+            job = self.claim(session)
+            if job is None:
+                return False
+
+            job_id = job.id
+            try:
+                try:
+                    result = handlers[job.kind](session, job, self)
+                except JobLostError:
+                    raise
+                except Exception as e:
+                    session.rollback()
+                    if not isinstance(e, JobError):
+                        log.exception(f"Job {job_id} failed unexpectedly")
+                        e = JobError("Internal error")
+                    job = session.get(tables.Job, job_id)
+                    hold(session, job)
+                    job.status = enums.JobStatus.FAILED
+                    job.error = str(e)
+                else:
+                    hold(session, job)
+                    job.status = enums.JobStatus.DONE
+                    job.result = result
+
+                job.finished = job.updated = datetime.datetime.now()
+                session.commit()
+            except JobLostError:
+                session.rollback()
+                log.warning(f"Job {job_id} was claimed again by another worker, discarding its uncommitted work")
+            return True
+
+
+pool = WorkerPool(
+    session_factory=functools.partial(Session, future=True),
+    steam_api_factory=lambda: steamapi.api,
+    workers=cfg["jobs.workers"],
+    poll=cfg["jobs.poll"],
+    timeout=cfg["jobs.timeout"],
+)
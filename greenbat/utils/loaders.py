@@ -0,0 +1,107 @@
+"""
+Derivation of the loader options eagerly loading every relationship serialized by a response model.
+
+Objects loaded through an :class:`sqlalchemy.ext.asyncio.AsyncSession` cannot lazy load their relationships, and lazy
+loading them one by one would issue a query per serialized object anyways, so every query whose results are serialized
+with one of the models in :mod:`greenbat.models` should use the options returned by :func:`for_model`, or by
+:func:`for_selection` if only some of its fields are requested.
+"""
+
+import functools
+import royalnet.royaltyping as t
+
+import pydantic
+import sqlalchemy as s
+import sqlalchemy.orm as so
+
+import greenbat.utils.fieldsets as fieldsets
+
+
+def relationship_paths(table, model: t.Type[pydantic.BaseModel]) -> t.Iterator[tuple[so.RelationshipProperty, ...]]:
+    """
+    Find the longest paths of relationships of `table` that are traversed when serializing it with `model`.
+    """
+
+    relationships = s.inspect(table).relationships
+
+    for name, field in model.__fields__.items():
+        if name not in relationships:
+            continue
+
+        relationship = relationships[name]
+        nested = field.type_
+
+        paths = []
+        if isinstance(nested, type) and issubclass(nested, pydantic.BaseModel):
+            paths = list(relationship_paths(relationship.mapper.class_, nested))
+
+        if paths:
+            for path in paths:
+                yield (relationship, *path)
+        else:
+            yield (relationship,)
+
+
+def loader_for(path: tuple[so.RelationshipProperty, ...]):
+    """
+    Build the loader option eagerly loading all the relationships in `path`.
+
+    Collections are loaded with an additional ``SELECT ... IN`` query, while scalar relationships are joined in the
+    same query as their parent.
+    """
+
+    loader = so
+    for relationship in path:
+        attribute = relationship.class_attribute
+        loader = loader.selectinload(attribute) if relationship.uselist else loader.joinedload(attribute)
+    return loader
+
+
+@functools.lru_cache(maxsize=None)
+def for_model(table, model: t.Type[pydantic.BaseModel]) -> tuple:
+    """
+    Get the loader options required to serialize objects of `table` with `model` without lazy loading anything.
+    """
+
+    return tuple(map(loader_for, relationship_paths(table, model)))
+
+
+@functools.lru_cache(maxsize=1024)
+def for_selection(table, model: t.Type[pydantic.BaseModel], selection: fieldsets.Selection) -> tuple:
+    """
+    Get the loader options required to serialize the fields of `model` in the passed `selection` from objects of
+    `table` without lazy loading anything, loading only the columns and the relationships they are built from.
+
+    The primary key is always loaded, together with the columns the selected relationships are joined on; all the
+    columns are loaded if a selected field is neither a column nor a relationship, as it may be computed from any of
+    them.
+    """
+
+    if selection is None:
+        return for_model(table, model)
+
+    mapper = s.inspect(table)
+    selection = fieldsets.required(model, selection)
+
+    columns = set(mapper.primary_key)
+    load_all = False
+    options = []
+
+    for name, sub in selection:
+        if name in mapper.relationships:
+            relationship = mapper.relationships[name]
+            columns.update(relationship.local_columns)
+            attribute = relationship.class_attribute
+            loader = so.selectinload(attribute) if relationship.uselist else so.joinedload(attribute)
+            nested = fieldsets.nested_model(model.__fields__[name])
+            options.append(loader.options(*for_selection(relationship.mapper.class_, nested, sub)) if nested else loader)
+        elif name in mapper.column_attrs:
+            columns.update(mapper.column_attrs[name].columns)
+        else:
+            load_all = True
+
+    if not load_all:
+        attributes = [mapper.get_property_by_column(column).class_attribute for column in columns]
+        options.insert(0, so.load_only(*sorted(attributes, key=lambda attribute: attribute.key)))
+
+    return tuple(options)
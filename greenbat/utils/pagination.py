@@ -0,0 +1,144 @@
+"""
+Keyset pagination over the primary key of a table, using opaque cursors.
+"""
+
+import base64
+import binascii
+import json
+import royalnet.royaltyping as t
+
+import fastapi as f
+import pydantic
+import sqlalchemy as s
+import sqlalchemy.sql as ss
+import starlette.requests
+
+import greenbat.utils.serializers as serializers
+
+
+def primary_key(table) -> list[s.Column]:
+    """
+    Get the primary key columns of the passed table, in the order pages are sorted by.
+    """
+
+    return list(s.inspect(table).primary_key)
+
+
+def encode_cursor(values: t.Sequence) -> str:
+    """
+    Encode the passed primary key values in an opaque cursor.
+    """
+
+    data = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """
+    Decode the primary key values contained in the passed cursor, raising a 400 :class:`fastapi.HTTPException` if it
+    is not valid.
+    """
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise f.HTTPException(400, "Invalid cursor")
+
+    if not isinstance(values, list):
+        raise f.HTTPException(400, "Invalid cursor")
+
+    return values
+
+
+INTEGER_BITS: dict[t.Type[s.Integer], int] = {
+    s.SmallInteger: 16,
+    s.Integer: 32,
+    s.BigInteger: 64,
+}
+"""
+The number of bits of the integer column types, whose values must fit in them to be compared with the column.
+"""
+
+
+def accepts(column: s.Column, value) -> bool:
+    """
+    Check if the passed value decoded from a cursor can be compared with the passed primary key column.
+    """
+
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return True
+
+    # JSON booleans are decoded as bool, which is a subclass of int
+    if isinstance(value, bool) and python_type is not bool:
+        return False
+    if not isinstance(value, python_type):
+        return False
+
+    for type_, bits in INTEGER_BITS.items():
+        if type(column.type) is type_:
+            return -2 ** (bits - 1) <= value < 2 ** (bits - 1)
+    return True
+
+
+def cursor_of(obj) -> str:
+    """
+    Get the cursor pointing right after the passed object.
+    """
+
+    return encode_cursor(s.inspect(type(obj)).primary_key_from_instance(obj))
+
+
+def after(table, cursor: str):
+    """
+    Get the condition selecting the rows of the passed table coming after the passed cursor.
+    """
+
+    columns = primary_key(table)
+    values = decode_cursor(cursor)
+
+    if len(values) != len(columns) or not all(accepts(column, value) for column, value in zip(columns, values)):
+        raise f.HTTPException(400, "Invalid cursor")
+
+    if len(columns) == 1:
+        return columns[0] > values[0]
+    return ss.tuple_(*columns) > ss.tuple_(*values)
+
+
+class Page:
+    """
+    The pagination parameters of a list request.
+    """
+
+    def __init__(self, request: starlette.requests.Request, response: f.Response, limit: int, offset: int, after: t.Optional[str]):
+        self.request: starlette.requests.Request = request
+        self.response: f.Response = response
+        self.limit: int = limit
+        self.offset: int = offset
+        self.after: t.Optional[str] = after
+
+    def link(self, items: list) -> list:
+        """
+        If `items` fills the page, point the ``Link`` header of the response to the page coming after it.
+
+        :param items: The items contained in this page.
+        :return: The same `items`, so that this can be used in ``return`` statements.
+        """
+
+        if items and len(items) >= self.limit:
+            url = self.request.url.remove_query_params("offset").include_query_params(after=cursor_of(items[-1]))
+            self.response.headers["Link"] = f'<{url}>; rel="next"'
+        return items
+
+    def render(self, items: list, model: t.Type[pydantic.BaseModel], fields: t.Optional[str] = None) -> f.Response:
+        """
+        Like :meth:`link`, but also serialize `items` with the fast serializer compiled from `model`, returning the
+        response together with the headers set on :attr:`response`.
+
+        :param items: The items contained in this page.
+        :param model: The model of the items of the ``response_model`` of the route.
+        :param fields: The value of the ``fields`` query parameter, restricting the serialized fields.
+        """
+
+        return serializers.response(self.link(items), model, headers=self.response.headers, fields=fields)
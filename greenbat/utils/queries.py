@@ -5,6 +5,11 @@ import sqlalchemy.exc
 import sqlalchemy.sql as ss
 import sqlalchemy.orm as so
 import greenbat.config as gc
+import greenbat.utils.pagination as pagination
+import greenbat.utils.loaders as loaders
+import greenbat.utils.fieldsets as fieldsets
+import greenbat.database.changes as changes
+import greenbat.utils.cache as cache
 import pydantic
 
 
@@ -17,39 +22,68 @@ def check_limit(value) -> None:
         raise f.HTTPException(400, f"Max limit of {max_limit} exceeded, try a lower value")
 
 
-def list_(session: so.Session, table: t.Type[RowType], limit: int, offset: int, condition=None, order=None) -> list[RowType]:
+def loader_options(table, options, model: t.Optional[t.Type[pydantic.BaseModel]], fields: t.Optional[str] = None) -> tuple:
+    """
+    Combine the explicitly passed loader `options` with the ones required to serialize `table` with `model`,
+    restricted to the passed `fields` if any.
+    """
+
+    if model is None:
+        return tuple(options)
+    return (*options, *loaders.for_selection(table, model, fieldsets.parse(model, fields)))
+
+
+def list_(session: so.Session, table: t.Type[RowType], limit: int, offset: int, condition=None, order=None, options=(), after=None, model=None, fields=None) -> list[RowType]:
     """
     List all objects in a table.
 
+    Objects are always sorted by primary key, after the passed `order` if any.
+
     :param session: The :class:`sqlalchemy.orm.Session` to use.
     :param table: The table to list the objects of.
     :param limit: The maximum number of items to retrieve. Must be lower than ``api.list.maxlimit``.
     :param offset: The position of the first item to retrieve.
     :param condition: A filtering condition that returned objects should satisfy.
-    :param order: The order to use when listing objects.
+    :param order: The order to use when listing objects. Cannot be used together with `after`.
+    :param options: The loader options to apply to the query.
+    :param after: A cursor returned by :func:`.pagination.cursor_of`: only objects coming after it will be listed.
+    :param model: The response model the objects will be serialized with, used to eagerly load relationships.
+    :param fields: The value of the ``fields`` query parameter, restricting the loaded columns and relationships to
+                   the ones of the selected fields of `model`.
     :return: A :class:`list` of objects.
     """
 
     check_limit(limit)
 
     qy = ss.select(table)
-    qy = qy.where(condition) if condition else qy
-    qy = qy.order_by(order) if order else qy
+    qy = qy.where(condition) if condition is not None else qy
+    qy = qy.where(pagination.after(table, after)) if after is not None else qy
+    qy = qy.order_by(order) if order is not None else qy
+    qy = qy.order_by(*pagination.primary_key(table))
+    qy = qy.options(*loader_options(table, options, model, fields))
     qy = qy.limit(limit)
     qy = qy.offset(offset)
 
-    return session.execute(qy).all()
+    return list(session.execute(qy).unique().scalars())
 
 
-def list_joined(session: so.Session, tables: list[t.Type[RowType]], limit: int, offset: int, order=None) -> list[RowType]:
+def list_joined(session: so.Session, tables: list[t.Type[RowType]], limit: int, offset: int, condition=None, order=None, options=(), after=None, model=None, fields=None) -> list[RowType]:
     """
     List all objects in joined tables.
 
+    Objects are always sorted by the primary key of the first table, after the passed `order` if any.
+
     :param session: The :class:`sqlalchemy.orm.Session` to use.
     :param tables: The tables to list the objects of, in join order.
     :param limit: The maximum number of items to retrieve. Must be lower than ``api.list.maxlimit``.
     :param offset: The position of the first item to retrieve.
-    :param order: The order to use when listing objects.
+    :param condition: A filtering condition that returned objects should satisfy.
+    :param order: The order to use when listing objects. Cannot be used together with `after`.
+    :param options: The loader options to apply to the query.
+    :param after: A cursor returned by :func:`.pagination.cursor_of`: only objects coming after it will be listed.
+    :param model: The response model the objects will be serialized with, used to eagerly load relationships.
+    :param fields: The value of the ``fields`` query parameter, restricting the loaded columns and relationships to
+                   the ones of the selected fields of `model`.
     :return: A :class:`list` of objects.
     """
 
@@ -58,27 +92,35 @@ def list_joined(session: so.Session, tables: list[t.Type[RowType]], limit: int,
     qy = ss.select(tables[0])
     for table in tables[1:]:
         qy = qy.join(table)
-    qy = qy.order_by(order) if order else qy
+    qy = qy.where(condition) if condition is not None else qy
+    qy = qy.where(pagination.after(tables[0], after)) if after is not None else qy
+    qy = qy.order_by(order) if order is not None else qy
+    qy = qy.order_by(*pagination.primary_key(tables[0]))
+    qy = qy.options(*loader_options(tables[0], options, model, fields))
     qy = qy.limit(limit)
     qy = qy.offset(offset)
 
-    return list(session.execute(qy).scalars())
+    return list(session.execute(qy).unique().scalars())
 
 
-def retrieve(session: so.Session, table: t.Type[RowType], condition) -> RowType:
+def retrieve(session: so.Session, table: t.Type[RowType], condition, options=(), model=None, fields=None) -> RowType:
     """
     Retrieve the object satisfying the requested condition.
 
     :param session: The :class:`sqlalchemy.orm.Session` to use.
     :param table: The table to retrieve the objects from.
     :param condition: The condition to check when retrieving the object.
+    :param options: The loader options to apply to the query.
+    :param model: The response model the object will be serialized with, used to eagerly load relationships.
+    :param fields: The value of the ``fields`` query parameter, restricting the loaded columns and relationships to
+                   the ones of the selected fields of `model`.
     :return: The retrieved object.
     """
 
     try:
         return session.execute(
-            ss.select(table).where(condition)
-        ).scalar()
+            ss.select(table).where(condition).options(*loader_options(table, options, model, fields))
+        ).unique().scalar_one()
 
     except sqlalchemy.exc.NoResultFound:
         raise f.HTTPException(404, f"Not found")
@@ -87,13 +129,95 @@ def retrieve(session: so.Session, table: t.Type[RowType], condition) -> RowType:
         raise f.HTTPException(500, f"Multiple found (this is a bug, please report it!)")
 
 
-def create(session: so.Session, table: t.Type[RowType], model_data: pydantic.BaseModel, **additional_data: t.Kwargs) -> RowType:
+def retrieve_many(session: so.Session, table: t.Type[RowType], key, values: t.Sequence, joins=(), options=(), model=None, fields=None) -> tuple[list[RowType], list]:
+    """
+    Retrieve the objects having the passed `values` in the `key` column with a single query.
+
+    :param session: The :class:`sqlalchemy.orm.Session` to use.
+    :param table: The table to retrieve the objects from.
+    :param key: The column identifying the objects; it may belong to one of the `joins`.
+    :param values: The values of `key` of the objects to retrieve. Their number must be lower than
+                   ``api.batch.maxsize``.
+    :param joins: The tables to join to `table` to reach `key`, in join order.
+    :param options: The loader options to apply to the query.
+    :param model: The response model the objects will be serialized with, used to eagerly load relationships.
+    :param fields: The value of the ``fields`` query parameter, restricting the loaded columns and relationships to
+                   the ones of the selected fields of `model`.
+    :return: A :class:`tuple` of the :class:`list` of the objects found, in the order of the first occurrence of
+             their value in `values`, and of the :class:`list` of the values no object was found for.
+    """
+
+    max_size = gc.cfg["api.batch.maxsize"]
+    if len(values) > max_size:
+        raise f.HTTPException(400, f"Max size of {max_size} exceeded, try requesting fewer objects")
+
+    values = list(dict.fromkeys(values))
+    if not values:
+        return [], []
+
+    qy = ss.select(table, key)
+    for join in joins:
+        qy = qy.join(join)
+    qy = qy.where(key.in_(values))
+    qy = qy.options(*loader_options(table, options, model, fields))
+
+    found = {value: obj for obj, value in session.execute(qy).unique()}
+    return [found[value] for value in values if value in found], [value for value in values if value not in found]
+
+
+def commit(session: so.Session) -> None:
+    """
+    Commit the session, raising a 409 :class:`fastapi.HTTPException` if a constraint of the database is violated.
+
+    :param session: The :class:`sqlalchemy.orm.Session` to commit.
+    """
+
+    try:
+        session.commit()
+    except sqlalchemy.exc.IntegrityError:
+        session.rollback()
+        raise f.HTTPException(409, "Conflict with the current state of the database")
+
+
+def refresh(session: so.Session, obj: RowType, options=(), model=None, fields=None) -> RowType:
+    """
+    Reload the passed object from the database, applying the passed loader options.
+
+    :param session: The :class:`sqlalchemy.orm.Session` to use.
+    :param obj: The object to reload.
+    :param options: The loader options to apply to the query.
+    :param model: The response model the object will be serialized with, used to eagerly load relationships.
+    :param fields: The value of the ``fields`` query parameter, restricting the loaded columns and relationships to
+                   the ones of the selected fields of `model`.
+    :return: The reloaded object.
+    """
+
+    table = type(obj)
+    options = loader_options(table, options, model, fields)
+
+    if not options:
+        return obj
+
+    mapper = s.inspect(table)
+    identity = mapper.primary_key_from_instance(obj)
+
+    return session.execute(
+        ss.select(table)
+        .where(*[column == value for column, value in zip(mapper.primary_key, identity)])
+        .options(*options)
+        .execution_options(populate_existing=True)
+    ).unique().scalar_one()
+
+
+def create(session: so.Session, table: t.Type[RowType], model_data: pydantic.BaseModel, options=(), model=None, **additional_data: t.Kwargs) -> RowType:
     """
     Create a new object with the passed data, **committing the session** in the process.
 
     :param session: The :class:`sqlalchemy.orm.Session` to use.
     :param table: The table to create the object in.
     :param model_data: The data the object should have, as a :class:`pydantic.BaseModel`.
+    :param options: The loader options to apply when reloading the created object.
+    :param model: The response model the object will be serialized with, used to eagerly load relationships.
     :param additional_data: Additional data the object should have, as kwargs.
     :return: The created object.
     """
@@ -101,11 +225,11 @@ def create(session: so.Session, table: t.Type[RowType], model_data: pydantic.Bas
     obj = table(**model_data.dict(), **additional_data)
 
     session.add(obj)
-    session.commit()
-    return obj
+    commit(session)
+    return refresh(session, obj, options, model)
 
 
-def merge(session: so.Session, table: t.Type[RowType], condition, model_data: pydantic.BaseModel, **additional_data: t.Kwargs) -> tuple[RowType, bool]:
+def merge(session: so.Session, table: t.Type[RowType], condition, model_data: pydantic.BaseModel, options=(), model=None, **additional_data: t.Kwargs) -> tuple[RowType, bool]:
     """
     Create or update the object matching the condition, **committing the session** in the process.
 
@@ -113,6 +237,8 @@ def merge(session: so.Session, table: t.Type[RowType], condition, model_data: py
     :param table: The table to create the object in.
     :param condition: The condition to check.
     :param model_data: The data the object should use, as a :class:`pydantic.BaseModel`.
+    :param options: The loader options to apply when reloading the object.
+    :param model: The response model the object will be serialized with, used to eagerly load relationships.
     :param additional_data: Additional data the object should have, as kwargs.
     :return: A tuple containing the object and a bool determining if a new object was created.
     """
@@ -120,13 +246,13 @@ def merge(session: so.Session, table: t.Type[RowType], condition, model_data: py
     try:
         obj = session.execute(
             ss.select(table).where(condition)
-        ).scalar()
+        ).scalar_one()
 
     except sqlalchemy.exc.NoResultFound:
         obj = table(**model_data.dict(), **additional_data)
         session.add(obj)
-        session.commit()
-        return obj, True
+        commit(session)
+        return refresh(session, obj, options, model), True
 
     except sqlalchemy.exc.MultipleResultsFound:
         raise f.HTTPException(500, f"Multiple found (this is a bug, please report it!)")
@@ -134,17 +260,19 @@ def merge(session: so.Session, table: t.Type[RowType], condition, model_data: py
     else:
         for key, val in {**model_data.dict(), **additional_data}.items():
             obj.__setattr__(key, val)
-        session.commit()
-        return obj, False
+        commit(session)
+        return refresh(session, obj, options, model), False
 
 
-def edit(session: so.Session, table: t.Type[RowType], condition, model_data: pydantic.BaseModel, **additional_data: t.Kwargs) -> RowType:
+def edit(session: so.Session, table: t.Type[RowType], condition, model_data: pydantic.BaseModel, options=(), model=None, **additional_data: t.Kwargs) -> RowType:
     """
     Edit the object satisfying the requested condition with the passed data, **committing the session** in the process.
 
     :param session: The :class:`sqlalchemy.orm.Session` to use.
     :param table: The table to retrieve the objects from.
     :param model_data: The new data the object should have, as a :class:`pydantic.BaseModel`.
+    :param options: The loader options to apply when reloading the edited object.
+    :param model: The response model the object will be serialized with, used to eagerly load relationships.
     :param additional_data: Additional data the object should have, as kwargs.
     :param condition: The condition to check when selecting the object.
     :return: The retrieved object.
@@ -154,8 +282,63 @@ def edit(session: so.Session, table: t.Type[RowType], condition, model_data: pyd
 
     for key, val in {**model_data.dict(), **additional_data}.items():
         obj.__setattr__(key, val)
-    session.commit()
+    commit(session)
+
+    return refresh(session, obj, options, model)
+
+
+def patch(session: so.Session, table: t.Type[RowType], condition, values: dict[str, t.Any], options=(), model=None) -> RowType:
+    """
+    Set the passed column `values` on the object satisfying the requested condition, **committing the session** in
+    the process.
+
+    Unlike :func:`edit`, the object is never loaded before being updated: a single ``UPDATE ... RETURNING`` statement
+    both checks the condition and applies the change, and the object is then loaded once with all the relationships
+    required by `model`.
+
+    :param session: The :class:`sqlalchemy.orm.Session` to use.
+    :param table: The table to update the object in.
+    :param condition: The condition to check when selecting the object.
+    :param values: The new values of the columns to update, as a :class:`dict`.
+    :param options: The loader options to apply when loading the updated object.
+    :param model: The response model the object will be serialized with, used to eagerly load relationships.
+    :return: The updated object.
+    """
+
+    columns = list(table.__table__.columns)
+    mapper = s.inspect(table)
+
+    # Join the table with a locked copy of itself, so that the values before the update can be returned too
+    before = ss.select(table).where(condition).with_for_update().subquery()
+    rows = session.execute(
+        ss.update(table)
+        .where(*[column == before.c[column.key] for column in mapper.primary_key])
+        .values(**values)
+        .returning(*columns, *before.c)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    if not rows:
+        session.rollback()
+        raise f.HTTPException(404, f"Not found")
+    elif len(rows) > 1:
+        session.rollback()
+        raise f.HTTPException(500, f"Multiple found (this is a bug, please report it!)")
+
+    row = rows[0]
+    after_values = dict(zip([column.key for column in columns], row[:len(columns)]))
+    before_values = dict(zip([column.key for column in columns], row[len(columns):]))
+    changes.record_rows(session, table, [(before_values, after_values)])
+    cache.touch(session, [table.__tablename__])
+
+    obj = session.execute(
+        ss.select(table)
+        .where(*[column == after_values[column.key] for column in mapper.primary_key])
+        .options(*loader_options(table, options, model))
+        .execution_options(populate_existing=True)
+    ).unique().scalar_one()
 
+    commit(session)
     return obj
 
 
@@ -172,7 +355,7 @@ def destroy(session: so.Session, table, condition) -> None:
     try:
         obj = session.execute(
             ss.select(table).where(condition)
-        ).scalar()
+        ).scalar_one()
         session.delete(obj)
         session.commit()
 
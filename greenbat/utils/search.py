@@ -0,0 +1,253 @@
+"""
+Search of games by the title of their Steam or custom metadata.
+
+Three backends are available, selected with ``search.backend``:
+
+- ``trigram`` returns the titles starting with the query first, then the titles containing words similar to the
+  query, tolerating typos; it requires the ``pg_trgm`` PostgreSQL extension;
+- ``prefix``, the default, only returns the titles starting with the query, and works on any PostgreSQL database;
+- ``memory`` keeps a sorted index of the titles in the process, matching the query against the start of the titles
+  and of each of their words, and works with any database; the index is rebuilt in the background every
+  ``search.refresh`` seconds.
+
+The extension and the indexes required by ``trigram`` are not part of the schema managed by the migrations, as the
+extension may not be available; create them before switching to it with::
+
+    python -m greenbat.utils.search
+"""
+
+import argparse
+import bisect
+import logging
+import re
+import threading
+import time
+import royalnet.royaltyping as t
+
+import sqlalchemy.orm as so
+import sqlalchemy.sql as ss
+
+import greenbat.models as models
+import greenbat.database.tables as tables
+import greenbat.utils.loaders as loaders
+from greenbat.database.engine import Session
+from greenbat.config import cfg
+
+
+log = logging.getLogger(__name__)
+
+metadata_tables = [tables.MetadataSteam, tables.MetadataCustom]
+
+
+def normalize(text: str) -> str:
+    return text.lower()
+
+
+def like_prefix(query: str) -> str:
+    """
+    Escape the ``LIKE`` wildcards contained in the query, and append one matching any suffix.
+    """
+
+    return re.sub(r"([\\%_])", r"\\\1", normalize(query)) + "%"
+
+
+def title_key(table):
+    """
+    The expression indexed by the ``ix_metadata_*_title_prefix`` indexes.
+    """
+
+    return ss.func.lower(table.title).collate("C")
+
+
+def prefix_candidates(table, query: str, limit: int) -> ss.Select:
+    return (
+        ss.select(table.game_id, table.title, ss.literal(0).label("rank"), ss.literal(1.0).label("score"))
+        .where(title_key(table).like(like_prefix(query), escape="\\"))
+        .order_by(title_key(table))
+        .limit(limit)
+    )
+
+
+def fuzzy_candidates(table, query: str, limit: int) -> ss.Select:
+    score = ss.func.word_similarity(query, table.title)
+    return (
+        ss.select(table.game_id, table.title, ss.literal(1).label("rank"), score.label("score"))
+        .where(ss.literal(query).op("<%")(table.title))
+        .order_by(score.desc())
+        .limit(limit)
+    )
+
+
+def search_database(session: so.Session, query: str, limit: int, fuzzy: bool) -> list[int]:
+    """
+    Find the ids of the games matching the query using the indexes of the database.
+    """
+
+    candidates = [prefix_candidates(table, query, limit) for table in metadata_tables]
+    if fuzzy:
+        candidates += [fuzzy_candidates(table, query, limit) for table in metadata_tables]
+
+    union = ss.union_all(*[candidate.subquery().select() for candidate in candidates]).subquery()
+    return session.execute(
+        ss.select(union.c.game_id)
+        .group_by(union.c.game_id)
+        .order_by(
+            ss.func.min(union.c.rank),
+            ss.func.max(union.c.score).desc(),
+            ss.func.min(ss.func.lower(union.c.title)),
+            union.c.game_id,
+        )
+        .limit(limit)
+    ).scalars().all()
+
+
+class PrefixIndex:
+    """
+    Two sorted lists, one of normalized titles and one of the suffixes of each title starting at one of its words,
+    allowing to find the titles or the words starting with a given prefix with a binary search.
+    """
+
+    WORD = re.compile(r"\w+")
+
+    def __init__(self, titles: t.Iterable[tuple[int, str]]):
+        """
+        :param titles: Pairs of game ids and titles to index.
+        """
+
+        titles_entries, words_entries = [], []
+        for game_id, title in titles:
+            key = normalize(title)
+            titles_entries.append((key, game_id))
+            for match in self.WORD.finditer(key):
+                if match.start():
+                    words_entries.append((key[match.start():], game_id))
+
+        self.levels: list[tuple[list[str], list[int]]] = []
+        for entries in (titles_entries, words_entries):
+            entries.sort()
+            self.levels.append(([key for key, _ in entries], [game_id for _, game_id in entries]))
+
+        self.built_at: float = time.monotonic()
+
+    def search(self, query: str, limit: int) -> list[int]:
+        """
+        Find the ids of the games whose title or one of its words starts with the query, returning the titles
+        starting with the query first.
+        """
+
+        prefix = normalize(query)
+        results, seen = [], set()
+
+        for keys, game_ids in self.levels:
+            position = bisect.bisect_left(keys, prefix)
+            while position < len(keys) and len(results) < limit and keys[position].startswith(prefix):
+                if (game_id := game_ids[position]) not in seen:
+                    seen.add(game_id)
+                    results.append(game_id)
+                position += 1
+
+        return results
+
+
+_memory_index: t.Optional[PrefixIndex] = None
+_memory_refresh: t.Optional[threading.Thread] = None
+_memory_lock = threading.Lock()
+
+
+def build_memory_index(session: so.Session) -> PrefixIndex:
+    titles = ss.union_all(*[ss.select(table.game_id, table.title) for table in metadata_tables])
+    return PrefixIndex(session.execute(titles).all())
+
+
+def refresh_memory_index() -> None:
+    """
+    Build a new in-process :class:`PrefixIndex` with a new session, then replace the current one with it.
+    """
+
+    global _memory_index, _memory_refresh
+
+    try:
+        with Session(future=True) as session:
+            _memory_index = build_memory_index(session)
+    except Exception as e:
+        log.error(f"Could not refresh the search index: {e!r}")
+    finally:
+        with _memory_lock:
+            _memory_refresh = None
+
+
+def memory_index(session: so.Session) -> PrefixIndex:
+    """
+    Get the in-process :class:`PrefixIndex`, building it with the passed `session` if it does not exist yet.
+
+    An index older than ``search.refresh`` seconds is still returned, while a new one is built in a background thread
+    and swapped in once it is complete, so that searches never wait for a refresh.
+    """
+
+    global _memory_index, _memory_refresh
+
+    with _memory_lock:
+        index = _memory_index
+        if index is None:
+            index = _memory_index = build_memory_index(session)
+        elif time.monotonic() - index.built_at > cfg["search.refresh"] and _memory_refresh is None:
+            _memory_refresh = threading.Thread(target=refresh_memory_index, name="search-refresh", daemon=True)
+            _memory_refresh.start()
+        return index
+
+
+backends: dict[str, t.Callable[[so.Session, str, int], list[int]]] = {
+    "trigram": lambda session, query, limit: search_database(session, query, limit, fuzzy=True),
+    "prefix": lambda session, query, limit: search_database(session, query, limit, fuzzy=False),
+    "memory": lambda session, query, limit: memory_index(session).search(query, limit),
+}
+
+
+def search(session: so.Session, query: str, limit: int) -> list[tables.Game]:
+    """
+    Find the games best matching the query, in order of relevance, eagerly loading their metadata.
+
+    :param session: The :class:`sqlalchemy.orm.Session` to use.
+    :param query: The text to search for.
+    :param limit: The maximum number of games to return.
+    """
+
+    game_ids = backends[cfg["search.backend"]](session, query, limit)
+    if not game_ids:
+        return []
+
+    games = session.execute(
+        ss.select(tables.Game)
+        .where(tables.Game.id.in_(game_ids))
+        .options(*loaders.for_model(tables.Game, models.get.GameGet))
+    ).unique().scalars().all()
+
+    order = {game_id: position for position, game_id in enumerate(game_ids)}
+    return sorted(games, key=lambda game: order[game.id])
+
+
+def create_trigram_indexes(session: so.Session) -> None:
+    """
+    Create the ``pg_trgm`` extension and the indexes required by the ``trigram`` backend, if they do not exist yet.
+    """
+
+    session.execute(ss.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    for table in metadata_tables:
+        name = table.__tablename__
+        session.execute(ss.text(f"CREATE INDEX IF NOT EXISTS ix_{name}_title_trgm ON {name} USING gin (title gin_trgm_ops)"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Create the indexes required by the trigram search backend of Greenbat.")
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    with Session(future=True) as session:
+        create_trigram_indexes(session)
+        session.commit()
+    log.info("Created the indexes of the trigram search backend")
+
+
+if __name__ == "__main__":
+    main()
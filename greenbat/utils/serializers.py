@@ -0,0 +1,200 @@
+"""
+Serializers compiled from the response models, turning ORM objects directly into JSON without validating them.
+
+FastAPI validates every returned object against the ``response_model`` of the route, building a model instance for
+each of them and for all their nested objects, and then encodes the instances with
+:func:`fastapi.encoders.jsonable_encoder`; since the objects returned by the routes come from the database, the
+validation only costs time.
+
+:func:`serializer_for` reads the fields of a model once, and builds a function converting an object to the same
+JSON-compatible data FastAPI would have returned; routes returning the :class:`fastapi.Response` built by
+:func:`response` skip the validation entirely, while their ``response_model`` is still used to document them.
+
+Serializers can also be compiled for a :data:`.fieldsets.Selection` of the fields of a model, so that only the fields
+requested by the client are read and returned.
+
+Responses are encoded with ``orjson`` if the optional dependency is installed, or with :mod:`json` otherwise.
+"""
+
+import datetime
+import enum
+import functools
+import json
+import royalnet.royaltyping as t
+
+import fastapi as f
+import fastapi.encoders
+import pydantic
+import pydantic.fields
+
+import greenbat.utils.fieldsets as fieldsets
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+Serializer = t.Callable[[t.Any], t.Any]
+
+
+def _optional(serializer: Serializer) -> Serializer:
+    return lambda value: None if value is None else serializer(value)
+
+
+def _scalar(type_, selection: fieldsets.Selection = None) -> Serializer:
+    """
+    Build the serializer of a single value of the passed type, serializing only the `selection` of its fields if it
+    is a model.
+    """
+
+    if isinstance(type_, type):
+        if issubclass(type_, pydantic.BaseModel):
+            return serializer_for(type_, selection)
+        if issubclass(type_, enum.Enum):
+            return lambda value: type_(value).value
+        if issubclass(type_, (datetime.datetime, datetime.date, datetime.time)):
+            return lambda value: value.isoformat()
+        if issubclass(type_, bool):
+            return bool
+        if issubclass(type_, int):
+            return int
+        if issubclass(type_, float):
+            return float
+        if issubclass(type_, str):
+            return str
+    # Anything else is encoded the same way FastAPI would
+    return fastapi.encoders.jsonable_encoder
+
+
+def _field(field: pydantic.fields.ModelField, selection: fieldsets.Selection = None) -> Serializer:
+    """
+    Build the serializer of the value of the passed field, serializing only the `selection` of its nested fields.
+    """
+
+    if field.shape == pydantic.fields.SHAPE_SINGLETON:
+        serializer = _scalar(field.type_, selection)
+    elif field.shape == pydantic.fields.SHAPE_LIST:
+        item = _scalar(field.type_, selection)
+        serializer = lambda values: [item(value) for value in values]
+    elif field.shape == pydantic.fields.SHAPE_DICT:
+        key = _scalar(field.key_field.type_)
+        item = _scalar(field.type_, selection)
+        serializer = lambda values: {key(k): item(v) for k, v in values.items()}
+    else:
+        serializer = fastapi.encoders.jsonable_encoder
+
+    return _optional(serializer) if field.allow_none else serializer
+
+
+@functools.lru_cache(maxsize=1024)
+def serializer_for(model: t.Type[pydantic.BaseModel], selection: fieldsets.Selection = None) -> Serializer:
+    """
+    Build a function converting objects with the attributes of `model` to the JSON-compatible data FastAPI returns
+    when serializing them with `model`, restricted to the fields in the passed `selection`.
+
+    Fields with validators are validated before being serialized, as validators may alter their values; models with
+    root validators are serialized by actually building an instance of them.
+    """
+
+    if model.__pre_root_validators__ or model.__post_root_validators__:
+        return lambda obj: _prune(fastapi.encoders.jsonable_encoder(model.from_orm(obj)), model, selection)
+
+    # Read the fields required by validators too, but only output the selected ones
+    fields = []
+    for field in model.__fields__.values():
+        if fieldsets.has(selection, field.name):
+            fields.append((field, _field(field, fieldsets.get(selection, field.name)), True))
+        elif fieldsets.has(fieldsets.required(model, selection), field.name):
+            fields.append((field, None, False))
+
+    if not any(field.class_validators for field, _, _ in fields):
+        return lambda obj: {field.alias: serializer(getattr(obj, field.name)) for field, serializer, _ in fields}
+
+    def serialize(obj) -> dict:
+        values = {}
+        data = {}
+        for field, serializer, output in fields:
+            value = getattr(obj, field.name, field.default)
+            if field.class_validators:
+                value, errors = field.validate(value, values, loc=field.name, cls=model)
+                if errors:
+                    raise pydantic.ValidationError([errors], model)
+            values[field.name] = value
+            if output:
+                data[field.alias] = serializer(value)
+        return data
+
+    return serialize
+
+
+def _prune(data: dict, model: t.Type[pydantic.BaseModel], selection: fieldsets.Selection) -> dict:
+    """
+    Remove the fields not in the passed `selection` from data serialized with `model`.
+    """
+
+    if selection is None:
+        return data
+
+    pruned = {}
+    for name, sub in selection:
+        field = model.__fields__[name]
+        value = data[field.alias]
+        nested = fieldsets.nested_model(field)
+        if nested is not None and sub is not None and value is not None:
+            if field.shape == pydantic.fields.SHAPE_LIST:
+                value = [_prune(item, nested, sub) for item in value]
+            elif field.shape == pydantic.fields.SHAPE_SINGLETON:
+                value = _prune(value, nested, sub)
+        pruned[field.alias] = value
+    return pruned
+
+
+def dumps(data: t.Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def response(items: t.Iterable, model: t.Type[pydantic.BaseModel], headers: t.Optional[t.Mapping[str, str]] = None, fields: t.Optional[str] = None) -> f.Response:
+    """
+    Serialize the passed objects with the serializer compiled from `model`, as the body of a JSON array response.
+
+    :param items: The objects to serialize.
+    :param model: The model of the items of the ``response_model`` of the route.
+    :param headers: Additional headers to send with the response.
+    :param fields: The value of the ``fields`` query parameter, restricting the serialized fields.
+    """
+
+    serializer = serializer_for(model, fieldsets.parse(model, fields))
+    return f.Response(content=dumps([serializer(item) for item in items]), media_type="application/json", headers=headers)
+
+
+def response_one(obj, model: t.Type[pydantic.BaseModel], headers: t.Optional[t.Mapping[str, str]] = None, fields: t.Optional[str] = None) -> f.Response:
+    """
+    Like :func:`response`, but serialize a single object as the body of a JSON object response.
+
+    :param obj: The object to serialize.
+    :param model: The ``response_model`` of the route.
+    :param headers: Additional headers to send with the response.
+    :param fields: The value of the ``fields`` query parameter, restricting the serialized fields.
+    """
+
+    return f.Response(content=dumps(serializer_for(model, fieldsets.parse(model, fields))(obj)), media_type="application/json", headers=headers)
+
+
+def response_batch(items: t.Iterable, missing: list, model: t.Type[pydantic.BaseModel], headers: t.Optional[t.Mapping[str, str]] = None, fields: t.Optional[str] = None) -> f.Response:
+    """
+    Like :func:`response`, but serialize the objects found by a batch read as the ``results`` of a JSON object
+    response, together with the ``missing`` identifiers nothing was found for.
+
+    :param items: The objects to serialize.
+    :param missing: The identifiers of the requested objects that were not found.
+    :param model: The model of the ``results`` of the ``response_model`` of the route.
+    :param headers: Additional headers to send with the response.
+    :param fields: The value of the ``fields`` query parameter, restricting the serialized fields of the results.
+    """
+
+    serializer = serializer_for(model, fieldsets.parse(model, fields))
+    data = {"results": [serializer(item) for item in items], "missing": list(missing)}
+    return f.Response(content=dumps(data), media_type="application/json", headers=headers)
@@ -0,0 +1,304 @@
+"""
+Clients of the Steam Web API.
+
+Libraries are synchronized by background jobs, which get their client from the
+:class:`~greenbat.utils.jobs.WorkerPool` executing them: the pool of the app uses :data:`api`, while tests and
+benchmarks can create pools using a :class:`FakeSteamAPI` instead.
+"""
+
+import abc
+import collections
+import logging
+import threading
+import time
+import urllib.parse
+import royalnet.royaltyping as t
+import requests
+import requests.adapters
+import steam.steamid
+
+from greenbat.config import cfg
+
+
+log = logging.getLogger(__name__)
+
+
+class OwnedGame(t.NamedTuple):
+    """
+    A game present in the library of a Steam account.
+    """
+
+    appid: int
+    title: t.Optional[str]
+    """
+    The title of the game, or :data:`None` if the Steam Web API omitted it, as it does for some delisted apps.
+    """
+
+
+class SteamAPIError(Exception):
+    """
+    The Steam Web API could not be reached, or returned an unexpected response.
+    """
+
+
+class PrivateLibraryError(SteamAPIError):
+    """
+    The library of the requested Steam account is not public.
+    """
+
+
+class UnknownAppError(SteamAPIError):
+    """
+    The requested app does not exist, or has no Steam store page anymore.
+    """
+
+
+class SteamAPI(abc.ABC):
+    """
+    The interface every Steam Web API client implements.
+    """
+
+    @abc.abstractmethod
+    def owned_games(self, steamid: steam.steamid.SteamID) -> list[OwnedGame]:
+        """
+        Get the games owned by the Steam account with the passed `steamid`.
+
+        :raises PrivateLibraryError: If the library of the account is not public.
+        :raises SteamAPIError: If the library could not be retrieved for any other reason.
+        """
+
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def app_details(self, appid: int) -> dict:
+        """
+        Get the details about the app with the passed `appid` displayed on its Steam store page.
+
+        :raises UnknownAppError: If the app does not exist.
+        :raises SteamAPIError: If the details could not be retrieved for any other reason.
+        """
+
+        raise NotImplementedError()
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket, limiting the rate of the operations performed with it.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        """
+        :param rate: How many tokens are added to the bucket every second.
+        :param burst: The maximum number of tokens the bucket can hold.
+        """
+
+        self.rate: float = rate
+        self.burst: int = burst
+
+        self.tokens: float = burst
+        self.filled_at: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Take a token from the bucket, waiting for one to be added if it is empty.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.filled_at) * self.rate)
+            self.filled_at = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        # The token is already taken: later callers will wait for the following ones
+        if wait:
+            time.sleep(wait)
+
+
+class WebSteamAPI(SteamAPI):
+    """
+    A thread-safe client of the real Steam Web API.
+
+    Connections are pooled and reused, at most `connections` requests are made at the same time, and the requests made
+    to each host are rate limited by a :class:`TokenBucket`; requests failing because of network errors, rate limits or
+    server errors are retried with an exponential backoff.
+
+    App details are kept in a LRU cache, and are revalidated using their ``ETag``, if the server sent one.
+    """
+
+    def __init__(
+            self,
+            key: str,
+            timeout: float = 30,
+            connections: int = 8,
+            rate: float = 1,
+            burst: int = 20,
+            retries: int = 3,
+            backoff: float = 1,
+            cache_size: int = 4096,
+            api_url: str = "https://api.steampowered.com",
+            store_url: str = "https://store.steampowered.com",
+    ):
+        """
+        :param key: The Steam Web API key to authenticate requests with.
+        :param timeout: How many seconds to wait for a response before giving up.
+        :param connections: The maximum number of requests made at the same time, and of connections kept open.
+        :param rate: How many requests can be made to each host every second, on average.
+        :param burst: How many requests can be made to each host at once, after a period of inactivity.
+        :param retries: How many times a failed request should be retried before giving up.
+        :param backoff: How many seconds to wait before the first retry; the wait is doubled at every retry.
+        :param cache_size: The maximum number of app details to keep cached.
+        :param api_url: The base URL of the Steam Web API.
+        :param store_url: The base URL of the Steam store.
+        """
+
+        self.key: str = key
+        self.timeout: float = timeout
+        self.rate: float = rate
+        self.burst: int = burst
+        self.retries: int = retries
+        self.backoff: float = backoff
+        self.cache_size: int = cache_size
+        self.api_url: str = api_url
+        self.store_url: str = store_url
+
+        self.http: requests.Session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=connections, pool_maxsize=connections)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
+        self.buckets: dict[str, TokenBucket] = {}
+        self.cache: collections.OrderedDict[int, tuple[str, dict]] = collections.OrderedDict()
+        self._slots = threading.BoundedSemaphore(connections)
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(rate=self.rate, burst=self.burst)
+            return self.buckets[host]
+
+    def get(self, url: str, params: dict, headers: t.Optional[dict] = None) -> requests.Response:
+        """
+        Make a rate limited GET request, retrying it if it fails for temporary reasons.
+
+        :raises SteamAPIError: If the request still fails after all the retries, or fails with a client error.
+        """
+
+        bucket = self.bucket(url)
+
+        for attempt in range(self.retries + 1):
+            wait = self.backoff * 2 ** attempt
+            bucket.acquire()
+            try:
+                with self._slots:
+                    response = self.http.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            else:
+                if response.status_code == 429 or response.status_code >= 500:
+                    error = f"HTTP {response.status_code}"
+                    if retry_after := response.headers.get("Retry-After", "").strip():
+                        wait = float(retry_after) if retry_after.isdigit() else wait
+                elif response.status_code >= 400:
+                    raise SteamAPIError(f"HTTP {response.status_code} for {url}")
+                else:
+                    return response
+
+            if attempt < self.retries:
+                log.debug(f"Retrying {url} in {wait} seconds, after {error!r}")
+                time.sleep(wait)
+
+        raise SteamAPIError(f"Giving up on {url} after {self.retries + 1} attempts: {error!r}")
+
+    def owned_games(self, steamid: steam.steamid.SteamID) -> list[OwnedGame]:
+        response = self.get(
+            f"{self.api_url}/IPlayerService/GetOwnedGames/v1/",
+            params={
+                "key": self.key,
+                "steamid": steamid.as_64,
+                "include_appinfo": 1,
+                "include_played_free_games": 1,
+            },
+        )
+        try:
+            data = response.json()["response"]
+        except (ValueError, KeyError) as e:
+            raise SteamAPIError(f"Could not retrieve the owned games of {steamid.as_64}: {e!r}")
+
+        # Private libraries are returned as an empty response, without even the game count
+        if "games" not in data:
+            raise PrivateLibraryError(f"The library of {steamid.as_64} is not public")
+
+        return [OwnedGame(appid=game["appid"], title=game.get("name")) for game in data["games"]]
+
+    def app_details(self, appid: int) -> dict:
+        with self._lock:
+            cached = self.cache.get(appid)
+
+        headers = {"If-None-Match": cached[0]} if cached else None
+        response = self.get(f"{self.store_url}/api/appdetails", params={"appids": appid}, headers=headers)
+
+        if response.status_code == 304 and cached:
+            details = cached[1]
+        else:
+            try:
+                data = response.json()[str(appid)]
+            except (ValueError, KeyError, TypeError) as e:
+                raise SteamAPIError(f"Could not retrieve the details of {appid}: {e!r}")
+            if not data.get("success"):
+                raise UnknownAppError(f"No app with appid {appid} exists")
+            details = data["data"]
+
+        with self._lock:
+            if etag := response.headers.get("ETag") or (cached and cached[0]):
+                self.cache[appid] = (etag, details)
+                self.cache.move_to_end(appid)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            else:
+                self.cache.pop(appid, None)
+
+        return details
+
+
+class FakeSteamAPI(SteamAPI):
+    """
+    A client returning predefined libraries without accessing the network.
+    """
+
+    def __init__(self, libraries: dict[int, list[OwnedGame]], apps: t.Optional[dict[int, dict]] = None):
+        """
+        :param libraries: The libraries to return, keyed by the 64-bit SteamID of their account; accounts not
+                          present are treated as having a private library.
+        :param apps: The app details to return, keyed by appid.
+        """
+
+        self.libraries: dict[int, list[OwnedGame]] = libraries
+        self.apps: dict[int, dict] = apps or {}
+
+    def owned_games(self, steamid: steam.steamid.SteamID) -> list[OwnedGame]:
+        try:
+            return list(self.libraries[steamid.as_64])
+        except KeyError:
+            raise PrivateLibraryError(f"The library of {steamid.as_64} is not public")
+
+    def app_details(self, appid: int) -> dict:
+        try:
+            return self.apps[appid]
+        except KeyError:
+            raise UnknownAppError(f"No app with appid {appid} exists")
+
+
+api = WebSteamAPI(
+    key=cfg["steam.apikey"],
+    timeout=cfg["steam.http.timeout"],
+    connections=cfg["steam.http.connections"],
+    rate=cfg["steam.http.rate"],
+    burst=cfg["steam.http.burst"],
+    retries=cfg["steam.http.retries"],
+    backoff=cfg["steam.http.backoff"],
+    cache_size=cfg["steam.appcache.size"],
+)
@@ -0,0 +1,208 @@
+"""
+Bulk import of external libraries into Greenbat.
+
+Libraries may contain thousands of games, so they are written with a handful of ``INSERT ... ON CONFLICT`` statements
+per batch instead of creating an ORM object for each row.
+"""
+
+import datetime
+import itertools
+import logging
+import royalnet.royaltyping as t
+
+import sqlalchemy as s
+import sqlalchemy.orm as so
+import sqlalchemy.sql as ss
+import sqlalchemy.dialects.postgresql as sp
+
+import greenbat.database.tables as tables
+import greenbat.database.changes as changes
+import greenbat.database.versions as versions
+import greenbat.utils.steamapi as steamapi
+import greenbat.utils.jobs as jobs
+import greenbat.utils.cache as cache
+from greenbat.config import cfg
+
+
+log = logging.getLogger(__name__)
+
+
+def batches(iterable: t.Iterable, size: int) -> t.Iterator[list]:
+    """
+    Split the passed iterable in lists of at most `size` items.
+    """
+
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def steam_games(session: so.Session, owned: list[steamapi.OwnedGame]) -> dict[int, int]:
+    """
+    Make sure a game with Steam metadata exists for every one of the `owned` games, creating the missing ones and
+    updating the titles of the changed ones.
+
+    :param session: The :class:`sqlalchemy.orm.Session` to use.
+    :param owned: The games to upsert, without duplicate `appid`\\ s.
+    :return: A :class:`dict` mapping the `appid` of every game to its `id`.
+    """
+
+    titles = {game.appid: game.title for game in owned}
+
+    existing = session.execute(
+        ss.select(tables.MetadataSteam.appid, tables.MetadataSteam.game_id, tables.MetadataSteam.title)
+        .where(tables.MetadataSteam.appid.in_(titles))
+    ).all()
+
+    game_ids = {appid: game_id for appid, game_id, _ in existing}
+    missing = [appid for appid in titles if appid not in game_ids]
+    renamed = [appid for appid, _, title in existing if titles[appid] != title]
+
+    # Reserve the ids of all the new games with a single statement
+    allocated = {}
+    if missing:
+        sequence = ss.func.pg_get_serial_sequence(tables.Game.__tablename__, tables.Game.id.key)
+        new_ids = session.execute(
+            sp.insert(tables.Game)
+            .from_select([tables.Game.id], ss.select(ss.func.nextval(sequence)).select_from(ss.func.generate_series(1, len(missing))))
+            .returning(tables.Game.id)
+        ).scalars().all()
+        allocated = dict(zip(missing, new_ids))
+
+    if not allocated and not renamed:
+        return game_ids
+
+    versions.bump(session, [versions.CATALOG])
+    cache.touch(session, [tables.Game.__tablename__, tables.MetadataSteam.__tablename__])
+
+    insert = sp.insert(tables.MetadataSteam).values([
+        {"appid": appid, "game_id": allocated.get(appid) or game_ids[appid], "title": titles[appid]}
+        for appid in itertools.chain(missing, renamed)
+    ])
+    # Another request may have created some of the missing games in the meantime: keep its games instead of ours
+    upserted = session.execute(
+        insert
+        .on_conflict_do_update(index_elements=[tables.MetadataSteam.appid], set_={"title": insert.excluded.title})
+        .returning(tables.MetadataSteam.appid, tables.MetadataSteam.game_id)
+    ).all()
+    game_ids.update(upserted)
+
+    if unused := [game_id for appid, game_id in allocated.items() if game_ids[appid] != game_id]:
+        session.execute(ss.delete(tables.Game).where(tables.Game.id.in_(unused)))
+
+    return game_ids
+
+
+def owned_elements(session: so.Session, owner_id: str, game_ids: t.Iterable[int]) -> list[s.engine.Row]:
+    """
+    Make sure the user with the passed `owner_id` has an element for every one of the passed games, leaving the
+    existing ones untouched.
+
+    :param session: The :class:`sqlalchemy.orm.Session` to use.
+    :param owner_id: The `sub` of the user owning the elements.
+    :param game_ids: The ids of the games to create elements for.
+    :return: The rows of the created elements.
+    """
+
+    game_ids = list(game_ids)
+    if not game_ids:
+        return []
+
+    created = session.execute(
+        sp.insert(tables.Element)
+        .values([{"owner_id": owner_id, "game_id": game_id} for game_id in game_ids])
+        .on_conflict_do_nothing(index_elements=[tables.Element.owner_id, tables.Element.game_id])
+        .returning(*tables.Element.__table__.columns)
+    ).all()
+
+    changes.record_rows(session, tables.Element, [(None, row._mapping) for row in created])
+    return created
+
+
+def unique(owned: t.Iterable[steamapi.OwnedGame]) -> list[steamapi.OwnedGame]:
+    """
+    Remove the games with an already seen `appid` from `owned`, keeping the last title of every game.
+    """
+
+    return list({game.appid: game for game in owned}.values())
+
+
+def titled(api: steamapi.SteamAPI, owned: t.Iterable[steamapi.OwnedGame]) -> list[steamapi.OwnedGame]:
+    """
+    Fill in the titles missing from the `owned` games with the names displayed on their Steam store pages, skipping the
+    games without a store page.
+
+    :raises steamapi.SteamAPIError: If the details of a game could not be retrieved for any other reason.
+    """
+
+    games = []
+    for game in owned:
+        if game.title is None:
+            try:
+                game = game._replace(title=api.app_details(game.appid)["name"])
+            except (steamapi.UnknownAppError, KeyError):
+                log.warning(f"Skipping the Steam app {game.appid}, whose title is unknown")
+                continue
+        games.append(game)
+    return games
+
+
+def steam_library(session: so.Session, account: tables.AccountSteam, owned: list[steamapi.OwnedGame], batch_size: t.Optional[int] = None, on_batch: t.Optional[t.Callable[[int], None]] = None) -> list[s.engine.Row]:
+    """
+    Import the `owned` games of a Steam account in the library of its owner, **without committing the session**.
+
+    :param session: The :class:`sqlalchemy.orm.Session` to use.
+    :param account: The :class:`.tables.AccountSteam` the games were retrieved from.
+    :param owned: The games owned by the account.
+    :param batch_size: How many games should be written with each statement; defaults to ``steam.sync.batchsize``.
+    :param on_batch: A function to call with the number of games processed after every batch is written.
+    :return: The rows of the elements created in the library of the owner of the account.
+    """
+
+    batch_size = batch_size or cfg["steam.sync.batchsize"]
+    created = []
+    for batch in batches(unique(owned), batch_size):
+        game_ids = steam_games(session, batch)
+        created += owned_elements(session, account.owner_id, game_ids.values())
+        if on_batch:
+            on_batch(len(batch))
+    return created
+
+
+@jobs.handler("sync:library_steam")
+def steam_library_job(session: so.Session, job: tables.Job, pool: jobs.WorkerPool) -> dict:
+    """
+    Import the libraries of all the Steam accounts linked to the owner of the `job` with the Steam client of the
+    `pool`, committing after every batch.
+    """
+
+    api = pool.steam_api_factory()
+
+    accounts = session.execute(
+        ss.select(tables.AccountSteam).where(tables.AccountSteam.owner_id == job.owner_id)
+    ).scalars().all()
+
+    libraries = []
+    for account in accounts:
+        try:
+            libraries.append((account, titled(api, unique(api.owned_games(account.steamid)))))
+        except steamapi.PrivateLibraryError:
+            raise jobs.JobError(f"The library of the Steam account {account.steamid.as_64} is not public")
+        except steamapi.SteamAPIError:
+            raise jobs.JobError("The Steam Web API could not be reached")
+
+    progress = 0
+    jobs.report(session, job, progress, total=sum(len(owned) for _, owned in libraries))
+
+    def on_batch(count: int) -> None:
+        nonlocal progress
+        progress += count
+        jobs.report(session, job, progress)
+
+    created = 0
+    for account, owned in libraries:
+        created += len(steam_library(session, account, owned, on_batch=on_batch))
+        account.last_update = datetime.datetime.now()
+        session.commit()
+
+    return {"created": created}